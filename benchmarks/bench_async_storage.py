@@ -0,0 +1,91 @@
+"""Throughput of one uvicorn worker of FastAPI advanced as storage latency grows.
+
+Every repository call of the served app is slowed down by `--latency-ms`
+(a stand-in for a disk or network round trip), then the loadtest workload
+is run against it in two modes:
+
+    inline    the call blocks the event loop (how the routes used to call the store)
+    offload   the call runs in the AsyncRepository thread pool, bounded by its semaphore
+
+Inline throughput falls to about 1000 / latency requests/sec; offloaded
+throughput stays close to concurrency * 1000 / latency, until the pool
+(CRUD_REPO_CONCURRENCY) or the CPU is the limit.
+
+Usage:
+    python -m benchmarks.bench_async_storage --latency-ms 0 1 5 20 --concurrency 16 --duration 5
+"""
+import argparse
+import dataclasses
+import os
+import time
+
+from benchmarks.loadtest import APPS, run_spec
+
+# Repository methods that would reach the storage
+CALLS = {"get", "get_versioned", "generation", "insert", "update", "delete", "keys", "iter_many", "apply_batch"}
+
+
+class LatencyRepository:
+    """Proxy to a repository that sleeps `latency` seconds at the start of every storage call."""
+
+    def __init__(self, repo, latency):
+        self.repo = repo
+        self.latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self.repo, name)
+        if name not in CALLS:
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self.latency)
+            return attr(*args, **kwargs)
+        return call
+
+    def __len__(self):
+        return len(self.repo)
+
+
+def create_app():
+    """FastAPI advanced with slowed storage, configured by $BENCH_LATENCY_MS and $BENCH_MODE."""
+    from fastapi_cruds import advanced
+
+    latency = float(os.environ.get("BENCH_LATENCY_MS", 0)) / 1000
+    advanced.async_repo.repo = LatencyRepository(advanced.repo, latency)
+    advanced.async_repo.blocking = os.environ.get("BENCH_MODE", "offload") == "offload"
+    return advanced.app
+
+
+def __getattr__(name):
+    # uvicorn imports "benchmarks.bench_async_storage:app" in the server process
+    if name == "app":
+        return create_app()
+    raise AttributeError(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[0, 1, 5, 20])
+    parser.add_argument("--concurrency", type=int, default=16, help="client threads")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per run")
+    parser.add_argument("--seed", type=int, default=10, help="records each client creates first")
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    args = parser.parse_args()
+    args.workers = 1
+    args.list_ratio = 0.0
+
+    spec = dataclasses.replace(APPS["fastapi.advanced"], module="benchmarks.bench_async_storage")
+    # Every read must reach the storage, and the log must not compete for the CPU
+    os.environ.update({"CRUD_CACHE_SIZE": "0", "CRUD_LOG_LEVEL": "WARNING"})
+
+    print(f"{'latency ms':>10} {'mode':>8} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for latency in args.latency_ms:
+        for mode in ("inline", "offload"):
+            os.environ.update({"BENCH_LATENCY_MS": str(latency), "BENCH_MODE": mode})
+            r = run_spec(spec, args)
+            print(f"{latency:>10g} {mode:>8} {r['rps']:>8.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                  f"{r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Ingestion rate: one request per record vs. the batch endpoints.
+
+Loads the same records through `POST /users` and `POST /users:batch`
+(Flask advanced) and through `POST /items/{item_id}` and `POST /items:batch`
+(FastAPI advanced), using each framework's in-process test client.
+
+Usage:
+    python -m benchmarks.bench_batch --records 5000 --batch-size 1000
+"""
+import argparse
+import logging
+import time
+
+from fastapi.testclient import TestClient
+
+from fastapi_cruds import advanced as fastapi_app
+from flask_cruds import advanced as flask_app
+
+
+def rate(n, fn):
+    start = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - start)
+
+
+def bench_flask(n, batch_size):
+    client = flask_app.app.test_client()
+    users = [{"user_id": f"u{i}", "name": f"User {i}", "email": f"u{i}@x.com"} for i in range(n)]
+
+    flask_app.fake_db.clear()
+    single = rate(n, lambda: [client.post("/users", json=u) for u in users])
+
+    flask_app.fake_db.clear()
+    batches = [users[i:i + batch_size] for i in range(0, n, batch_size)]
+    batch = rate(n, lambda: [client.post("/users:batch", json=b) for b in batches])
+    return single, batch
+
+
+def bench_fastapi(n, batch_size):
+    client = TestClient(fastapi_app.app)
+    items = [{"item_id": i, "item": {"name": f"Item {i}", "description": "bench"}} for i in range(n)]
+
+    fastapi_app.fake_db.clear()
+    single = rate(n, lambda: [client.post(f"/items/{r['item_id']}", json=r["item"]) for r in items])
+
+    fastapi_app.fake_db.clear()
+    batches = [items[i:i + batch_size] for i in range(0, n, batch_size)]
+    batch = rate(n, lambda: [client.post("/items:batch", json=b) for b in batches])
+    return single, batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{'app':>8} {'single rec/s':>13} {'batch rec/s':>12} {'speedup':>8}")
+    for name, bench in (("flask", bench_flask), ("fastapi", bench_fastapi)):
+        single, batch = bench(args.records, args.batch_size)
+        print(f"{name:>8} {single:>13.0f} {batch:>12.0f} {batch / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
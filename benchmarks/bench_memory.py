@@ -0,0 +1,65 @@
+"""Memory per stored record: plain dicts vs. compact slotted records.
+
+Fills an `IndexedStore` with `--records` users (Flask advanced shape) and
+items (FastAPI advanced shape) and reports the bytes allocated per record,
+as measured by tracemalloc, for the store alone and for the full repository
+(store plus its key, version and search/unique indexes).
+
+Usage:
+    python -m benchmarks.bench_memory --records 200000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from cruds_common.repository import DictRepository
+from cruds_common.store import IndexedStore
+from fastapi_cruds.advanced import ItemRecord
+from flask_cruds.advanced import UserRecord
+
+
+def users(n):
+    return ((str(i), {"user_id": str(i), "name": f"User {i}", "email": f"user{i}@example.com"}) for i in range(n))
+
+
+def items(n):
+    return ((i, {"name": f"Item {i}", "description": "imported from the catalog"}) for i in range(n))
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.records
+
+    cases = [
+        ("users", users, UserRecord, {"unique_fields": ("email",)}),
+        ("items", items, ItemRecord, {"search_fields": ("name",)}),
+    ]
+    print(f"{'':>24} {'dict B/rec':>11} {'compact B/rec':>14} {'saved':>7}")
+    for name, make, record_type, repo_options in cases:
+        def store(compact):
+            return IndexedStore(make(n), record_type=record_type if compact else None)
+
+        def repository(compact):
+            return DictRepository(store(compact), **repo_options)
+
+        for label, build in ((f"{name} store", store), (f"{name} store + indexes", repository)):
+            plain = measure(lambda: build(False)) / n
+            compact = measure(lambda: build(True)) / n
+            print(f"{label:>24} {plain:>11.0f} {compact:>14.0f} {1 - compact / plain:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
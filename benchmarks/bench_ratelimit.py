@@ -0,0 +1,86 @@
+"""Overhead of rate limiting and admission control when the server is not saturated.
+
+Times, per request:
+
+    check + gate    `RateLimiter.check` (client and route buckets) plus one
+                    admission gate acquire/release, the work added to each request
+    flask           GET through the Flask test client, without / with `init_rate_limits`
+    fastapi         GET through the FastAPI test client, without / with `RateLimitMiddleware`
+
+Budgets are far above the request rate, so nothing is rejected: the
+difference is the pure cost of the checks.
+
+Usage:
+    python -m benchmarks.bench_ratelimit --calls 200000 --requests 3000
+"""
+import argparse
+import timeit
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from flask import Flask
+
+from cruds_common.ratelimit import AdmissionGate, Budget, RateLimiter
+from fastapi_cruds.ratelimit import RateLimitMiddleware
+from flask_cruds.ratelimit import init_rate_limits
+
+BUDGET = Budget(rate=1e9, burst=10**9, route_rate=1e9, route_burst=10**9, max_in_flight=64, max_queue=256)
+
+
+def limiter():
+    return RateLimiter(read=BUDGET, write=BUDGET)
+
+
+def flask_app(limited):
+    app = Flask(__name__)
+    if limited:
+        init_rate_limits(app, limiter())
+    app.add_url_rule("/items/<int:item_id>", "item", lambda item_id: {"item_id": item_id})
+    return app.test_client()
+
+
+def fastapi_app(limited):
+    app = FastAPI()
+    if limited:
+        app.add_middleware(RateLimitMiddleware, limiter=limiter())
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"item_id": item_id}
+
+    return TestClient(app)
+
+
+def per_call(fn, number, repeat=3):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+
+def compare(plain, limited, number, rounds=5):
+    """Best per-call time of each, measured in alternating rounds so drift affects both alike."""
+    times = [(per_call(plain, number, 1), per_call(limited, number, 1)) for _ in range(rounds)]
+    return min(t[0] for t in times), min(t[1] for t in times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    rate_limiter, gate = limiter(), AdmissionGate(64, 256)
+
+    def check():
+        rate_limiter.check("read", "127.0.0.1", "GET /items/{item_id}")
+        gate.acquire()
+        gate.release()
+
+    print(f"check + gate: {per_call(check, args.calls) * 1e9:.0f} ns/request")
+    print(f"{'app':>8} {'plain µs':>9} {'limited µs':>11} {'overhead':>9}")
+    for label, make in (("flask", flask_app), ("fastapi", fastapi_app)):
+        plain, limited = make(False), make(True)
+        base, with_limits = compare(lambda: plain.get("/items/1"), lambda: limited.get("/items/1"), args.requests)
+        print(f"{label:>8} {base * 1e6:>9.1f} {with_limits * 1e6:>11.1f} {(with_limits / base - 1) * 100:>8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Requests/sec of list responses before and after the fast JSON path.
+
+Also times the encoding step alone (response_model validation + pydantic
+encoding, as recent FastAPI does it, vs. `dumps`),
+which is the part this layer changes; the in-process test clients add a
+large fixed cost per request on top of it.
+
+"before" is the original handler style: FastAPI validating the returned dict
+against `response_model=StandardResponse` and encoding with the default
+JSONResponse, and Flask's default `jsonify`. "after" is the current apps:
+payloads returned as FastJSONResponse / encoded by FastJSONProvider, with
+orjson when installed.
+
+Usage:
+    python -m benchmarks.bench_serialization --items 100 --requests 2000
+"""
+import argparse
+import logging
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from flask import Flask, jsonify
+
+from cruds_common import serialization
+from fastapi_cruds import advanced as fastapi_app
+from flask_cruds import advanced as flask_app
+
+
+def legacy_fastapi(items):
+    app = FastAPI()
+
+    @app.get("/items", response_model=fastapi_app.StandardResponse)
+    async def list_items():
+        return {"status": "success", "message": "Items listed", "data": items}
+
+    return app
+
+
+def legacy_flask(users):
+    app = Flask(__name__)
+
+    @app.route("/users")
+    def get_users():
+        return jsonify(users), 200
+
+    return app
+
+
+def encode_rate(fn, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - start)
+
+
+def rps(get, path, n):
+    get(path)  # warm up
+    start = time.perf_counter()
+    for _ in range(n):
+        get(path)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100, help="records per list response")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    items = {i: {"name": f"Item {i}", "description": "benchmark item"} for i in range(args.items)}
+    users = {str(i): {"user_id": str(i), "name": f"User {i}", "email": f"u{i}@x.com"} for i in range(args.items)}
+    fastapi_app.fake_db.clear()
+    fastapi_app.fake_db.update(items)
+    flask_app.fake_db.clear()
+    flask_app.fake_db.update(users)
+
+    runs = {
+        "fastapi before": (TestClient(legacy_fastapi(items)).get, "/items"),
+        "fastapi after": (TestClient(fastapi_app.app).get, "/items"),
+        "flask before": (legacy_flask(list(users.values())).test_client().get, "/users"),
+        "flask after": (flask_app.app.test_client().get, "/users"),
+    }
+    print(f"JSON backend: {serialization.backend()}, {args.items} records per response")
+    payload = {"status": "success", "message": "Items listed", "data": items}
+    model = fastapi_app.StandardResponse
+    encoders = {
+        "validate+dump": lambda: model.model_validate(payload).model_dump_json().encode(),
+        "dumps": lambda: serialization.dumps(payload),
+    }
+    for name, fn in encoders.items():
+        print(f"{'encode ' + name:>15}: {encode_rate(fn, args.requests):>8.0f} bodies/s")
+    for name, (get, path) in runs.items():
+        print(f"{name:>15}: {rps(get, path, args.requests):>8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Read scaling of the shared-memory store as worker processes are added.
+
+Fills one store with `--records` items, then for 1, 2, ... up to the number
+of cores, forks that many workers that each `get()` random keys for
+`--seconds`. Reports total and per-worker reads/s for:
+
+    shm       the shared-memory hash table (one copy of the data for all workers)
+    sqlite    the SQLite backend on the same data, the other way to share state
+    dict      a private in-memory dict per worker, the ceiling (and N copies of the data)
+
+With reads that take no lock, the shm total should grow with the worker
+count until the cores run out.
+
+Usage:
+    python -m benchmarks.bench_shm --records 100000 --seconds 2 --max-workers 8
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from cruds_common.repository import DictRepository, SQLiteRepository
+from cruds_common.shm import SharedMemoryRepository
+
+
+def open_backend(name, directory, records):
+    if name == "shm":
+        return SharedMemoryRepository(os.path.join(directory, "items"), int, slots=1 << (2 * records).bit_length(),
+                                      heap_size=records * 128)
+    if name == "sqlite":
+        return SQLiteRepository(os.path.join(directory, "items.db"), "items", key_type=int)
+    return DictRepository()
+
+
+def reader(name, directory, records, seconds, counts, worker):
+    repo = open_backend(name, directory, records)
+    if name == "dict":  # private copy per worker
+        repo.apply_batch([("create", key, {"name": f"Item{key}", "description": "benchmark"})
+                          for key in range(records)])
+    rng = random.Random(worker)
+    keys = [rng.randrange(records) for _ in range(10_000)]
+    reads = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for key in keys[:1000]:
+            repo.get(key)
+        reads += 1000
+        keys.append(keys.pop(0))
+    counts[worker] = reads / seconds
+
+
+def run(name, directory, records, seconds, workers):
+    context = multiprocessing.get_context("fork")
+    counts = context.Array("d", workers)
+    procs = [context.Process(target=reader, args=(name, directory, records, seconds, counts, w))
+             for w in range(workers)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    return sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=base) as directory:
+        for name in ("shm", "sqlite"):
+            repo = open_backend(name, directory, args.records)
+            repo.apply_batch([("create", key, {"name": f"Item{key}", "description": "benchmark"})
+                              for key in range(args.records)])
+        print(f"{args.records} records, {os.cpu_count()} cores")
+        print(f"{'workers':>7} " + " ".join(f"{name + ' reads/s':>16} {'per worker':>11}"
+                                            for name in ("shm", "sqlite", "dict")))
+        # 1, 2, 4, ... and the core count itself
+        steps = sorted({min(1 << i, args.max_workers) for i in range(args.max_workers.bit_length() + 1)})
+        for workers in steps:
+            row = [run(name, directory, args.records, args.seconds, workers) for name in ("shm", "sqlite", "dict")]
+            print(f"{workers:>7} " + " ".join(f"{total:>16,.0f} {total / workers:>11,.0f}" for total in row))
+
+if __name__ == "__main__":
+    main()
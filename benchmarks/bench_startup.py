@@ -0,0 +1,150 @@
+"""Cold start of the advanced apps: import, `create_app` and the first request.
+
+Each measurement runs in a fresh interpreter, as a new worker would, and
+reports the median over `--runs` of:
+
+    import      importing the app module (the framework included)
+    create      `create_app()` (`+preload`: with `AppConfig(preload=True)`)
+    first       the first GET /users/1 or /items/1, served in-process
+    second      the same request again, for comparison
+    total       import + create + first: time from start to the first response
+
+`bare flask` and `bare fastapi` are a one-route app of the same framework:
+the import of the framework dominates cold starts, and the apps' own share
+is `total` minus the bare app's. TARGETS holds that share per framework;
+`--check` exits with status 1 if it is exceeded.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 7 --check
+"""
+import argparse
+import compileall
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Budget (ms) of an advanced app's cold start above the bare framework's
+TARGETS = {"flask": 40.0, "fastapi": 60.0}
+
+FLASK = """
+from flask_cruds.advanced import create_app
+app = create_app(AppConfig(preload=PRELOAD))
+client = app.test_client()
+request = lambda: client.get("/users/1").status_code
+"""
+
+FASTAPI = """
+from fastapi_cruds.advanced import create_app
+app = create_app(AppConfig(preload=PRELOAD))
+app.state.repo.insert(1, {"name": "Item1", "description": ""})
+request = lambda: asgi_get(app, "/items/1")
+"""
+
+BARE_FLASK = """
+from flask import Flask
+app = Flask(__name__)
+app.add_url_rule("/users/<user_id>", "user", lambda user_id: {"user_id": user_id})
+client = app.test_client()
+request = lambda: client.get("/users/1").status_code
+"""
+
+BARE_FASTAPI = """
+from fastapi import FastAPI
+app = FastAPI()
+@app.get("/items/{item_id}")
+async def item(item_id: int):
+    return {"item_id": item_id}
+request = lambda: asgi_get(app, "/items/1")
+"""
+
+# Run in the child: times the snippet's import (everything up to `app = `), the rest of its
+# setup, then two requests. The FastAPI requests call the ASGI app directly: a test client
+# would add its own startup (a thread and an event loop portal) to the first one.
+RUNNER = """
+import asyncio, json, time
+t0 = time.perf_counter()
+from cruds_common.config import AppConfig
+{imports}
+t1 = time.perf_counter()
+def asgi_get(app, path):
+    scope = {{"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+             "scheme": "http", "http_version": "1.1", "root_path": ""}}
+    sent = []
+    async def receive():
+        return {{"type": "http.request", "body": b""}}
+    async def send(message):
+        sent.append(message)
+    asyncio.run(app(scope, receive, send))
+    return sent[0]["status"]
+PRELOAD = {preload}
+{setup}
+t2 = time.perf_counter()
+status = request()
+t3 = time.perf_counter()
+request()
+t4 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "create": t2 - t1, "first": t3 - t2, "second": t4 - t3, "status": status}}))
+"""
+
+CASES = [
+    ("bare flask", BARE_FLASK, False),
+    ("flask", FLASK, False),
+    ("flask +preload", FLASK, True),
+    ("bare fastapi", BARE_FASTAPI, False),
+    ("fastapi", FASTAPI, False),
+    ("fastapi +preload", FASTAPI, True),
+]
+
+
+def measure(snippet, preload):
+    """One cold start in a fresh interpreter: {phase: seconds}."""
+    lines = snippet.strip().splitlines()
+    source = RUNNER.format(imports=lines[0], setup="\n".join(lines[1:]), preload=preload)
+    out = subprocess.run([sys.executable, "-c", source], capture_output=True, text=True, check=True,
+                         env=dict(os.environ, CRUD_LOG_LEVEL="ERROR")).stdout
+    timings = json.loads(out.splitlines()[-1])
+    if timings.pop("status") >= 500:
+        raise RuntimeError(f"First request failed:\n{source}")
+    timings["total"] = timings["import"] + timings["create"] + timings["first"]
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if a target is exceeded")
+    args = parser.parse_args()
+
+    # A deployed worker starts from compiled bytecode, not from source
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for package in ("cruds_common", "flask_cruds", "fastapi_cruds"):
+        compileall.compile_dir(os.path.join(root, package), quiet=1)
+
+    phases = ("import", "create", "first", "second", "total")
+    print(f"{'':18}" + "".join(f"{phase:>10}" for phase in phases) + "   (ms, median)")
+    # Cases take turns, so drift in the machine's load affects them alike
+    runs = {name: [] for name, _, _ in CASES}
+    for _ in range(args.runs):
+        for name, snippet, preload in CASES:
+            runs[name].append(measure(snippet, preload))
+    medians = {}
+    for name, timings in runs.items():
+        medians[name] = {phase: statistics.median(run[phase] for run in timings) * 1000 for phase in phases}
+        print(f"{name:18}" + "".join(f"{medians[name][phase]:10.2f}" for phase in phases))
+
+    failed = False
+    for framework, target in TARGETS.items():
+        overhead = medians[framework]["total"] - medians[f"bare {framework}"]["total"]
+        ok = overhead <= target
+        failed |= not ok
+        print(f"{framework}: {overhead:.1f} ms above the bare framework (target {target:.0f} ms) "
+              f"{'ok' if ok else 'EXCEEDED'}")
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Throughput of the storage backends behind the CRUD routes.
+
+Runs insert/get/update/delete through the `Repository` interface for the
+in-memory dict backend and the SQLite backend, then a mixed read/write
+workload with several worker processes sharing one SQLite file.
+
+Usage:
+    python -m benchmarks.bench_storage --records 20000 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from cruds_common.repository import DictRepository, SQLiteRepository
+
+
+def run_ops(repo, n):
+    results = {}
+    start = time.perf_counter()
+    for key in range(n):
+        repo.insert(key, {"name": f"Item{key}", "description": "benchmark"})
+    results["insert"] = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for key in range(n):
+        repo.get(key)
+    results["get"] = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for key in range(n):
+        repo.update(key, {"name": f"Renamed{key}"})
+    results["update"] = n / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for key in range(n):
+        repo.delete(key)
+    results["delete"] = n / (time.perf_counter() - start)
+    return results
+
+
+def mixed_worker(path, worker, n, read_ratio):
+    repo = SQLiteRepository(path, "items", key_type=int)
+    rng = random.Random(worker)
+    for i in range(n):
+        key = rng.randrange(n)
+        if rng.random() < read_ratio:
+            repo.get(key)
+        else:
+            repo.update(key, {"name": f"W{worker}-{i}"}, upsert=True)
+
+
+def run_mixed(path, workers, n, read_ratio):
+    procs = [multiprocessing.Process(target=mixed_worker, args=(path, w, n, read_ratio))
+             for w in range(workers)]
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - start
+    return workers * n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--read-ratio", type=float, default=0.9)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        backends = {
+            "dict": DictRepository(search_fields=("name",)),
+            "sqlite": SQLiteRepository(path, "items", key_type=int),
+        }
+        print(f"{'backend':>8} {'insert/s':>10} {'get/s':>10} {'update/s':>10} {'delete/s':>10}")
+        for name, repo in backends.items():
+            r = run_ops(repo, args.records)
+            print(f"{name:>8} {r['insert']:>10.0f} {r['get']:>10.0f} {r['update']:>10.0f} {r['delete']:>10.0f}")
+
+        ops = run_mixed(path, args.workers, args.records // args.workers, args.read_ratio)
+        print(f"\nsqlite mixed ({args.read_ratio:.0%} reads), {args.workers} processes: {ops:.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compare `GET /items?name=` search: linear scan vs. the trigram index.
+
+Usage:
+    python -m benchmarks.bench_trigram_search
+    python -m benchmarks.bench_trigram_search --sizes 10000 100000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from cruds_common.indexes import TrigramIndex
+from cruds_common.store import IndexedStore
+
+WORDS = [
+    "alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+    "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa",
+    "quebec", "romeo", "sierra", "tango", "uniform", "victor", "whiskey",
+    "xray", "yankee", "zulu",
+]
+
+
+def make_name(rng):
+    return f"{rng.choice(WORDS).title()}{rng.choice(WORDS).title()} {rng.randint(0, 99999)}"
+
+
+def linear_scan(db, name):
+    # The pre-index implementation of list_items
+    return {k: v for k, v in db.items() if name.lower() in v["name"].lower()}
+
+
+def indexed_search(db, index, name):
+    return {k: db[k] for k in sorted(index.search(name))}
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    hits = 0
+    for query in queries:
+        hits += len(fn(query))
+    return (time.perf_counter() - start) / len(queries), hits
+
+
+def run(size, n_queries, seed=0):
+    rng = random.Random(seed)
+    db = IndexedStore()
+    index = db.add_index(TrigramIndex("name"))
+
+    start = time.perf_counter()
+    for item_id in range(size):
+        db[item_id] = {"name": make_name(rng), "description": ""}
+    build = time.perf_counter() - start
+
+    # Mix of selective (word + digits) and broad (single word) queries
+    queries = []
+    for _ in range(n_queries):
+        if rng.random() < 0.5:
+            queries.append(f"{rng.choice(WORDS)[:4]}")
+        else:
+            queries.append(f"{rng.choice(WORDS)} {rng.randint(0, 999)}")
+
+    scan_s, scan_hits = timed(lambda q: linear_scan(db, q), queries)
+    index_s, index_hits = timed(lambda q: indexed_search(db, index, q), queries)
+    assert scan_hits == index_hits, "index and scan disagree"
+    return {
+        "size": size,
+        "build_s": build,
+        "scan_ms": scan_s * 1000,
+        "index_ms": index_s * 1000,
+        "speedup": scan_s / index_s if index_s else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'items':>10} {'build (s)':>10} {'scan (ms)':>10} {'index (ms)':>11} {'speedup':>8}")
+    for size in args.sizes:
+        r = run(size, args.queries)
+        print(f"{r['size']:>10} {r['build_s']:>10.2f} {r['scan_ms']:>10.3f} {r['index_ms']:>11.3f} {r['speedup']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Per-request cost of validating user payloads in Flask advanced.
+
+Times one validation of a valid `POST /users` body with:
+
+    presence loop   the old ad-hoc `for field in required_fields` check (no types, no limits)
+    interpreted     the same schema walked field by field at run time
+    compiled        `Schema.compile()`, as the routes use it
+    pydantic        an equivalent pydantic model, for reference
+
+and, for scale, a whole `POST /users` + `DELETE` round trip through the
+Flask test client.
+
+Usage:
+    python -m benchmarks.bench_validation --calls 200000
+"""
+import argparse
+import timeit
+
+from pydantic import BaseModel, ConfigDict, constr
+
+from cruds_common.schema import SchemaError
+from flask_cruds import advanced
+
+PAYLOAD = {"user_id": "42", "name": "  Ada Lovelace ", "email": "ada@example.com"}
+
+
+def presence_loop(data):
+    for field in ("user_id", "name", "email"):
+        if field not in data:
+            raise SchemaError(f"Missing field: {field}")
+    return data
+
+
+def interpreted(data, fields=advanced.USER_SCHEMA.fields):
+    if type(data) is not dict:
+        raise SchemaError("Expected a JSON object")
+    for key in data:
+        if key not in fields:
+            raise SchemaError(f"Unknown field: {key}")
+    out = {}
+    for name, field in fields.items():
+        value = data.get(name)
+        if value is None:
+            raise SchemaError(f"Missing field: {name}")
+        if field.coerce and type(value) is int:
+            value = str(value)
+        if not isinstance(value, field.type):
+            raise SchemaError(f"{name} has the wrong type")
+        if field.strip:
+            value = value.strip()
+        if field.max_length is not None and len(value) > field.max_length:
+            raise SchemaError(f"{name} is too long")
+        if field.min_length is not None and len(value) < field.min_length:
+            raise SchemaError(f"{name} is too short")
+        out[name] = value
+    return out
+
+
+class UserModel(BaseModel):
+    model_config = ConfigDict(extra="forbid", str_strip_whitespace=True)
+    user_id: constr(min_length=1, max_length=64)
+    name: constr(min_length=1, max_length=200)
+    email: constr(min_length=1, max_length=254)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    validators = [
+        ("presence loop", presence_loop),
+        ("interpreted", interpreted),
+        ("compiled", advanced.validate_create),
+        ("pydantic", lambda data: UserModel.model_validate(data).model_dump()),
+    ]
+    print(f"{'validator':>14} {'ns/call':>9}")
+    for label, fn in validators:
+        seconds = min(timeit.repeat(lambda: fn(PAYLOAD), number=args.calls, repeat=3))
+        print(f"{label:>14} {seconds / args.calls * 1e9:>9.0f}")
+
+    advanced.app.config["TESTING"] = True
+    client = advanced.app.test_client()
+
+    def round_trip():
+        client.post("/users", json=PAYLOAD)
+        client.delete("/users/42")
+
+    seconds = min(timeit.repeat(round_trip, number=args.requests // 2, repeat=3))
+    print(f"POST /users + DELETE round trip: {seconds / (args.requests // 2) * 1e6:.0f} µs "
+          f"({seconds / args.requests * 1e6:.0f} µs per request)")
+
+
+if __name__ == "__main__":
+    main()
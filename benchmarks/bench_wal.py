@@ -0,0 +1,97 @@
+"""Write throughput of the WAL-backed store per fsync policy, and recovery time.
+
+Throughput: `--threads` writers insert records through `WALRepository`
+(plus the plain in-memory `DictRepository` as the baseline). With
+fsync=always each write waits for its fsync, but writers that wait at the
+same time share one (group commit), so throughput grows with the thread count.
+
+Recovery: builds a store of `--records` records (snapshot plus a log tail
+of `--tail` updates), then times a restart: loading the snapshot, replaying
+the tail and rebuilding the indexes (with and without the trigram index
+that FastAPI advanced keeps on `name`).
+
+Usage:
+    python -m benchmarks.bench_wal --writes 2000 --threads 1 8 --records 1000000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from cruds_common.repository import DictRepository
+from cruds_common.wal import FSYNC_POLICIES, WALRepository
+
+
+def write_rate(repo, writes, threads):
+    per_thread = writes // threads
+
+    def worker(offset):
+        for i in range(offset, offset + per_thread):
+            repo.insert(i, {"name": f"Item {i}", "description": "benchmark"})
+
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def bench_throughput(writes, thread_counts):
+    print(f"{'store':>14} " + " ".join(f"{f'{t} thr w/s':>12}" for t in thread_counts))
+    configs = [("memory", None)] + [(f"wal {policy}", policy) for policy in FSYNC_POLICIES]
+    for name, policy in configs:
+        rates = []
+        for threads in thread_counts:
+            directory = tempfile.mkdtemp()
+            repo = DictRepository() if policy is None else WALRepository(directory, fsync=policy)
+            rates.append(write_rate(repo, writes, threads))
+            if policy is not None:
+                repo.close()
+            shutil.rmtree(directory)
+        print(f"{name:>14} " + " ".join(f"{rate:>12.0f}" for rate in rates))
+
+
+def bench_recovery(records, tail):
+    directory = tempfile.mkdtemp()
+    try:
+        repo = WALRepository(directory, fsync="never", snapshot_every=records * 10)
+        batch = 10_000
+        for start in range(0, records, batch):
+            repo.apply_batch([("create", i, {"name": f"Item {i}", "description": "benchmark"})
+                              for i in range(start, min(start + batch, records))])
+        repo.wal.snapshot()
+        for i in range(tail):
+            repo.update(i, {"description": "updated"})
+        repo.close()
+        size = sum(os.path.getsize(os.path.join(directory, n)) for n in os.listdir(directory))
+
+        print(f"recovery of {records} records + {tail} log entries ({size / 1e6:.0f} MB):")
+        for label, search_fields in (("store + key/version indexes", ()), ("... + name trigram index", ("name",))):
+            start = time.perf_counter()
+            recovered = WALRepository(directory, search_fields=search_fields)
+            elapsed = time.perf_counter() - start
+            assert len(recovered) == records
+            recovered.close()
+            print(f"{label:>30}: {elapsed:6.2f}s ({records / elapsed:.0f} records/s)")
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000, help="inserts per run")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--records", type=int, default=1_000_000, help="store size for the recovery run")
+    parser.add_argument("--tail", type=int, default=100_000, help="log entries replayed after the snapshot")
+    args = parser.parse_args()
+
+    bench_throughput(args.writes, args.threads)
+    bench_recovery(args.records, args.tail)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Load-test the six CRUD apps under real servers.
+
+Each app is started in its own server process (gunicorn for Flask, uvicorn
+for FastAPI), seeded with records, then driven by `--concurrency` client
+threads running a mixed read/write workload for `--duration` seconds.
+Latency percentiles and requests/sec are printed and saved as JSON, named
+after the current git commit, so runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.loadtest                          # all apps
+    python -m benchmarks.loadtest --apps fastapi.advanced --concurrency 32 --workers 4
+    python -m benchmarks.loadtest --compare benchmarks/results/<old>.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+@dataclass
+class AppSpec:
+    """How to serve one app and which requests make up its workload."""
+    module: str
+    asgi: bool
+    create: callable  # key -> (method, path, body)
+    read: callable
+    update: callable
+    delete: callable
+    list: callable = None  # () -> (method, path, body)
+
+
+def user(key):
+    return {"user_id": str(key), "name": f"User {key}", "email": f"user{key}@example.com"}
+
+
+def item(key):
+    return {"name": f"Item {key}", "description": "load test"}
+
+
+APPS = {
+    "flask.basic": AppSpec(
+        "flask_cruds.basic", asgi=False,
+        create=lambda k: ("POST", f"/users/{k}", user(k)),
+        read=lambda k: ("GET", f"/users/{k}", None),
+        update=lambda k: ("PUT", f"/users/{k}", user(k)),
+        delete=lambda k: ("DELETE", f"/users/{k}", None),
+    ),
+    "flask.intermediate": AppSpec(
+        "flask_cruds.intermediate", asgi=False,
+        create=lambda k: ("POST", "/users", user(k)),
+        read=lambda k: ("GET", f"/users/{k}", None),
+        update=lambda k: ("PUT", f"/users/{k}", user(k)),
+        delete=lambda k: ("DELETE", f"/users/{k}", None),
+    ),
+    "flask.advanced": AppSpec(
+        "flask_cruds.advanced", asgi=False,
+        create=lambda k: ("POST", "/users", user(k)),
+        read=lambda k: ("GET", f"/users/{k}", None),
+        update=lambda k: ("PUT", f"/users/{k}", user(k)),
+        delete=lambda k: ("DELETE", f"/users/{k}", None),
+        list=lambda: ("GET", "/users?limit=50", None),
+    ),
+    "fastapi.basic": AppSpec(
+        "fastapi_cruds.basic", asgi=True,
+        create=lambda k: ("POST", f"/items/{k}", item(k)),
+        read=lambda k: ("GET", f"/items/{k}", None),
+        update=lambda k: ("PUT", f"/items/{k}", item(k)),
+        delete=lambda k: ("DELETE", f"/items/{k}", None),
+    ),
+    "fastapi.intermediate": AppSpec(
+        "fastapi_cruds.intermediate", asgi=True,
+        create=lambda k: ("POST", f"/items/{k}", item(k)),
+        read=lambda k: ("GET", f"/items/{k}", None),
+        update=lambda k: ("PUT", f"/items/{k}", item(k)),
+        delete=lambda k: ("DELETE", f"/items/{k}", None),
+        list=lambda: ("GET", "/items?limit=50", None),
+    ),
+    "fastapi.advanced": AppSpec(
+        "fastapi_cruds.advanced", asgi=True,
+        create=lambda k: ("POST", f"/items/{k}", item(k)),
+        read=lambda k: ("GET", f"/items/{k}", None),
+        update=lambda k: ("PUT", f"/items/{k}", item(k)),
+        delete=lambda k: ("DELETE", f"/items/{k}", None),
+        list=lambda: ("GET", "/items?limit=50", None),
+    ),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(spec, port, workers):
+    if spec.asgi:
+        cmd = [sys.executable, "-m", "uvicorn", f"{spec.module}:app", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    else:
+        if shutil.which("gunicorn") is None and not _importable("gunicorn"):
+            raise RuntimeError("gunicorn is required for the Flask apps: pip install gunicorn")
+        cmd = [sys.executable, "-m", "gunicorn", f"{spec.module}:app", "-b", f"127.0.0.1:{port}",
+               "-w", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{spec.module} exited: {proc.stderr.read().decode()}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{spec.module} did not start listening on port {port}")
+
+
+def _importable(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+def send(conn, request):
+    method, path, body = request
+    payload = json.dumps(body).encode() if body is not None else None
+    headers = {"Content-Type": "application/json"} if payload is not None else {}
+    start = time.perf_counter()
+    conn.request(method, path, body=payload, headers=headers)
+    response = conn.getresponse()
+    response.read()
+    return time.perf_counter() - start, response.status
+
+
+class Worker(threading.Thread):
+    """One client thread with a keep-alive connection and its own key range."""
+
+    def __init__(self, index, spec, port, args, ready, stop):
+        super().__init__(daemon=True)
+        self.spec, self.port, self.args = spec, port, args
+        self.ready, self.stop = ready, stop
+        self.rng = random.Random(index)
+        self.next_key = (index + 1) * 1_000_000
+        self.live = []
+        self.latencies = []
+        self.errors = 0
+        self.client_errors = 0
+
+    def run(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            for _ in range(self.args.seed):
+                self.live.append(self.next_key)
+                send(conn, self.spec.create(self.next_key))
+                self.next_key += 1
+        except Exception:
+            self.ready.abort()  # fail the run instead of leaving the others waiting
+            raise
+        self.ready.wait()
+        while not self.stop.is_set():
+            request, on_done = self.pick()
+            try:
+                latency, status = send(conn, request)
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+                continue
+            self.latencies.append(latency)
+            if status >= 500:
+                self.errors += 1
+            elif status >= 400:
+                self.client_errors += 1
+            on_done()
+        conn.close()
+
+    def pick(self):
+        """Choose the next request from the read/write mix."""
+        spec, rng = self.spec, self.rng
+        roll = rng.random()
+        if roll < self.args.read_ratio or not self.live:
+            if spec.list and rng.random() < self.args.list_ratio:
+                return spec.list(), lambda: None
+            if self.live:
+                return spec.read(rng.choice(self.live)), lambda: None
+        write = rng.random()
+        if write < 0.4 or not self.live:
+            key = self.next_key
+            self.next_key += 1
+            return spec.create(key), lambda: self.live.append(key)
+        if write < 0.8:
+            return spec.update(rng.choice(self.live)), lambda: None
+        key = self.live.pop(rng.randrange(len(self.live)))
+        return spec.delete(key), lambda: None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_app(name, args):
+    return run_spec(APPS[name], args)
+
+
+def run_spec(spec, args):
+    """Serve `spec` and drive it with the mixed workload; return the summary numbers."""
+    port = free_port()
+    proc = start_server(spec, port, args.workers)
+    try:
+        stop = threading.Event()
+        ready = threading.Barrier(args.concurrency + 1)
+        workers = [Worker(i, spec, port, args, ready, stop) for i in range(args.concurrency)]
+        for worker in workers:
+            worker.start()
+        ready.wait()  # every client has seeded its keys
+        start = time.perf_counter()
+        time.sleep(args.duration)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    latencies = sorted(lat for w in workers for lat in w.latencies)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": sum(w.errors for w in workers),
+        "client_errors": sum(w.client_errors for w in workers),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline['commit']} ({baseline_path}):")
+    for name, current in results["apps"].items():
+        old = baseline["apps"].get(name)
+        if not old:
+            continue
+        rps_change = (current["rps"] / old["rps"] - 1) * 100 if old["rps"] else 0.0
+        p99_change = (current["p99_ms"] / old["p99_ms"] - 1) * 100 if old["p99_ms"] else 0.0
+        print(f"{name:>22} rps {rps_change:+7.1f}%   p99 {p99_change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=sorted(APPS), default=list(APPS))
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per app")
+    parser.add_argument("--seed", type=int, default=50, help="records each client creates first")
+    parser.add_argument("--read-ratio", type=float, default=0.8)
+    parser.add_argument("--list-ratio", type=float, default=0.05, help="share of reads that list")
+    parser.add_argument("--output", help="JSON results path (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "apps": {},
+    }
+    print(f"{'app':>22} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'5xx':>5}")
+    for name in args.apps:
+        r = run_app(name, args)
+        results["apps"][name] = r
+        print(f"{name:>22} {r['rps']:>9.0f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>5}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{results['commit']}-{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
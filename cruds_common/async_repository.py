@@ -0,0 +1,96 @@
+"""Awaitable access to a `Repository` for async frameworks.
+
+`AsyncRepository` runs each call of a blocking backend (SQLite, or the WAL
+waiting for its fsync) in a thread pool, so the event loop keeps serving
+other requests meanwhile. At most `concurrency` calls run at once; the rest
+wait on a semaphore instead of piling up in the pool's queue. Backends that
+never block (`blocking = False`, the in-memory store) are called inline:
+a thread hop costs more than the call itself.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+class AsyncRepository:
+    """Async facade over a sync `Repository`; same methods, awaited."""
+
+    def __init__(self, repo, concurrency=16):
+        self.repo = repo
+        self.concurrency = concurrency
+        self.blocking = getattr(repo, "blocking", True)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="repository")
+        self._loop = None
+        self._semaphore = None
+
+    @classmethod
+    def from_env(cls, repo):
+        """Wrap `repo`, allowing $CRUD_REPO_CONCURRENCY (default 16) calls at once."""
+        return cls(repo, concurrency=int(os.environ.get("CRUD_REPO_CONCURRENCY", 16)))
+
+    def _get_semaphore(self):
+        # An asyncio.Semaphore belongs to one loop; tests (and reloads) may start several
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._semaphore = loop, asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def run(self, fn, *args, **kwargs):
+        """Call `fn(*args, **kwargs)` in the pool (or inline for a non-blocking backend)."""
+        if not self.blocking:
+            return fn(*args, **kwargs)
+        async with self._get_semaphore():
+            return await self._loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    async def get(self, key):
+        return await self.run(self.repo.get, key)
+
+    async def get_versioned(self, key):
+        return await self.run(self.repo.get_versioned, key)
+
+    async def generation(self):
+        return await self.run(self.repo.generation)
+
+    async def insert(self, key, record):
+        return await self.run(self.repo.insert, key, record)
+
+    async def update(self, key, changes, upsert=False, precondition=None):
+        return await self.run(self.repo.update, key, changes, upsert=upsert, precondition=precondition)
+
+    async def patch(self, key, patch, precondition=None):
+        return await self.run(self.repo.patch, key, patch, precondition=precondition)
+
+    async def delete(self, key):
+        return await self.run(self.repo.delete, key)
+
+    async def lookup(self, field, value):
+        return await self.run(self.repo.lookup, field, value)
+
+    async def keys(self, limit=None, cursor=None, contains=None, filters=(), sort=None):
+        return await self.run(self.repo.keys, limit, cursor, contains=contains, filters=filters, sort=sort)
+
+    async def get_many(self, keys):
+        """Return `[(key, record)]` for the keys that still exist, in order."""
+        return await self.run(lambda: list(self.repo.iter_many(keys)))
+
+    async def iter_many(self, keys, chunk_size=100):
+        """Yield `(key, record)` like `Repository.iter_many`, loading `chunk_size` keys per call."""
+        for start in range(0, len(keys), chunk_size):
+            for pair in await self.get_many(keys[start:start + chunk_size]):
+                yield pair
+
+    async def apply_batch(self, ops, upsert=False):
+        return await self.run(self.repo.apply_batch, ops, upsert=upsert)
+
+    async def count(self):
+        return await self.run(len, self.repo)
+
+    async def clear(self):
+        return await self.run(self.repo.clear)
+
+    def subscribe(self, listener):
+        return self.repo.subscribe(listener)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,220 @@
+"""Batch endpoints: incremental parsing of the body and chunked application.
+
+A batch body is a JSON array of objects or NDJSON (one object per line).
+`RecordParser` is fed the body as it arrives and returns each complete
+record, so only the record being parsed is buffered. `BatchApplier`
+validates records one by one and hands them to `Repository.apply_batch`
+`chunk_size` at a time; `apply_stream` ties both together. Memory then
+depends on the chunk size, not on the size of the body.
+"""
+import codecs
+import json
+
+from cruds_common.limits import BodyTooLarge
+from cruds_common.pagination import NDJSON_MEDIA_TYPE, ndjson_stream
+from cruds_common.serialization import loads
+
+# Batch outcome -> (HTTP status, message) reported for each record
+OUTCOMES = {
+    "created": (201, "created"),
+    "updated": (200, "updated"),
+    "deleted": (200, "deleted"),
+    "exists": (400, "already exists"),
+    "not_found": (404, "not found"),
+    "conflict": (409, "conflicts with an existing record"),
+    "full": (507, "not stored: storage is full"),
+}
+
+NOT_A_LIST = "Batch body must be a list of JSON objects"
+_WHITESPACE = " \t\r\n"
+
+
+class RecordParser:
+    """Push parser for batch bodies: `feed(chunk)` returns the records completed by `chunk`.
+
+    Call `close()` once the body ends; it returns the last records and
+    raises ValueError if the body was incomplete. A single record larger
+    than `max_record_size` bytes is rejected instead of buffered.
+    """
+
+    def __init__(self, content_type, max_record_size=1 << 20):
+        self.ndjson = (content_type or "").split(";")[0].strip() == NDJSON_MEDIA_TYPE
+        self.max_record_size = max_record_size
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = b"" if self.ndjson else ""
+        self._state = "start"  # JSON array: start -> value -> separator -> ... -> end
+
+    def feed(self, chunk):
+        if self.ndjson:
+            return self._feed_lines(chunk, final=False)
+        self._buffer += self._decoder.decode(chunk)
+        return self._scan(final=False)
+
+    def close(self):
+        if self.ndjson:
+            return self._feed_lines(b"", final=True)
+        self._buffer += self._decoder.decode(b"", final=True)
+        records = self._scan(final=True)
+        if self._state != "end":
+            raise ValueError(NOT_A_LIST if self._state == "start" else "Batch body ends in the middle of the array")
+        return records
+
+    def _feed_lines(self, chunk, final):
+        self._buffer += chunk
+        lines = self._buffer.split(b"\n")
+        self._buffer = b"" if final else lines.pop()
+        if len(self._buffer) > self.max_record_size:
+            raise ValueError(f"Batch record exceeds {self.max_record_size} bytes")
+        records = []
+        for line in lines:
+            if line.strip():
+                record = loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(NOT_A_LIST)
+                records.append(record)
+        return records
+
+    def _scan(self, final):
+        buffer, pos, records = self._buffer, 0, []
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if self._state == "start":
+                if buffer[pos] != "[":
+                    raise ValueError(NOT_A_LIST)
+                self._state, pos = "first", pos + 1
+            elif self._state in ("first", "value"):
+                if self._state == "first" and buffer[pos] == "]":
+                    self._state, pos = "end", pos + 1
+                    continue
+                if buffer[pos] != "{":
+                    raise ValueError(NOT_A_LIST)
+                try:
+                    record, pos = self._json.raw_decode(buffer, pos)
+                except ValueError:
+                    if final:
+                        raise ValueError("Invalid JSON in batch body")
+                    if len(buffer) - pos > self.max_record_size:
+                        raise ValueError(f"Batch record exceeds {self.max_record_size} bytes")
+                    break  # incomplete: wait for more of the body
+                records.append(record)
+                self._state = "separator"
+            elif self._state == "separator":
+                if buffer[pos] == ",":
+                    self._state = "value"
+                elif buffer[pos] == "]":
+                    self._state = "end"
+                else:
+                    raise ValueError("Invalid JSON in batch body")
+                pos += 1
+            else:
+                raise ValueError("Unexpected data after the batch array")
+        self._buffer = buffer[pos:]
+        return records
+
+
+def parse_records(body, content_type):
+    """Decode a whole batch body into a list of records (ValueError if it is not a list of objects)."""
+    parser = RecordParser(content_type, max_record_size=max(len(body), 1))
+    return parser.feed(body) + parser.close()
+
+
+class BatchApplier:
+    """Validate records as they arrive and collect them into chunks of writes.
+
+    `validate(record)` returns `(op, key, data)` or raises ValueError, which
+    becomes a 400 result for that record. Results keep the order of the
+    records; `key_field` names the key in them (e.g. "user_id").
+    """
+
+    def __init__(self, validate, key_field, noun, chunk_size=1000):
+        self.validate = validate
+        self.key_field = key_field
+        self.noun = noun
+        self.chunk_size = chunk_size
+        self.ops = []
+        self._results = []  # a result dict, or the key of an op waiting for its outcome
+        self.count = 0
+
+    def add(self, record):
+        """Queue one record. Returns True once a chunk is ready for `repo.apply_batch(self.ops)`."""
+        index, self.count = self.count, self.count + 1
+        try:
+            op, key, data = self.validate(record)
+        except ValueError as exc:
+            self._results.append({"index": index, self.key_field: record.get(self.key_field),
+                                  "status": 400, "message": str(exc)})
+        else:
+            self.ops.append((op, key, data))
+            self._results.append((index, key))
+        return len(self.ops) >= self.chunk_size
+
+    def complete(self, outcomes):
+        """Return the results of the queued records, given the outcomes of `self.ops`."""
+        outcomes = iter(outcomes)
+        results = []
+        for entry in self._results:
+            if isinstance(entry, tuple):
+                index, key = entry
+                code, message = OUTCOMES[next(outcomes)]
+                entry = {"index": index, self.key_field: key, "status": code, "message": f"{self.noun} {message}"}
+            results.append(entry)
+        self.ops, self._results = [], []
+        return results
+
+
+def apply_stream(repo, chunks, parser, applier, upsert=False):
+    """Parse `chunks` of a batch body and apply it chunk by chunk; yield each record's result."""
+    for chunk in chunks:
+        for record in parser.feed(chunk):
+            if applier.add(record):
+                yield from applier.complete(repo.apply_batch(applier.ops, upsert=upsert))
+    for record in parser.close():
+        applier.add(record)
+    yield from applier.complete(repo.apply_batch(applier.ops, upsert=upsert) if applier.ops else [])
+
+
+async def apply_stream_async(repo, chunks, parser, applier, upsert=False):
+    """`apply_stream` for an async iterable of chunks and an `AsyncRepository`."""
+    async for chunk in chunks:
+        for record in parser.feed(chunk):
+            if applier.add(record):
+                for result in applier.complete(await repo.apply_batch(applier.ops, upsert=upsert)):
+                    yield result
+    for record in parser.close():
+        applier.add(record)
+    for result in applier.complete(await repo.apply_batch(applier.ops, upsert=upsert) if applier.ops else []):
+        yield result
+
+
+def ndjson_results(results, chunk_size=1000):
+    """Encode batch results as NDJSON chunks; an error in the body ends them with a 400 line (413 over the limit)."""
+    pending = []
+    try:
+        for result in results:
+            pending.append(result)
+            if len(pending) >= chunk_size:
+                yield from ndjson_stream(pending, chunk_size)
+                pending = []
+    except ValueError as exc:
+        pending.append({"status": 413 if isinstance(exc, BodyTooLarge) else 400, "message": str(exc)})
+    yield from ndjson_stream(pending, chunk_size)
+
+
+async def ndjson_results_async(results, chunk_size=1000):
+    """`ndjson_results` for an async iterable of results."""
+    pending = []
+    try:
+        async for result in results:
+            pending.append(result)
+            if len(pending) >= chunk_size:
+                for chunk in ndjson_stream(pending, chunk_size):
+                    yield chunk
+                pending = []
+    except ValueError as exc:
+        pending.append({"status": 413 if isinstance(exc, BodyTooLarge) else 400, "message": str(exc)})
+    for chunk in ndjson_stream(pending, chunk_size):
+        yield chunk
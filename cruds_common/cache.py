@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """In-process LRU cache of serialized responses, with an optional TTL.
+
+    Subscribe it to a repository (`repo.subscribe(cache)`) and every write
+    invalidates the key it touched. A TTL is only needed when other processes
+    write to the same storage (e.g. the SQLite backend).
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped on every invalidation; see `set`
+        self.generation = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache sized by $CRUD_CACHE_SIZE with TTL $CRUD_CACHE_TTL (seconds)."""
+        ttl = os.environ.get("CRUD_CACHE_TTL")
+        return cls(maxsize=int(os.environ.get("CRUD_CACHE_SIZE", 1024)), ttl=float(ttl) if ttl else None)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, generation=None):
+        """Cache `value` for `key`.
+
+        Pass the `generation` read before loading the record: if a write
+        happened in between, the value may be stale and is not cached.
+        """
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    # Repository listener protocol
+    def on_set(self, key, old, record):
+        self.invalidate(key)
+
+    def on_delete(self, key, old):
+        self.invalidate(key)
@@ -0,0 +1,205 @@
+"""Change-data-capture: every write of a repository, numbered, in a ring buffer.
+
+    changes = repo.subscribe(ChangeLog.from_env())
+    changes.read(since=41)  # the changes after sequence number 41
+
+A `ChangeLog` is a repository listener: each write appends one `Change`
+with the next sequence number, overwriting the oldest once `capacity` is
+reached. Writers never wait for readers: a reader that falls more than
+`capacity` changes behind gets `ResyncRequired` and must reload the
+collection, then resume from `ResyncRequired.seq`. Readers follow the log
+with `follow` (threads) or `follow_async` (event loop); `sse_stream` turns
+either into Server-Sent Events.
+"""
+import os
+from threading import Condition, Lock
+
+from cruds_common.serialization import dumps
+
+SSE_MEDIA_TYPE = "text/event-stream"
+
+
+class ResyncRequired(Exception):
+    """The changes after `since` are no longer buffered; reload, then resume from `seq`."""
+
+    def __init__(self, since, seq):
+        super().__init__(f"Changes after {since} are no longer available")
+        self.since = since
+        self.seq = seq
+
+
+class Change:
+    """One write: `op` is "create", "update", "delete" or "clear"; `record` is None for the last two."""
+
+    __slots__ = ("seq", "op", "key", "record", "_json")
+
+    def __init__(self, seq, op, key, record):
+        self.seq = seq
+        self.op = op
+        self.key = key
+        self.record = record
+        self._json = None
+
+    def to_dict(self):
+        return {"seq": self.seq, "op": self.op, "key": self.key, "record": self.record}
+
+    def json(self):
+        """JSON bytes of the change, encoded once however many readers send it."""
+        if self._json is None:
+            self._json = dumps(self.to_dict())
+        return self._json
+
+
+class ChangeLog:
+    """Ring buffer of the last `capacity` changes of a repository (attach with `repo.subscribe`)."""
+
+    def __init__(self, capacity=10_000):
+        self.capacity = capacity
+        self.last_seq = 0
+        self._ring = [None] * capacity  # change `seq` lives at seq % capacity
+        self._lock = Lock()
+        self._cond = Condition(self._lock)
+        self._async_waiters = []  # (loop, asyncio.Event) of readers waiting for the next change
+
+    @classmethod
+    def from_env(cls):
+        """Keep the last $CRUD_CHANGES_CAPACITY (default 10000) changes."""
+        return cls(capacity=int(os.environ.get("CRUD_CHANGES_CAPACITY", 10_000)))
+
+    @property
+    def first_seq(self):
+        """Oldest sequence number still buffered."""
+        return max(1, self.last_seq - self.capacity + 1)
+
+    def publish(self, op, key, record=None):
+        with self._lock:
+            seq = self.last_seq + 1
+            self._ring[seq % self.capacity] = Change(seq, op, key, record)
+            self.last_seq = seq
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        # Wake readers on event loops; never blocks, whichever thread writes
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # loop closed
+                pass
+        return seq
+
+    # Repository listener protocol
+    def on_set(self, key, old, record):
+        self.publish("create" if old is None else "update", key, record)
+
+    def on_delete(self, key, old):
+        self.publish("delete", key)
+
+    def clear(self):
+        self.publish("clear", None)
+
+    def read(self, since=None, limit=1000):
+        """Up to `limit` changes after sequence number `since` (None: from now on, so none).
+
+        Raises ResyncRequired if some of them were overwritten, or if `since`
+        is ahead of the log (a sequence number from before a restart).
+        """
+        with self._lock:
+            last = self.last_seq
+            if since is None or since == last:
+                return []
+            if since > last or since < self.first_seq - 1:
+                raise ResyncRequired(since, last)
+            end = min(last, since + limit)
+            return [self._ring[seq % self.capacity] for seq in range(since + 1, end + 1)]
+
+    def wait(self, since, timeout=None):
+        """Block until there are changes after `since`. Return False on timeout."""
+        with self._lock:
+            return self._cond.wait_for(lambda: self.last_seq != since, timeout)
+
+    async def wait_async(self, since, timeout=None):
+        """`wait` for an event loop: awaits instead of blocking the thread."""
+        import asyncio  # here, not at the top: thread-only (Flask) apps never pay for importing it
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self.last_seq != since:
+                return True
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+
+    def follow(self, since=None, follow=True, heartbeat=15.0):
+        """Yield lists of changes after `since` as they are written; an empty list after
+        `heartbeat` seconds without any. With `follow=False`, stop once caught up.
+        Raises ResyncRequired when the reader falls too far behind."""
+        since = self.last_seq if since is None else since
+        while True:
+            changes = self.read(since)
+            if changes:
+                since = changes[-1].seq
+                yield changes
+            elif not follow:
+                return
+            elif not self.wait(since, heartbeat):
+                yield []
+
+    async def follow_async(self, since=None, follow=True, heartbeat=15.0):
+        """`follow` for an event loop."""
+        since = self.last_seq if since is None else since
+        while True:
+            changes = self.read(since)
+            if changes:
+                since = changes[-1].seq
+                yield changes
+            elif not follow:
+                return
+            elif not await self.wait_async(since, heartbeat):
+                yield []
+
+
+def sse_event(change):
+    return b"id: %d\nevent: change\ndata: %s\n\n" % (change.seq, change.json())
+
+
+def sse_message(batch):
+    """SSE bytes for one batch from `follow`: its events, or a keep-alive comment if empty."""
+    return b"".join(map(sse_event, batch)) if batch else b": keep-alive\n\n"
+
+
+def sse_resync(exc):
+    return b"event: resync\ndata: %s\n\n" % dumps({"since": exc.since, "seq": exc.seq})
+
+
+def sse_stream(batches):
+    """Encode `ChangeLog.follow()` as Server-Sent Events; a reader that fell behind
+    gets a final `resync` event carrying the sequence number to resume from."""
+    try:
+        for batch in batches:
+            yield sse_message(batch)
+    except ResyncRequired as exc:
+        yield sse_resync(exc)
+
+
+async def sse_stream_async(batches):
+    """`sse_stream` for `ChangeLog.follow_async()`."""
+    try:
+        async for batch in batches:
+            yield sse_message(batch)
+    except ResyncRequired as exc:
+        yield sse_resync(exc)
+
+
+def parse_since(query_value, last_event_id=None):
+    """Sequence number to resume after: `?since=`, else the SSE `Last-Event-ID` header, else None."""
+    value = query_value if query_value is not None else last_event_id
+    if value is None or value == "":
+        return None
+    if not str(value).isdigit():
+        raise ValueError("since must be a non-negative integer")
+    return int(value)
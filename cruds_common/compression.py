@@ -0,0 +1,129 @@
+"""Response compression: Accept-Encoding negotiation, gzip and (when installed) brotli.
+
+The framework glue lives in `flask_cruds.compression` and
+`fastapi_cruds.compression`. Bodies below `min_size` are sent as is: for a
+few hundred bytes the headers and CPU cost more than they save. Compressed
+bodies of responses with an ETag are cached under (URL, ETag, encoding), so
+an unchanged list snapshot is compressed once, however often it is fetched.
+Compressed responses get a weak ETag (as nginx does): the bytes differ from
+the identity representation, but If-None-Match still matches.
+"""
+import gzip
+import os
+import zlib
+
+from cruds_common.cache import ResponseCache
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def parse_accept_encoding(header):
+    """Map each coding of an Accept-Encoding header to its q-value."""
+    codings = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def choose_encoding(header, available):
+    """Pick the coding of `available` (in server preference order) the client ranks highest, or None."""
+    codings = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = codings.get(coding, codings.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed bodies; every chunk is flushed so lines arrive promptly."""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, chunk):
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+    def iter(self, chunks):
+        for chunk in chunks:
+            data = self.compress(chunk)
+            if data:
+                yield data
+        yield self.finish()
+
+
+class Compressor:
+    """Compression settings, negotiation and the cache of compressed bodies."""
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=4, cache_size=256):
+        self.min_size = min_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        # Brotli first: smaller than gzip at a similar speed on quality 4
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        self.cache = ResponseCache(maxsize=cache_size)
+
+    @classmethod
+    def from_env(cls):
+        """Build a compressor from $CRUD_COMPRESS_MIN_SIZE, $CRUD_GZIP_LEVEL,
+        $CRUD_BROTLI_QUALITY and $CRUD_COMPRESS_CACHE_SIZE."""
+        return cls(min_size=int(os.environ.get("CRUD_COMPRESS_MIN_SIZE", 1024)),
+                   gzip_level=int(os.environ.get("CRUD_GZIP_LEVEL", 6)),
+                   brotli_quality=int(os.environ.get("CRUD_BROTLI_QUALITY", 4)),
+                   cache_size=int(os.environ.get("CRUD_COMPRESS_CACHE_SIZE", 256)))
+
+    def compressible(self, content_type):
+        return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def negotiate(self, accept_encoding):
+        return choose_encoding(accept_encoding, self.encodings)
+
+    def compress(self, body, encoding, url=None, etag=None):
+        """Compress `body`, reusing the cached result for the same (url, etag, encoding)."""
+        key = (url, etag, encoding) if url is not None and etag is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        if encoding == "br":
+            data = brotli.compress(body, quality=self.levels["br"])
+        else:
+            data = gzip.compress(body, compresslevel=self.levels["gzip"], mtime=0)
+        if key is not None:
+            self.cache.set(key, data)
+        return data
+
+    def stream(self, encoding):
+        return StreamCompressor(encoding, self.levels[encoding])
+
+
+def weak_etag(etag):
+    return etag if etag.startswith("W/") else f"W/{etag}"
@@ -0,0 +1,39 @@
+"""Settings of the advanced apps, passed to their `create_app(config)` factories.
+
+The other components (caches, limits, rate limits...) still read their own
+$CRUD_* variables when the app is built; these are the settings of the app
+itself.
+"""
+import os
+from dataclasses import dataclass
+
+
+def env_flag(name, default=False):
+    """A boolean environment variable: 1/true/yes/on, or 0/false/no/off."""
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    storage_url: str = "memory://"  # see `open_repository`
+    # Warm up before the first request: open the storage, fill the response cache and build
+    # what the framework otherwise builds on first use (URL matcher, middleware stack, OpenAPI)
+    preload: bool = False
+    openapi: bool = True  # FastAPI: serve /openapi.json and /docs (the schema is built on first use)
+    log_level: str = "INFO"
+    log_read_sample: int = 100  # log 1 in N reads
+
+    @classmethod
+    def from_env(cls):
+        """Read $CRUD_STORAGE_URL, $CRUD_PRELOAD, $CRUD_OPENAPI, $CRUD_LOG_LEVEL and $CRUD_LOG_READ_SAMPLE."""
+        defaults = cls()
+        return cls(
+            storage_url=os.environ.get("CRUD_STORAGE_URL", defaults.storage_url),
+            preload=env_flag("CRUD_PRELOAD", defaults.preload),
+            openapi=env_flag("CRUD_OPENAPI", defaults.openapi),
+            log_level=os.environ.get("CRUD_LOG_LEVEL", defaults.log_level),
+            log_read_sample=int(os.environ.get("CRUD_LOG_READ_SAMPLE", defaults.log_read_sample)),
+        )
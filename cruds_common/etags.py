@@ -0,0 +1,39 @@
+def format_etag(version, prefix="v"):
+    """Strong ETag for a record version (or `prefix="g"` for a store generation)."""
+    return f'"{prefix}{version}"'
+
+
+def parse_etags(header):
+    """Split an If-Match / If-None-Match header into its entity tags.
+
+    Returns None when the header is absent and "*" for the wildcard.
+    """
+    if header is None:
+        return None
+    header = header.strip()
+    if header == "*":
+        return "*"
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def none_match(header, etag):
+    """True if `etag` matches an If-None-Match header (weak comparison), i.e. answer 304."""
+    tags = parse_etags(header)
+    if tags is None:
+        return False
+    return tags == "*" or etag in {tag.removeprefix("W/") for tag in tags}
+
+
+def if_match_precondition(header, prefix="v"):
+    """Build a repository write precondition from an If-Match header.
+
+    Returns None when the header is absent; otherwise a function of the
+    current version (None if the record is missing). If-Match uses strong
+    comparison, so weak tags never match.
+    """
+    tags = parse_etags(header)
+    if tags is None:
+        return None
+    if tags == "*":
+        return lambda version: version is not None
+    return lambda version: version is not None and format_etag(version, prefix) in tags
@@ -0,0 +1,196 @@
+"""Idempotency keys: replay the first response to a retried write.
+
+A client that retries `POST /users` after a timeout cannot tell whether the
+first attempt went through. Sending the same `Idempotency-Key` header on
+every attempt makes the retries safe: the first request runs, its response
+is kept in an `IdempotencyCache`, and later requests with that key get the
+stored response back without touching the store.
+
+Concurrent duplicates never run twice: the first request claims the key,
+and the others wait (up to `wait_timeout` seconds, then 409) for its
+response. A key sent again with a different method, path or body is a
+client error (422). Every response below 500 is stored, client errors
+included (a retry would get the same answer); after a server error the key
+is released and the next attempt runs for real. The framework glue lives
+in `flask_cruds.idempotency` and `fastapi_cruds.idempotency`.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# Outcomes of `IdempotencyCache.begin`
+RUN = "run"  # first request with this key: run it, then `finish` or `abandon`
+REPLAY = "replay"  # the stored response comes with it
+MISMATCH = "mismatch"  # key reused for a different request
+BUSY = "busy"  # the first request is still running after `wait_timeout`
+
+
+def request_fingerprint(method, path, body):
+    """Digest of what a key must always be sent with: method, path (and query) and body."""
+    digest = hashlib.sha256(f"{method} {path}\n".encode())
+    digest.update(body)
+    return digest.digest()
+
+
+class StoredResponse:
+    """What is replayed: status, headers (list of (name, value) str pairs) and body bytes."""
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "response", "expires_at", "done", "futures")
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.response = None  # None while the first request runs
+        self.expires_at = None
+        self.done = threading.Event()
+        self.futures = []  # (loop, future) of async duplicates waiting for the response
+
+
+class IdempotencyCache:
+    """Responses by idempotency key: LRU-bounded to `maxsize` entries that expire after `ttl` seconds.
+
+    Keys are whatever the glue passes (e.g. `(method, path, header value)`).
+    Requests still running are never evicted; they are bounded by the
+    number of requests in flight.
+    """
+
+    def __init__(self, maxsize=10_000, ttl=24 * 3600, wait_timeout=10.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.clock = clock
+        self.hits = 0  # replays
+        self.misses = 0  # first requests
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> _Entry
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Keep $CRUD_IDEMPOTENCY_SIZE (default 10000) responses for $CRUD_IDEMPOTENCY_TTL seconds
+        (default 24h); duplicates wait $CRUD_IDEMPOTENCY_WAIT seconds (default 10) for the first."""
+        return cls(maxsize=int(os.environ.get("CRUD_IDEMPOTENCY_SIZE", 10_000)),
+                   ttl=float(os.environ.get("CRUD_IDEMPOTENCY_TTL", 24 * 3600)),
+                   wait_timeout=float(os.environ.get("CRUD_IDEMPOTENCY_WAIT", 10.0)))
+
+    def _claim(self, key, fingerprint):
+        """Under the lock: `(outcome, value)`, where value is the response or the entry to wait for."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= self.clock():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self._entries[key] = _Entry(fingerprint)
+            self.misses += 1
+            return RUN, None
+        if entry.fingerprint != fingerprint:
+            return MISMATCH, None
+        if entry.response is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return REPLAY, entry.response
+        return None, entry
+
+    def begin(self, key, fingerprint):
+        """Claim `key` or get its response: `(RUN, None)`, `(REPLAY, response)`, `(MISMATCH, None)`
+        or `(BUSY, None)`. Blocks the thread while a duplicate is running."""
+        deadline = self.clock() + self.wait_timeout
+        while True:
+            with self._lock:
+                outcome, value = self._claim(key, fingerprint)
+            if outcome is not None:
+                return outcome, value
+            # Finished (replay) or abandoned (claim it ourselves): look again either way
+            if not value.done.wait(max(0.0, deadline - self.clock())):
+                return BUSY, None
+
+    async def begin_async(self, key, fingerprint):
+        """`begin` for an event loop: awaits a running duplicate instead of blocking."""
+        import asyncio  # here, not at the top: thread-only (Flask) apps never pay for importing it
+        deadline = self.clock() + self.wait_timeout
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                outcome, value = self._claim(key, fingerprint)
+                if outcome is None:
+                    waiter = (loop, loop.create_future())
+                    value.futures.append(waiter)
+            if outcome is not None:
+                return outcome, value
+            try:
+                await asyncio.wait_for(waiter[1], max(0.0, deadline - self.clock()))
+            except asyncio.TimeoutError:
+                return BUSY, None
+            finally:
+                with self._lock:
+                    if waiter in value.futures:
+                        value.futures.remove(waiter)
+
+    def finish(self, key, response):
+        """Store the response of the request that claimed `key` and wake its duplicates."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.response = response
+            entry.expires_at = self.clock() + self.ttl
+            self._entries.move_to_end(key)
+            self._evict()
+            futures, entry.futures = entry.futures, []
+        self._wake(entry, futures)
+
+    def abandon(self, key):
+        """Release `key` without a response (the request failed): the next attempt runs."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            futures, entry.futures = entry.futures, []
+        self._wake(entry, futures)
+
+    def _evict(self):
+        # Oldest first; running requests are skipped (moved to the end)
+        for _ in range(len(self._entries)):
+            if len(self._entries) <= self.maxsize:
+                return
+            key, entry = next(iter(self._entries.items()))
+            if entry.response is None:
+                self._entries.move_to_end(key)
+            else:
+                del self._entries[key]
+                self.evictions += 1
+
+    @staticmethod
+    def _wake(entry, futures):
+        entry.done.set()
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:  # loop closed
+                pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {"size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,311 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import count
+from threading import Lock
+
+
+def trigrams(text):
+    """Return the set of 3-character substrings of `text`."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Inverted trigram index for case-insensitive substring search on one field.
+
+    Attach it to an `IndexedStore`; it is updated incrementally on every write,
+    so a search only looks at keys sharing all trigrams of the query.
+    Writers from several threads are serialized by an internal lock.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self._postings = defaultdict(set)  # trigram -> keys
+        self._values = {}  # key -> lowercased field value
+        self._lock = Lock()
+
+    def on_set(self, key, old, record):
+        value = str(record.get(self.field) or "").lower()
+        grams = trigrams(value)
+        with self._lock:
+            previous = self._values.get(key)
+            if previous == value:
+                return
+            if previous is not None:
+                self._discard(key, previous)
+            self._values[key] = value
+            for gram in grams:
+                self._postings[gram].add(key)
+
+    def on_delete(self, key, old):
+        with self._lock:
+            previous = self._values.pop(key, None)
+            if previous is not None:
+                self._discard(key, previous)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._values.clear()
+
+    def _discard(self, key, value):
+        for gram in trigrams(value):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def search(self, text):
+        """Return the set of keys whose field contains `text` (case-insensitive)."""
+        needle = text.lower()
+        if len(needle) < 3:
+            # Too short to have a trigram: scan the (already lowercased) values.
+            with self._lock:
+                return {key for key, value in self._values.items() if needle in value}
+
+        with self._lock:
+            postings = [self._postings.get(gram) for gram in trigrams(needle)]
+            if not all(postings):
+                return set()
+            postings.sort(key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        # Trigrams can match out of order, so confirm the real substring.
+        values = self._values
+        return {key for key in candidates if needle in values.get(key, "")}
+
+
+def normalize(value):
+    """Canonical form of a unique field value (e.g. an email): trimmed and case-folded."""
+    if value is None:
+        return None
+    return str(value).strip().casefold() or None
+
+
+class UniqueIndex:
+    """Hash index from the normalized value of one field to the key holding it.
+
+    Writers `claim` a value before storing the record, so two records can
+    never end up with the same value; the store's `on_set` then confirms the
+    claim. Lookups are one dict access.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self._owners = {}  # normalized value -> key
+        self._values = {}  # key -> normalized value
+        self._lock = Lock()
+
+    def claim(self, key, record):
+        """Reserve the value of `record` for `key`. Return False if another key holds it."""
+        value = normalize(record.get(self.field))
+        if value is None:
+            return True
+        with self._lock:
+            owner = self._owners.get(value)
+            if owner is not None and owner != key:
+                return False
+            self._owners[value] = key
+            return True
+
+    def release(self, key, record):
+        """Undo a `claim` whose write did not happen."""
+        value = normalize(record.get(self.field))
+        with self._lock:
+            if self._owners.get(value) == key and self._values.get(key) != value:
+                del self._owners[value]
+
+    def lookup(self, value):
+        return self._owners.get(normalize(value))
+
+    def on_set(self, key, old, record):
+        value = normalize(record.get(self.field))
+        with self._lock:
+            previous = self._values.get(key)
+            if previous == value:
+                return
+            if previous is not None and self._owners.get(previous) == key:
+                del self._owners[previous]
+            if value is None:
+                self._values.pop(key, None)
+            else:
+                self._values[key] = value
+                self._owners[value] = key
+
+    def on_delete(self, key, old):
+        with self._lock:
+            previous = self._values.pop(key, None)
+            if previous is not None and self._owners.get(previous) == key:
+                del self._owners[previous]
+
+    def clear(self):
+        with self._lock:
+            self._owners.clear()
+            self._values.clear()
+
+
+class SortedKeys:
+    """All keys of a store kept in sorted order, for stable cursor pagination.
+
+    Readers slice `keys` directly; writers are serialized by an internal lock.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self._lock = Lock()
+
+    def on_set(self, key, old, record):
+        if old is None:
+            with self._lock:
+                insort(self.keys, key)
+
+    def load(self, items):
+        """Add many `(key, record)` pairs at once (one sort instead of an insort each)."""
+        with self._lock:
+            self.keys = sorted({*self.keys, *(key for key, _ in items)})
+
+    def on_delete(self, key, old):
+        with self._lock:
+            i = bisect_left(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key:
+                del self.keys[i]
+
+    def clear(self):
+        with self._lock:
+            self.keys.clear()
+
+
+def prefix_end(prefix):
+    """Smallest string greater than every string starting with `prefix` (None: no bound)."""
+    prefix = prefix.rstrip("\U0010ffff")
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SortedFieldIndex:
+    """`(normalized value, key)` pairs of one field, kept sorted on every write.
+
+    Exact and prefix matches are one bisect plus a slice, and ordering by
+    the field is a walk from the cursor, so a query costs O(log n + results)
+    instead of a scan. Missing values sort first, as "".
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.entries = []  # sorted (value, key)
+        self._values = {}  # key -> value
+        self._lock = Lock()
+
+    def _value(self, record):
+        return normalize(record.get(self.field)) or ""
+
+    def _remove(self, key):
+        previous = self._values.pop(key, None)
+        if previous is not None:
+            i = bisect_left(self.entries, (previous, key))
+            if i < len(self.entries) and self.entries[i] == (previous, key):
+                del self.entries[i]
+
+    def on_set(self, key, old, record):
+        value = self._value(record)
+        with self._lock:
+            if self._values.get(key) == value:
+                return
+            self._remove(key)
+            self._values[key] = value
+            insort(self.entries, (value, key))
+
+    def load(self, items):
+        """Add many `(key, record)` pairs at once (one sort instead of an insort each)."""
+        with self._lock:
+            for key, record in items:
+                self._values[key] = self._value(record)
+            self.entries = sorted((value, key) for key, value in self._values.items())
+
+    def on_delete(self, key, old):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._values.clear()
+
+    def value(self, key):
+        """Sort value of `key` ("" if the key is not indexed)."""
+        return self._values.get(key, "")
+
+    def match(self, op, text):
+        """Keys whose value equals (op="eq") or starts with (op="prefix") `text`, in value order."""
+        text = normalize(text) or ""
+        end = text + "\0" if op == "eq" else prefix_end(text)
+        with self._lock:
+            start = bisect_left(self.entries, (text,))
+            stop = len(self.entries) if end is None else bisect_left(self.entries, (end,))
+            return [key for _, key in self.entries[start:stop]]
+
+    def page(self, limit=None, cursor=None, descending=False):
+        """One page of all keys ordered by value (then key) and the next cursor, like `paginate`."""
+        with self._lock:
+            entries = self.entries
+            if cursor is None:
+                position = len(entries) if descending else 0
+            elif cursor not in self._values:
+                raise ValueError(f"Unknown cursor: {cursor}")
+            else:
+                bisect = bisect_left if descending else bisect_right
+                position = bisect(entries, (self._values[cursor], cursor))
+            if descending:
+                start = 0 if limit is None else max(position - limit, 0)
+                page = [key for _, key in reversed(entries[start:position])]
+                more = start > 0
+            else:
+                end = len(entries) if limit is None else position + limit
+                page = [key for _, key in entries[position:end]]
+                more = end < len(entries)
+        return page, (page[-1] if page and more else None)
+
+
+class VersionIndex:
+    """Latest `(record, version)` pair for every key of a store.
+
+    Versions come from one increasing counter, so they never repeat, even
+    across deletes. `generation` is the version of the latest write to the
+    whole store. Keeping the record next to its version lets a reader get
+    both with one dict lookup, so a read can never pair a record with the
+    version of a different write.
+    """
+
+    def __init__(self, start=0):
+        # `start`: versions already handed out (e.g. before a restart) are never reused
+        self.generation = start
+        self._entries = {}
+        self._counter = count(start + 1)
+        self._lock = Lock()
+
+    def _bump(self):
+        with self._lock:
+            self.generation = next(self._counter)
+            return self.generation
+
+    def on_set(self, key, old, record):
+        self._entries[key] = (record, self._bump())
+
+    def load(self, items):
+        """Version many `(key, record)` pairs at once."""
+        with self._lock:
+            start = self.generation
+            self._entries.update((key, (record, version)) for (key, record), version in zip(items, count(start + 1)))
+            self.generation = start + len(items)
+            self._counter = count(self.generation + 1)
+
+    def on_delete(self, key, old):
+        self._entries.pop(key, None)
+        self._bump()
+
+    def clear(self):
+        self._entries.clear()
+        self._bump()
+
+    def get(self, key):
+        return self._entries.get(key, (None, None))
@@ -0,0 +1,31 @@
+"""Request body limits shared by the advanced apps.
+
+Single-record routes buffer their body, so they get a small limit. Batch
+routes parse theirs as a stream, applying records as they arrive: they
+accept much larger bodies, while a single record is still capped.
+"""
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class BodyLimits:
+    max_body_size: int = 1 << 20  # bytes, any route
+    max_batch_body_size: int = 256 << 20  # bytes, batch routes
+    max_record_size: int = 64 << 10  # bytes, one record of a batch
+    batch_chunk_size: int = 1000  # records per apply_batch call
+
+    @classmethod
+    def from_env(cls):
+        """Read $CRUD_MAX_BODY_SIZE, $CRUD_MAX_BATCH_BODY_SIZE, $CRUD_MAX_RECORD_SIZE and $CRUD_BATCH_CHUNK_SIZE."""
+        defaults = cls()
+        return cls(
+            max_body_size=int(os.environ.get("CRUD_MAX_BODY_SIZE", defaults.max_body_size)),
+            max_batch_body_size=int(os.environ.get("CRUD_MAX_BATCH_BODY_SIZE", defaults.max_batch_body_size)),
+            max_record_size=int(os.environ.get("CRUD_MAX_RECORD_SIZE", defaults.max_record_size)),
+            batch_chunk_size=int(os.environ.get("CRUD_BATCH_CHUNK_SIZE", defaults.batch_chunk_size)),
+        )
+
+
+class BodyTooLarge(ValueError):
+    """A streamed batch body went over its limit: the records before it are applied, then 413."""
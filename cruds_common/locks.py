@@ -0,0 +1,32 @@
+import threading
+from contextlib import ExitStack, contextmanager
+
+
+class StripedLock:
+    """A fixed pool of re-entrant locks; each key always maps to the same stripe.
+
+    Writes to different keys usually take different locks, so they run in
+    parallel, while check-then-act sequences on one key are serialized.
+    """
+
+    def __init__(self, stripes=64):
+        self._locks = [threading.RLock() for _ in range(stripes)]
+
+    def for_key(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    @contextmanager
+    def for_keys(self, keys):
+        """Hold the stripes of all `keys`, taken in a fixed order to avoid deadlocks."""
+        stripes = sorted({hash(key) % len(self._locks) for key in keys})
+        with ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._locks[stripe])
+            yield
+
+    @contextmanager
+    def for_all(self):
+        with ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
@@ -0,0 +1,178 @@
+"""Non-blocking structured logging.
+
+`setup_logging(logger)` replaces synchronous handlers with a QueueHandler:
+the request path only appends the LogRecord to a bounded queue (dropping it
+if the queue is full), and a QueueListener thread formats records as JSON
+lines and writes them in batches. Messages use %-style arguments so they are
+only formatted on the listener thread, and only for enabled levels; pass
+immutable arguments (ids, strings), since they are read later.
+"""
+import atexit
+import itertools
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from cruds_common import serialization
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        try:
+            return serialization.dumps(entry).decode()
+        except TypeError:
+            return serialization.dumps({k: v if isinstance(v, (str, int, float, bool, type(None))) else str(v)
+                                        for k, v in entry.items()}).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 in N records of each sampled `event`; WARNING and above always pass.
+
+    `rates` maps an event name (given as `extra={"event": ...}`) to N.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+        self._counters = {event: itertools.count() for event in self.rates}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        event = getattr(record, "event", None)
+        every = self.rates.get(event)
+        if not every or every <= 1:
+            return True
+        return next(self._counters[event]) % every == 0
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never formats or waits: full queue means the record is dropped."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler that writes a batch of records with one write and one flush."""
+
+    def emit_batch(self, records):
+        lines = []
+        for record in records:
+            if record.levelno < self.level or not self.filter(record):
+                continue
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if lines:
+            with self.lock:
+                self.stream.write("\n".join(lines) + "\n")
+                self.flush()
+
+
+class BatchingQueueListener(QueueListener):
+    """QueueListener that drains up to `batch_size` queued records per wakeup."""
+
+    def __init__(self, queue, *handlers, batch_size=256):
+        super().__init__(queue, *handlers)
+        self.batch_size = batch_size
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        super().start()
+
+    def dequeue(self, block):
+        if self._stopping:
+            return self._sentinel
+        first = self.queue.get(block)
+        if first is self._sentinel:
+            return first
+        records = [first]
+        while len(records) < self.batch_size:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is self._sentinel:
+                self._stopping = True  # write this batch, then stop
+                break
+            records.append(record)
+        return records
+
+    def handle(self, records):
+        for handler in self.handlers:
+            if hasattr(handler, "emit_batch"):
+                handler.emit_batch(records)
+            else:
+                for record in records:
+                    handler.handle(record)
+
+    def enqueue_sentinel(self):
+        # Shutdown may wait for room in the queue
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(logger, level=logging.INFO, stream=None, batch_size=256, queue_size=10_000, sample=None):
+    """Send `logger`'s records through a bounded queue to a background JSON writer.
+
+    `sample` maps event names to N (keep 1 in N). Returns the started
+    listener; it is stopped (flushing queued records) at interpreter exit.
+    Calling it again for the same logger (e.g. one `create_app` per test)
+    stops the previous listener first: a logger has one pipeline at a time.
+    """
+    log_queue = queue.Queue(queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    if sample:
+        handler.addFilter(SamplingFilter(sample))
+    target = BatchStreamHandler(stream or sys.stderr)
+    target.setFormatter(JSONFormatter())
+    listener = BatchingQueueListener(log_queue, target, batch_size=batch_size)
+    handler.listener = listener
+
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+        previous = getattr(old, "listener", None)
+        if previous is not None:
+            previous.stop()
+            atexit.unregister(previous.stop)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
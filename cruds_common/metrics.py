@@ -0,0 +1,163 @@
+"""Per-route request metrics in the Prometheus text format.
+
+Each thread records into its own shard (a plain dict no other thread writes
+to), so observing a request takes no lock; shards are only summed when
+`/metrics` is scraped. When a thread ends, its shard is folded into a
+retired total, so servers starting a thread per request do not pile up
+shards. Metrics are per process: with several gunicorn or
+uvicorn workers, each worker reports its own counts.
+"""
+import threading
+import weakref
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+UNMATCHED = "<unmatched>"
+
+
+class _Series:
+    """Counters of one (method, route) pair, written by one thread only."""
+    __slots__ = ("statuses", "errors", "latency_sum", "buckets", "bytes_in", "bytes_out")
+
+    def __init__(self, nbuckets):
+        self.statuses = {}
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.buckets = [0] * (nbuckets + 1)  # last slot is +Inf
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, other):
+        for status, count in other.statuses.copy().items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.errors += other.errors
+        self.latency_sum += other.latency_sum
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+
+
+class _ThreadToken:
+    """Lives in a thread's thread-local slot: collected when the thread ends."""
+    __slots__ = ("__weakref__",)
+
+
+class Metrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}  # counts of the shards of ended threads
+        self._shards_lock = threading.Lock()
+        self._collectors = []  # (name, help, type, fn)
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            self._local.token = token = _ThreadToken()
+            with self._shards_lock:
+                self._shards.append(shard)
+            weakref.finalize(token, self._retire, shard)
+            return shard
+
+    def _retire(self, shard):
+        """Fold the shard of an ended thread into the retired total."""
+        with self._shards_lock:
+            self._shards.remove(shard)
+            self._add(self._retired, shard)
+
+    def _add(self, totals, shard):
+        for key, series in shard.copy().items():
+            total = totals.get(key)
+            if total is None:
+                total = totals[key] = _Series(len(self.buckets))
+            total.add(series)
+
+    def observe(self, method, route, status, seconds, bytes_in=0, bytes_out=0):
+        """Record one finished request."""
+        shard = self._shard()
+        key = (method, route)
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = _Series(len(self.buckets))
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+        if status >= 500:
+            series.errors += 1
+        series.latency_sum += seconds
+        series.buckets[bisect_left(self.buckets, seconds)] += 1
+        series.bytes_in += bytes_in
+        series.bytes_out += bytes_out
+
+    def register(self, name, help, fn, type="gauge"):
+        """Export `fn()` (a number) as `name` on every scrape, e.g. the store size."""
+        self._collectors.append((name, help, type, fn))
+
+    def snapshot(self):
+        """Sum the per-thread shards into {(method, route): _Series}."""
+        totals = {}
+        # Under the lock: a shard retired meanwhile would be counted twice
+        with self._shards_lock:
+            self._add(totals, self._retired)
+            for shard in self._shards:
+                self._add(totals, shard)
+        return totals
+
+    def render(self):
+        """Return the Prometheus text exposition of all metrics."""
+        totals = sorted(self.snapshot().items())
+        lines = []
+
+        def header(name, help, type):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+
+        header("http_requests_total", "Requests handled, by route and status.", "counter")
+        for (method, route), s in totals:
+            for status, count in sorted(s.statuses.items()):
+                lines.append(f'http_requests_total{{{_labels(method, route)},status="{status}"}} {count}')
+
+        header("http_request_errors_total", "Requests that ended in a 5xx response.", "counter")
+        for (method, route), s in totals:
+            lines.append(f"http_request_errors_total{{{_labels(method, route)}}} {s.errors}")
+
+        header("http_request_duration_seconds", "Time to produce the response.", "histogram")
+        for (method, route), s in totals:
+            labels = _labels(method, route)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), s.buckets):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {s.latency_sum}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+        for name, attr, help in (("http_request_size_bytes", "bytes_in", "Request body sizes."),
+                                 ("http_response_size_bytes", "bytes_out", "Response body sizes.")):
+            header(name, help, "summary")
+            for (method, route), s in totals:
+                labels = _labels(method, route)
+                lines.append(f"{name}_sum{{{labels}}} {getattr(s, attr)}")
+                lines.append(f"{name}_count{{{labels}}} {sum(s.buckets)}")
+
+        for name, help, type, fn in self._collectors:
+            header(name, help, type)
+            lines.append(f"{name} {fn()}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(method, route):
+    route = route.replace("\\", "\\\\").replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+def register_cache(metrics, cache, prefix):
+    """Export the hit/miss/eviction counters and size of a ResponseCache."""
+    metrics.register(f"{prefix}_hits_total", "Cache hits.", lambda: cache.hits, "counter")
+    metrics.register(f"{prefix}_misses_total", "Cache misses.", lambda: cache.misses, "counter")
+    metrics.register(f"{prefix}_evictions_total", "Entries evicted by the LRU.", lambda: cache.evictions, "counter")
+    metrics.register(f"{prefix}_entries", "Entries currently cached.", lambda: cache.stats()["size"])
@@ -0,0 +1,60 @@
+from bisect import bisect_right
+
+from cruds_common.serialization import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def paginate(sorted_keys, limit=None, cursor=None):
+    """Cut one page out of `sorted_keys`.
+
+    `cursor` is the last key of the previous page (exclusive). Returns the page
+    keys and the cursor for the next page, or None when this is the last page.
+    """
+    start = bisect_right(sorted_keys, cursor) if cursor is not None else 0
+    end = len(sorted_keys) if limit is None else start + limit
+    page = sorted_keys[start:end]
+    next_cursor = page[-1] if page and end < len(sorted_keys) else None
+    return page, next_cursor
+
+
+def ndjson_stream(objects, chunk_size=100):
+    """Yield NDJSON-encoded bytes for `objects`, `chunk_size` lines per chunk."""
+    lines = []
+    for obj in objects:
+        lines.append(dumps(obj))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+async def ndjson_astream(objects, chunk_size=100):
+    """Async version of `ndjson_stream`, for an async iterable of objects."""
+    lines = []
+    async for obj in objects:
+        lines.append(dumps(obj))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def paginate_ordered(keys, limit=None, cursor=None):
+    """Like `paginate`, for keys in any order (e.g. sorted by a field).
+
+    The cursor is found by position, so it must still be in `keys`.
+    """
+    if cursor is None:
+        start = 0
+    else:
+        try:
+            start = keys.index(cursor) + 1
+        except ValueError:
+            raise ValueError(f"Unknown cursor: {cursor}") from None
+    end = len(keys) if limit is None else start + limit
+    page = keys[start:end]
+    next_cursor = page[-1] if page and end < len(keys) else None
+    return page, next_cursor
@@ -0,0 +1,74 @@
+"""JSON merge patch (RFC 7396) applied to stored records.
+
+A merge patch is a JSON object shaped like the record: a member sets that
+field (objects are merged recursively), `null` removes it, and absent
+members are left alone. `patch_record` also reports which top-level
+fields actually changed, so a write can touch only those: their indexes,
+and the fields sent back to the client.
+"""
+MERGE_PATCH_MEDIA_TYPE = "application/merge-patch+json"
+# What PATCH routes take: merge patches, and plain JSON from clients that do not label them
+PATCH_MEDIA_TYPES = (MERGE_PATCH_MEDIA_TYPE, "application/json")
+
+_MISSING = object()
+
+
+def merge_patch(target, patch):
+    """Return `target` with `patch` applied (RFC 7396 MergePatch); `target` is not modified."""
+    if type(patch) is not dict:
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for name, value in patch.items():
+        if value is None:
+            result.pop(name, None)
+        else:
+            result[name] = merge_patch(result.get(name), value)
+    return result
+
+
+def _same(a, b):
+    # 1 == 1.0 == True in Python, but not in JSON
+    return type(a) is type(b) and a == b
+
+
+def patch_record(record, patch):
+    """Apply the merge `patch` (a dict) to `record`: `(new record, changed)`.
+
+    `changed` maps each top-level field whose value differs to its new
+    value, or None if it was removed. Fields the patch does not mention are
+    neither compared nor copied until something changed; with no change,
+    `record` itself is returned.
+    """
+    changed = {}
+    for name, value in patch.items():
+        before = record.get(name, _MISSING)
+        if value is None:
+            if before is not _MISSING:
+                changed[name] = None
+            continue
+        after = merge_patch(None if before is _MISSING else before, value)
+        if before is _MISSING or not _same(after, before):
+            changed[name] = after
+    if not changed:
+        return record, changed
+    result = dict(record.items())
+    for name, value in changed.items():
+        if value is None:
+            del result[name]
+        else:
+            result[name] = value
+    return result, changed
+
+
+def is_patch_media_type(content_type):
+    """True if a Content-Type header names one of PATCH_MEDIA_TYPES (parameters ignored)."""
+    if not content_type:
+        return False
+    return content_type.split(";", 1)[0].strip().lower() in PATCH_MEDIA_TYPES
+
+
+def prefers_minimal(prefer):
+    """True if a Prefer header (RFC 7240) asks for `return=minimal`: no body in the response."""
+    if not prefer:
+        return False
+    return any(token.strip().lower() == "return=minimal" for token in prefer.replace(";", ",").split(","))
@@ -0,0 +1,48 @@
+"""Query parameters shared by the list endpoints: sort, sparse fieldsets and filters.
+
+    ?sort=name / ?sort=-name    order by a sorted-index field (descending with "-")
+    ?fields=name,email          return only these fields of each record
+    ?email=... / ?email_prefix=...   exact or prefix match (trimmed, case-insensitive)
+
+Parsers raise ValueError with a message fit for a 400 response.
+"""
+FILTER_SUFFIXES = {"": "eq", "_prefix": "prefix"}
+
+
+def parse_sort(text, allowed):
+    """Return `(field, descending)` for a `sort` value, or None when it is empty."""
+    if not text:
+        return None
+    field = text[1:] if text.startswith("-") else text
+    if field not in allowed:
+        raise ValueError(f"Cannot sort by {field!r} (use one of: {', '.join(allowed)})")
+    return field, text.startswith("-")
+
+
+def parse_fields(text, allowed):
+    """Return the tuple of fields named in a `fields` value, or None when it is empty."""
+    if not text:
+        return None
+    fields = tuple(dict.fromkeys(field.strip() for field in text.split(",") if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (use any of: {', '.join(allowed)})")
+    return fields
+
+
+def parse_filters(args, fields):
+    """Collect `(field, op, value)` filters from query `args` for each filterable field."""
+    filters = []
+    for field in fields:
+        for suffix, op in FILTER_SUFFIXES.items():
+            value = args.get(field + suffix)
+            if value is not None:
+                filters.append((field, op, value))
+    return filters
+
+
+def project(record, fields):
+    """Return only `fields` of `record` (all of it when `fields` is None)."""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
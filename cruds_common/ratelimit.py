@@ -0,0 +1,236 @@
+"""Rate limiting and admission control shared by the advanced apps.
+
+Every request is a read (GET, HEAD, OPTIONS) or a write, and each kind has
+its own `Budget`, so a burst of writes cannot use up the capacity of reads:
+
+* token buckets per client and per route: a request takes one token, and a
+  bucket refills at `rate` tokens per second up to `burst`. An empty bucket
+  means `429 Too Many Requests`, with `Retry-After` set to the time until
+  the next token;
+* an admission gate: at most `max_in_flight` requests run at once, up to
+  `max_queue` more wait for a slot (`queue_timeout` seconds at most), and
+  the rest are shed with `503 Service Unavailable`.
+
+A request under its limits costs one dict lookup and some arithmetic per
+bucket, and a counter increment for the gate. The framework glue lives in
+`flask_cruds.ratelimit` and `fastapi_cruds.ratelimit`.
+"""
+import math
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from threading import Condition, Lock
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def request_kind(method):
+    """"read" or "write": which budget a request with this method uses."""
+    return "read" if method in READ_METHODS else "write"
+
+
+def retry_after(seconds):
+    """Value of a Retry-After header: whole seconds, at least 1."""
+    return str(max(1, math.ceil(seconds)))
+
+
+@dataclass(frozen=True)
+class Budget:
+    rate: float = 0.0  # requests/s per client, 0: unlimited
+    burst: int = 0  # bucket size per client, 0: same as rate
+    route_rate: float = 0.0  # requests/s per route over all clients, 0: unlimited
+    route_burst: int = 0
+    max_in_flight: int = 0  # requests running at once, 0: unlimited
+    max_queue: int = 0  # requests waiting for a slot
+    queue_timeout: float = 1.0  # seconds a request may wait for a slot
+
+    @classmethod
+    def from_env(cls, kind, **defaults):
+        """Read $CRUD_<KIND>_RATE, _BURST, _ROUTE_RATE, _ROUTE_BURST, _MAX_IN_FLIGHT, _MAX_QUEUE
+        and _QUEUE_TIMEOUT (e.g. CRUD_WRITE_RATE), falling back to `defaults`."""
+        base = cls(**defaults)
+        prefix = f"CRUD_{kind.upper()}_"
+        return cls(
+            rate=float(os.environ.get(prefix + "RATE", base.rate)),
+            burst=int(os.environ.get(prefix + "BURST", base.burst)),
+            route_rate=float(os.environ.get(prefix + "ROUTE_RATE", base.route_rate)),
+            route_burst=int(os.environ.get(prefix + "ROUTE_BURST", base.route_burst)),
+            max_in_flight=int(os.environ.get(prefix + "MAX_IN_FLIGHT", base.max_in_flight)),
+            max_queue=int(os.environ.get(prefix + "MAX_QUEUE", base.max_queue)),
+            queue_timeout=float(os.environ.get(prefix + "QUEUE_TIMEOUT", base.queue_timeout)),
+        )
+
+
+class TokenBuckets:
+    """One token bucket per key, refilled at `rate` tokens per second up to `burst`.
+
+    Buckets are created full on first use. At most `max_keys` are kept: when
+    a new key would exceed that, full buckets (which hold no state worth
+    keeping) are dropped, else the oldest one.
+    """
+
+    def __init__(self, rate, burst=0, max_keys=10_000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst or max(1, math.ceil(rate))
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}  # key -> (tokens, time of the last update)
+        self._lock = Lock()
+
+    def take(self, key):
+        """Take a token for `key`. Return 0.0 if one was available, else the seconds until there is one."""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict(now)
+                tokens = self.burst
+            else:
+                tokens = bucket[0] + (now - bucket[1]) * self.rate
+                if tokens > self.burst:
+                    tokens = self.burst
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def _evict(self, now):
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+        if not full:
+            del self._buckets[next(iter(self._buckets))]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RateLimiter:
+    """Token buckets per client and per route for reads and writes, plus their admission settings."""
+
+    def __init__(self, read=Budget(), write=Budget(), max_clients=10_000, clock=time.monotonic):
+        self.budgets = {"read": read, "write": write}
+        self._clients = {kind: TokenBuckets(budget.rate, budget.burst, max_clients, clock)
+                         for kind, budget in self.budgets.items() if budget.rate > 0}
+        self._routes = {kind: TokenBuckets(budget.route_rate, budget.route_burst, max_clients, clock)
+                        for kind, budget in self.budgets.items() if budget.route_rate > 0}
+
+    @classmethod
+    def from_env(cls):
+        """Rates are off unless configured (they depend on the deployment); in-flight limits are on:
+        64 reads (256 queued) and 16 writes (64 queued) at once, see `Budget.from_env`."""
+        return cls(read=Budget.from_env("read", max_in_flight=64, max_queue=256),
+                   write=Budget.from_env("write", max_in_flight=16, max_queue=64),
+                   max_clients=int(os.environ.get("CRUD_RATE_MAX_CLIENTS", 10_000)))
+
+    @property
+    def checks_routes(self):
+        """True if some budget has a per-route rate (the glue only resolves routes then)."""
+        return bool(self._routes)
+
+    def check(self, kind, client, route=None):
+        """Take a token from the client's and the route's bucket. Return 0.0, or the seconds to wait."""
+        buckets = self._clients.get(kind)
+        if buckets is not None:
+            wait = buckets.take(client)
+            if wait:
+                return wait
+        buckets = self._routes.get(kind)
+        if buckets is not None and route is not None:
+            return buckets.take(route)
+        return 0.0
+
+
+class AdmissionGate:
+    """At most `limit` requests in flight (0: no limit); up to `queue` more wait `timeout` seconds.
+
+    For threaded servers: `acquire()` blocks the calling thread while queued.
+    """
+
+    def __init__(self, limit, queue=0, timeout=1.0):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._lock = Lock()
+        self._cond = Condition(self._lock)  # only queued requests touch the (slower) condition
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if need be. Return False if the request must be shed."""
+        with self._lock:
+            if not self.limit or self.in_flight < self.limit:
+                self.in_flight += 1
+                return True
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._cond.wait_for(lambda: self.in_flight < self.limit, self.timeout)
+            finally:
+                self.waiting -= 1
+            if admitted:
+                self.in_flight += 1
+            return admitted
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            if self.waiting:
+                self._cond.notify()
+
+
+class AsyncAdmissionGate:
+    """`AdmissionGate` for an event loop: queued requests await a future instead of blocking."""
+
+    def __init__(self, limit, queue=0, timeout=1.0):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        if not self.limit or self.in_flight < self.limit:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.queue:
+            return False
+        import asyncio  # here, not at the top: thread-only (Flask) apps never pay for importing it
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # `release` hands its slot over by resolving the future: in_flight stays as is
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            if not waiter.cancelled():
+                self.release()  # handed a slot while being cancelled: pass it on
+            raise
+        finally:
+            if waiter.cancelled():
+                self._waiters.remove(waiter)
+        return not waiter.cancelled()
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+def admission_gates(limiter, gate_class):
+    """One gate per request kind, sized from the limiter's budgets."""
+    return {kind: gate_class(budget.max_in_flight, budget.max_queue, budget.queue_timeout)
+            for kind, budget in limiter.budgets.items()}
@@ -0,0 +1,85 @@
+"""Compact, read-only record types for the in-memory store.
+
+A plain dict costs ~180 bytes for three keys before counting its values;
+a slotted dataclass with the same fields costs 56. `record_type()` builds
+such a class that still reads like a dict (`record["name"]`, `.get()`,
+`**record`, `==` against dicts), so indexes and handlers keep working
+unchanged. orjson serializes dataclasses natively, so records only become
+dicts again if the stdlib JSON backend is in use.
+"""
+import sys
+from collections.abc import Mapping
+from dataclasses import fields as dataclass_fields, make_dataclass
+
+
+class CompactRecord:
+    """Read-only mapping interface over the slots of a record dataclass."""
+    __slots__ = ()
+    _fields = ()
+    _interned = frozenset()
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return a compact copy of `data`, or `data` itself if its keys don't match the fields."""
+        if isinstance(data, cls):
+            return data
+        if len(data) != len(cls._fields) or not all(field in data for field in cls._fields):
+            return data
+        values = []
+        for field in cls._fields:
+            value = data[field]
+            if field in cls._interned and type(value) is str:
+                value = sys.intern(value)
+            values.append(value)
+        return cls(*values)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self._fields}
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def keys(self):
+        return self._fields
+
+    def values(self):
+        return [getattr(self, field) for field in self._fields]
+
+    def items(self):
+        return [(field, getattr(self, field)) for field in self._fields]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+
+Mapping.register(CompactRecord)
+
+
+def record_type(name, fields, interned=()):
+    """Build a compact record class with the given fields.
+
+    Values of the `interned` fields are interned, so records that repeat a
+    value (a shared description, a status) share one string.
+    """
+    cls = make_dataclass(name, list(fields), bases=(CompactRecord,), slots=True, eq=False, frozen=False)
+    cls._fields = tuple(f.name for f in dataclass_fields(cls))
+    cls._interned = frozenset(interned)
+    return cls
@@ -0,0 +1,712 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from cruds_common.indexes import (SortedFieldIndex, SortedKeys, TrigramIndex, UniqueIndex, VersionIndex, normalize,
+                                  prefix_end)
+from cruds_common.locks import StripedLock
+from cruds_common.pagination import paginate, paginate_ordered
+from cruds_common.patch import patch_record
+from cruds_common.serialization import dumps, loads
+from cruds_common.store import IndexedStore
+
+
+class VersionConflict(Exception):
+    """A conditional write did not match the record's current version."""
+
+
+class StoreFull(Exception):
+    """A fixed-size backend has no room left for a write (shm: $CRUD_SHM_SLOTS and $CRUD_SHM_SIZE)."""
+
+
+class UniqueViolation(Exception):
+    """A write would give two records the same value of a unique field."""
+
+    def __init__(self, field, value):
+        super().__init__(f"{field} {value!r} is already in use")
+        self.field = field
+        self.value = value
+
+
+class Repository:
+    """Storage interface used by the Flask users and FastAPI items routes.
+
+    Records are plain dicts keyed by `key`. Listing is done in two steps:
+    `keys()` cuts a page of sorted keys, and `iter_many()` loads the records
+    for those keys in chunks, so large pages can be streamed.
+
+    `blocking` tells async callers whether calls may wait on I/O (see
+    `cruds_common.async_repository`).
+    """
+
+    blocking = True
+
+    def get(self, key):
+        """Return the record for `key`, or None."""
+        raise NotImplementedError
+
+    def get_versioned(self, key):
+        """Return `(record, version)` for `key`, or `(None, None)`.
+
+        Every write gives the record a new, never reused version.
+        """
+        raise NotImplementedError
+
+    def generation(self):
+        """Return a number that changes on every write to the repository."""
+        raise NotImplementedError
+
+    def insert(self, key, record):
+        """Store `record` if `key` is free. Return False if it already exists."""
+        raise NotImplementedError
+
+    def update(self, key, changes, upsert=False, precondition=None):
+        """Merge `changes` into the record for `key` as one atomic step.
+
+        Returns `(record, created)`. When the key is missing the record is
+        created from `changes` if `upsert` is true, else `(None, False)` is returned.
+        `precondition(current_version)` (e.g. from If-Match) must return true
+        for the write to happen, else VersionConflict is raised.
+        """
+        raise NotImplementedError
+
+    def patch(self, key, patch, precondition=None):
+        """Apply the JSON merge `patch` (see `cruds_common.patch`) to the record for `key` atomically.
+
+        Returns `(changed, version)`: the top-level fields that changed (None
+        if removed) and the record's version after the write, or `(None, None)`
+        when the key is missing. Only the changed fields' indexes are
+        updated, and a patch that changes nothing writes nothing.
+        `precondition` is as for `update`.
+        """
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Delete `key`. Return False if it did not exist."""
+        raise NotImplementedError
+
+    def lookup(self, field, value):
+        """Return the key whose unique `field` equals `value` (normalized), or None."""
+        raise NotImplementedError
+
+    def keys(self, limit=None, cursor=None, contains=None, filters=(), sort=None):
+        """Return one page of sorted keys and the next cursor (or None).
+
+        `contains` is an optional `(field, text)` case-insensitive substring filter.
+        `filters` are `(field, op, text)` matches on normalized values, with op
+        "eq" or "prefix". `sort` is a `(field, descending)` pair: keys are then
+        ordered by the field's normalized value, ties by key. A cursor that no
+        longer exists in a sorted listing raises ValueError.
+        """
+        raise NotImplementedError
+
+    def iter_many(self, keys, chunk_size=100):
+        """Yield `(key, record)` for the keys that still exist, in order."""
+        raise NotImplementedError
+
+    def apply_batch(self, ops, upsert=False):
+        """Apply many `(op, key, record)` writes in one critical section.
+
+        `op` is "create", "update" or "delete". Returns one outcome per op:
+        "created", "updated", "deleted", "exists", "not_found" or "conflict"
+        (a unique field already in use).
+        """
+        raise NotImplementedError
+
+    def subscribe(self, listener):
+        """Call `listener.on_set(key, old, record)`, `listener.on_delete(key, old)`
+        and `listener.clear()` after every write made through this repository.
+
+        `old` may be None when the backend does not know the previous record.
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+BATCH_OPS = ("create", "update", "delete")
+FILTER_OPS = ("eq", "prefix")
+
+
+def field_expr(field):
+    """SQL for the normalized value of `field` in the JSON `doc` column (the Python `normalize`, or '')."""
+    if not field.isidentifier():
+        raise ValueError(f"Invalid field name: {field!r}")
+    return f"coalesce(lower(trim(json_extract(doc, '$.{field}'))), '')"
+
+
+def check_batch(ops):
+    """Reject a batch with an unknown op before any of it is applied."""
+    for op, _, _ in ops:
+        if op not in BATCH_OPS:
+            raise ValueError(f"Unknown batch op: {op}")
+
+
+def apply_op(repo, op, key, record, upsert=False):
+    """Apply a single batch write to `repo` and return its outcome."""
+    try:
+        if op == "create":
+            return "created" if repo.insert(key, record) else "exists"
+        if op == "update":
+            result, created = repo.update(key, record, upsert=upsert)
+            if result is None:
+                return "not_found"
+            return "created" if created else "updated"
+    except UniqueViolation:
+        return "conflict"
+    except StoreFull:
+        return "full"
+    return "deleted" if repo.delete(key) else "not_found"
+
+
+class DictRepository(Repository):
+    """In-process backend over an `IndexedStore` (the historical `fake_db`).
+
+    Reads take no lock. Writes lock only the stripe of their key, so writers
+    on different keys proceed in parallel; the indexes guard their own state.
+    Values of `unique_fields` are claimed in their index before the write,
+    which is how two writers on different keys cannot both take one value.
+    `sorted_fields` get a sorted index for filters and ordering; other
+    fields can still be filtered or sorted on, by scanning the store.
+    """
+
+    blocking = False
+
+    def __init__(self, store=None, search_fields=(), stripes=64, version_start=0, unique_fields=(),
+                 sorted_fields=()):
+        self.store = store if store is not None else IndexedStore()
+        self._locks = StripedLock(stripes)
+        self._sorted_keys = self.store.add_index(SortedKeys())
+        self._versions = self.store.add_index(VersionIndex(version_start))
+        self._search = {field: self.store.add_index(TrigramIndex(field)) for field in search_fields}
+        self._unique = {field: self.store.add_index(UniqueIndex(field)) for field in unique_fields}
+        self._sorted = {field: self.store.add_index(SortedFieldIndex(field)) for field in sorted_fields}
+
+    def _claim(self, key, record, fields=None):
+        claimed = []
+        for field, index in self._unique.items():
+            if fields is not None and field not in fields:
+                continue
+            if not index.claim(key, record):
+                for other in claimed:
+                    other.release(key, record)
+                raise UniqueViolation(field, record.get(field))
+            claimed.append(index)
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def get_versioned(self, key):
+        return self._versions.get(key)
+
+    def generation(self):
+        return self._versions.generation
+
+    def insert(self, key, record):
+        with self._locks.for_key(key):
+            if key in self.store:
+                return False
+            if self._unique:
+                self._claim(key, record)
+            self.store[key] = record
+            return True
+
+    def update(self, key, changes, upsert=False, precondition=None):
+        with self._locks.for_key(key):
+            old, version = self._versions.get(key)
+            if precondition is not None and not precondition(version):
+                raise VersionConflict(key)
+            if old is None:
+                if not upsert:
+                    return None, False
+                record, created = dict(changes), True
+            else:
+                record, created = {**old, **changes}, False
+            if self._unique:
+                self._claim(key, record)
+            self.store[key] = record
+            return self.store[key], created
+
+    def patch(self, key, patch, precondition=None):
+        with self._locks.for_key(key):
+            old, version = self._versions.get(key)
+            if precondition is not None and not precondition(version):
+                raise VersionConflict(key)
+            if old is None:
+                return None, None
+            record, changed = patch_record(old, patch)
+            if not changed:
+                return changed, version
+            if self._unique:
+                self._claim(key, record, changed)
+            self.store.set(key, record, changed)
+            return changed, self._versions.get(key)[1]
+
+    def delete(self, key):
+        with self._locks.for_key(key):
+            if key not in self.store:
+                return False
+            del self.store[key]
+            return True
+
+    def lookup(self, field, value):
+        index = self._unique.get(field)
+        if index is None:
+            raise ValueError(f"{field} is not a unique field")
+        key = index.lookup(value)
+        # A claim may precede its write by a moment: confirm against the record
+        record = self.store.get(key) if key is not None else None
+        if record is None or normalize(record.get(field)) != normalize(value):
+            return None
+        return key
+
+    def apply_batch(self, ops, upsert=False):
+        check_batch(ops)
+        with self._locks.for_keys(key for _, key, _ in ops):
+            return [apply_op(self, op, key, record, upsert) for op, key, record in ops]
+
+    def keys(self, limit=None, cursor=None, contains=None, filters=(), sort=None):
+        if contains is None and not filters and sort is None:
+            return paginate(self._sorted_keys.keys, limit, cursor)
+        matches = self._filter(filters, contains)
+        if sort is None:
+            return paginate(sorted(matches), limit, cursor)
+        field, descending = sort
+        index = self._sorted.get(field)
+        if index is not None and matches is None:
+            return index.page(limit, cursor, descending)
+        if matches is None:
+            matches = list(self._sorted_keys.keys)
+        if index is not None:
+            value = index.value
+        else:
+            value = lambda key: normalize((self.store.get(key) or {}).get(field)) or ""
+        ordered = sorted(matches, key=lambda key: (value(key), key), reverse=descending)
+        return paginate_ordered(ordered, limit, cursor)
+
+    def _filter(self, filters, contains):
+        """Keys matching every filter (None when there are none), smallest match set first."""
+        matches = []
+        for field, op, text in filters:
+            if op not in FILTER_OPS:
+                raise ValueError(f"Unknown filter op: {op}")
+            index = self._sorted.get(field)
+            if index is not None:
+                matches.append(index.match(op, text))
+            else:
+                matches.append(self._scan(field, op, text))
+        if contains is not None:
+            field, text = contains
+            index = self._search.get(field)
+            if index is not None:
+                matches.append(index.search(text))
+            else:
+                needle = text.lower()
+                matches.append({k for k, v in self.store.items() if needle in str(v.get(field, "")).lower()})
+        if not matches:
+            return None
+        matches.sort(key=len)
+        return set(matches[0]).intersection(*matches[1:])
+
+    def _scan(self, field, op, text):
+        text = normalize(text) or ""
+        if op == "eq":
+            return [k for k, v in self.store.items() if (normalize(v.get(field)) or "") == text]
+        return [k for k, v in self.store.items() if (normalize(v.get(field)) or "").startswith(text)]
+
+    def iter_many(self, keys, chunk_size=100):
+        for key in keys:
+            record = self.store.get(key)
+            if record is not None:
+                yield key, record
+
+    def subscribe(self, listener):
+        # Listeners share the index protocol, so the store notifies them directly
+        return self.store.add_index(listener)
+
+    def __len__(self):
+        return len(self.store)
+
+    def clear(self):
+        with self._locks.for_all():
+            self.store.clear()
+
+
+class ConnectionPool:
+    """Per-process pool of SQLite connections in WAL mode.
+
+    Each worker process lazily opens its own connections and drops the
+    inherited ones after a fork. At most `size` idle connections are kept.
+    """
+
+    def __init__(self, path, size=4, timeout=5.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        import sqlite3  # here, not at the top: only the SQLite backend needs it
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if os.getpid() != self._pid:
+            # Forked: the parent's connections must not be shared with the child
+            self._pid = os.getpid()
+            self._idle = queue.LifoQueue()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if self._idle.qsize() < self.size:
+                self._idle.put_nowait(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+@contextmanager
+def transaction(conn):
+    """Run a write transaction, taking the database write lock up front.
+
+    Inside an already open transaction (a batch) this is a no-op.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SQLiteRepository(Repository):
+    """SQLite backend shared by every worker process on the host.
+
+    Records are stored as JSON text next to their key and version. Versions
+    come from a per-table generation counter bumped in the same transaction as
+    each write. SQL strings are built once so each connection reuses its
+    cached prepared statements. `sorted_fields` get an expression index on
+    their normalized value, used by filters and sorting.
+    """
+
+    def __init__(self, path, table, key_type=str, pool_size=4, unique_fields=(), sorted_fields=()):
+        self.table = table
+        self.key_type = key_type
+        self.unique_fields = tuple(unique_fields)
+        self.pool = ConnectionPool(path, size=pool_size)
+        self._local = threading.local()
+        self._listeners = []
+        column = "INTEGER" if key_type is int else "TEXT"
+        with self.pool.connection() as conn, transaction(conn):
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                         f"(key {column} PRIMARY KEY, doc TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0)")
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if "version" not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table}_meta "
+                         f"(id INTEGER PRIMARY KEY CHECK (id = 0), generation INTEGER NOT NULL)")
+            conn.execute(f"INSERT OR IGNORE INTO {table}_meta (id, generation) VALUES (0, 0)")
+            if self.unique_fields:
+                # Normalized unique values live in their own table, so Python decides the normalization
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table}_unique "
+                             f"(field TEXT NOT NULL, value TEXT NOT NULL, key {column} NOT NULL, "
+                             f"PRIMARY KEY (field, value))")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_unique_key ON {table}_unique (key)")
+                for field in self.unique_fields:
+                    if conn.execute(f"SELECT 1 FROM {table}_unique WHERE field = ? LIMIT 1", (field,)).fetchone():
+                        continue
+                    for key, doc in conn.execute(f"SELECT key, doc FROM {table}").fetchall():
+                        value = normalize(loads(doc).get(field))
+                        if value is not None:
+                            conn.execute(f"INSERT OR IGNORE INTO {table}_unique (field, value, key) VALUES (?, ?, ?)",
+                                         (field, value, key))
+            for field in sorted_fields:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_by_{field} ON {table} ({field_expr(field)}, key)")
+
+        self._sql_get = f"SELECT doc, version FROM {table} WHERE key = ?"
+        self._sql_put = f"INSERT OR REPLACE INTO {table} (key, doc, version) VALUES (?, ?, ?)"
+        self._sql_delete = f"DELETE FROM {table} WHERE key = ? RETURNING doc"
+        self._sql_generation = f"SELECT generation FROM {table}_meta WHERE id = 0"
+        self._sql_bump = f"UPDATE {table}_meta SET generation = generation + 1 WHERE id = 0 RETURNING generation"
+        self._sql_keys = f"SELECT key FROM {table} WHERE (?1 IS NULL OR key > ?1) ORDER BY key LIMIT ?2"
+        self._sql_search = (
+            f"SELECT key FROM {table} WHERE (?1 IS NULL OR key > ?1) "
+            f"AND instr(lower(json_extract(doc, ?3)), lower(?4)) > 0 ORDER BY key LIMIT ?2"
+        )
+        self._sql_count = f"SELECT count(*) FROM {table}"
+        self._sql_clear = f"DELETE FROM {table}"
+        self._sql_unique_owner = f"SELECT key FROM {table}_unique WHERE field = ? AND value = ?"
+        self._sql_unique_put = f"INSERT INTO {table}_unique (field, value, key) VALUES (?, ?, ?)"
+        self._sql_unique_delete = f"DELETE FROM {table}_unique WHERE key = ?"
+        self._sql_unique_clear = f"DELETE FROM {table}_unique"
+
+    @contextmanager
+    def _connection(self):
+        # Reuse the connection of a batch running on this thread
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+        else:
+            with self.pool.connection() as conn:
+                yield conn
+
+    def _notify(self, event, *args):
+        # Inside a batch, listeners only hear about writes once they are committed
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.append((event, args))
+            return
+        for listener in self._listeners:
+            getattr(listener, event)(*args)
+
+    def _bump(self, conn):
+        return conn.execute(self._sql_bump).fetchone()[0]
+
+    def _claim(self, conn, key, record, replace):
+        """Record the unique values of `record` for `key` (inside the write transaction)."""
+        values = [(field, normalize(record.get(field))) for field in self.unique_fields]
+        for field, value in values:
+            if value is None:
+                continue
+            row = conn.execute(self._sql_unique_owner, (field, value)).fetchone()
+            if row is not None and row[0] != key:
+                raise UniqueViolation(field, record.get(field))
+        if replace:
+            conn.execute(self._sql_unique_delete, (key,))
+        for field, value in values:
+            if value is not None:
+                conn.execute(self._sql_unique_put, (field, value, key))
+
+    def get(self, key):
+        return self.get_versioned(key)[0]
+
+    def get_versioned(self, key):
+        with self._connection() as conn:
+            row = conn.execute(self._sql_get, (key,)).fetchone()
+        return (loads(row[0]), row[1]) if row else (None, None)
+
+    def generation(self):
+        with self._connection() as conn:
+            return conn.execute(self._sql_generation).fetchone()[0]
+
+    def insert(self, key, record):
+        with self._connection() as conn, transaction(conn):
+            if conn.execute(self._sql_get, (key,)).fetchone():
+                return False
+            if self.unique_fields:
+                self._claim(conn, key, record, replace=False)
+            conn.execute(self._sql_put, (key, dumps(record).decode(), self._bump(conn)))
+        self._notify("on_set", key, None, record)
+        return True
+
+    def update(self, key, changes, upsert=False, precondition=None):
+        with self._connection() as conn, transaction(conn):
+            row = conn.execute(self._sql_get, (key,)).fetchone()
+            if precondition is not None and not precondition(row[1] if row else None):
+                raise VersionConflict(key)
+            if row is None and not upsert:
+                return None, False
+            old = loads(row[0]) if row else None
+            record = {**old, **changes} if row else dict(changes)
+            if self.unique_fields:
+                self._claim(conn, key, record, replace=row is not None)
+            conn.execute(self._sql_put, (key, dumps(record).decode(), self._bump(conn)))
+        self._notify("on_set", key, old, record)
+        return record, row is None
+
+    def patch(self, key, patch, precondition=None):
+        with self._connection() as conn, transaction(conn):
+            row = conn.execute(self._sql_get, (key,)).fetchone()
+            if precondition is not None and not precondition(row[1] if row else None):
+                raise VersionConflict(key)
+            if row is None:
+                return None, None
+            old = loads(row[0])
+            record, changed = patch_record(old, patch)
+            if not changed:
+                return changed, row[1]
+            if not changed.keys().isdisjoint(self.unique_fields):
+                self._claim(conn, key, record, replace=True)
+            version = self._bump(conn)
+            conn.execute(self._sql_put, (key, dumps(record).decode(), version))
+        self._notify("on_set", key, old, record)
+        return changed, version
+
+    def delete(self, key):
+        with self._connection() as conn, transaction(conn):
+            row = conn.execute(self._sql_delete, (key,)).fetchone()
+            if row is not None:
+                self._bump(conn)
+                if self.unique_fields:
+                    conn.execute(self._sql_unique_delete, (key,))
+        if row is None:
+            return False
+        self._notify("on_delete", key, loads(row[0]))
+        return True
+
+    def lookup(self, field, value):
+        if field not in self.unique_fields:
+            raise ValueError(f"{field} is not a unique field")
+        with self._connection() as conn:
+            row = conn.execute(self._sql_unique_owner, (field, normalize(value))).fetchone()
+        return row[0] if row else None
+
+    def keys(self, limit=None, cursor=None, contains=None, filters=(), sort=None):
+        if cursor is not None:
+            cursor = self.key_type(cursor)
+        # Fetch one extra key to learn whether there is a next page
+        fetch = -1 if limit is None else limit + 1
+        with self._connection() as conn:
+            if not filters and sort is None:
+                if contains is None:
+                    rows = conn.execute(self._sql_keys, (cursor, fetch)).fetchall()
+                else:
+                    field, text = contains
+                    rows = conn.execute(self._sql_search, (cursor, fetch, f"$.{field}", text)).fetchall()
+            else:
+                rows = conn.execute(*self._query(conn, cursor, fetch, contains, filters, sort)).fetchall()
+        keys = [row[0] for row in rows]
+        if limit is not None and len(keys) > limit:
+            return keys[:limit], keys[limit - 1]
+        return keys, None
+
+    def _query(self, conn, cursor, fetch, contains, filters, sort):
+        """Build the SELECT for a filtered or sorted listing (the range conditions can use the field indexes)."""
+        where, params = [], []
+        for field, op, text in filters:
+            if op not in FILTER_OPS:
+                raise ValueError(f"Unknown filter op: {op}")
+            expr, text = field_expr(field), normalize(text) or ""
+            if op == "eq":
+                where.append(f"{expr} = ?")
+                params.append(text)
+            else:
+                where.append(f"{expr} >= ?")
+                params.append(text)
+                end = prefix_end(text)
+                if end is not None:
+                    where.append(f"{expr} < ?")
+                    params.append(end)
+        if contains is not None:
+            field, text = contains
+            where.append("instr(lower(json_extract(doc, ?)), lower(?)) > 0")
+            params += [f"$.{field}", text]
+        if sort is None:
+            order = "key"
+            if cursor is not None:
+                where.append("key > ?")
+                params.append(cursor)
+        else:
+            field, descending = sort
+            expr, direction = field_expr(field), "DESC" if descending else "ASC"
+            order = f"{expr} {direction}, key {direction}"
+            if cursor is not None:
+                row = conn.execute(f"SELECT {expr} FROM {self.table} WHERE key = ?", (cursor,)).fetchone()
+                if row is None:
+                    raise ValueError(f"Unknown cursor: {cursor}")
+                where.append(f"({expr}, key) {'<' if descending else '>'} (?, ?)")
+                params += [row[0], cursor]
+        sql = f"SELECT key FROM {self.table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return f"{sql} ORDER BY {order} LIMIT ?", (*params, fetch)
+
+    def iter_many(self, keys, chunk_size=100):
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            with self._connection() as conn:
+                rows = dict(conn.execute(
+                    f"SELECT key, doc FROM {self.table} WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+            for key in chunk:
+                if key in rows:
+                    yield key, loads(rows[key])
+
+    def apply_batch(self, ops, upsert=False):
+        check_batch(ops)
+        self._local.pending = []
+        try:
+            with self.pool.connection() as conn, transaction(conn):
+                self._local.conn = conn
+                try:
+                    outcomes = [apply_op(self, op, key, record, upsert) for op, key, record in ops]
+                finally:
+                    self._local.conn = None
+        finally:
+            pending, self._local.pending = self._local.pending, None
+        for event, args in pending:
+            self._notify(event, *args)
+        return outcomes
+
+    def __len__(self):
+        with self._connection() as conn:
+            return conn.execute(self._sql_count).fetchone()[0]
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def clear(self):
+        with self._connection() as conn, transaction(conn):
+            conn.execute(self._sql_clear)
+            if self.unique_fields:
+                conn.execute(self._sql_unique_clear)
+            self._bump(conn)
+        self._notify("clear")
+
+
+def open_repository(table, key_type, store=None, search_fields=(), unique_fields=(), sorted_fields=(), url=None):
+    """Build the repository selected by `url` (default: $CRUD_STORAGE_URL).
+
+    `memory://` (the default) keeps records in `store`; `wal:///path/to/dir`
+    also logs every write to `dir/<table>` and recovers them on startup;
+    `sqlite:///path/to.db` shares them through a SQLite file; `shm:///dev/shm/dir`
+    shares them through a hash table in `dir/<table>.shm`, mapped by every worker.
+    """
+    url = url or os.environ.get("CRUD_STORAGE_URL", "memory://")
+    if url.startswith("sqlite:///"):
+        return SQLiteRepository(url[len("sqlite:///"):], table, key_type=key_type, unique_fields=unique_fields,
+                                sorted_fields=sorted_fields)
+    if url.startswith("wal:///"):
+        from cruds_common.wal import WALRepository
+        return WALRepository(os.path.join(url[len("wal:///"):], table), store, search_fields=search_fields,
+                             unique_fields=unique_fields, sorted_fields=sorted_fields,
+                             fsync=os.environ.get("CRUD_WAL_FSYNC", "always"),
+                             snapshot_every=int(os.environ.get("CRUD_WAL_SNAPSHOT_EVERY", 100_000)))
+    if url.startswith("shm:///"):
+        from cruds_common.shm import SharedMemoryRepository
+        return SharedMemoryRepository(os.path.join(url[len("shm://"):], table), key_type,
+                                      search_fields=search_fields, unique_fields=unique_fields,
+                                      sorted_fields=sorted_fields,
+                                      slots=int(os.environ.get("CRUD_SHM_SLOTS", 1 << 17)),
+                                      heap_size=int(os.environ.get("CRUD_SHM_SIZE", 64 << 20)))
+    if url == "memory://":
+        return DictRepository(store, search_fields=search_fields, unique_fields=unique_fields,
+                              sorted_fields=sorted_fields)
+    raise ValueError(f"Unsupported storage URL: {url}")
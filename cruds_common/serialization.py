@@ -0,0 +1,55 @@
+"""JSON encoding shared by both frameworks.
+
+orjson is used when it is installed, else the standard library. Set
+$CRUD_JSON=stdlib (or call `use("stdlib")`) to force the fallback.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+
+_backend = None
+
+
+def use(name):
+    """Select the JSON backend: "orjson" or "stdlib"."""
+    global _backend
+    if name == "orjson" and orjson is None:
+        raise RuntimeError("orjson is not installed")
+    if name not in ("orjson", "stdlib"):
+        raise ValueError(f"Unknown JSON backend: {name}")
+    _backend = name
+
+
+def backend():
+    return _backend
+
+
+def _default(obj):
+    # Pydantic models, compact store records and other objects that know how to turn into a dict
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Encode `obj` as compact UTF-8 JSON bytes."""
+    if _backend == "orjson":
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data):
+    if _backend == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+use(os.environ.get("CRUD_JSON") or ("orjson" if orjson is not None else "stdlib"))
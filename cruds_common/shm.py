@@ -0,0 +1,529 @@
+"""Shared-memory backend: a hash table in an mmap'd file, used by every worker on the host.
+
+    CRUD_STORAGE_URL=shm:///dev/shm/crud gunicorn -w 4 flask_cruds.advanced:app
+
+Every worker process maps the same file (under /dev/shm it lives in RAM
+only), so the records are stored once per host rather than once per
+worker, and a write is seen by all workers at once. The file holds a
+header, an open-addressing slot array and a heap of `[key length][key][JSON]`
+entries; an update appends the new entry and repoints the slot, and
+the heap is compacted in place when it fills up.
+
+Readers take no lock. The header holds a sequence counter that writers
+make odd for the duration of a write (a seqlock): a reader copies what it
+needs and retries if the counter moved meanwhile. Writers serialize on a
+thread lock plus `flock` on a lock file next to the table, which the
+kernel releases if a worker dies.
+
+Capacity is fixed when the file is created: $CRUD_SHM_SLOTS slots (at most
+3/4 of them used) and a $CRUD_SHM_SIZE byte heap; beyond that writes raise
+StoreFull; a write checks every table it touches for room before writing
+to any of them.
+
+Plain listings (`GET /users` pages) walk the shared slot array and read the
+keys only; each process keeps just that sorted key list. Filtered, sorted or
+searched listings are different: they run against a per-process
+`DictRepository` holding a full copy of the records, rebuilt whenever the
+generation changed. That copy costs the memory the shared table saves, in
+every worker that serves such queries, so they suit small or read-mostly
+tables.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from cruds_common.indexes import normalize
+from cruds_common.pagination import paginate
+from cruds_common.patch import patch_record
+from cruds_common.repository import (DictRepository, Repository, StoreFull, UniqueViolation, VersionConflict, apply_op,
+                                     check_batch)
+from cruds_common.serialization import dumps, loads
+from cruds_common.store import IndexedStore
+
+MAGIC = b"CRUDSHM1"
+HEADER = struct.Struct("<8sQQQQQQQ")  # magic, seq, generation, slots, heap size, count, used slots, heap end
+SLOT = struct.Struct("<IIQQ")  # key hash, entry length, entry offset, version
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+SEQ, GENERATION, COUNT, USED, HEAP_END = 8, 16, 40, 48, 56  # header field offsets
+EMPTY, TOMBSTONE = 0, 1  # special slot offsets (real entries start after the slot array)
+MAX_LOAD = 0.75
+READ_ATTEMPTS = 100  # optimistic reads before a reader falls back to the write lock
+
+
+class _TornRead(Exception):
+    pass
+
+
+class ProcessLock:
+    """Re-entrant lock shared by the threads of this process and by other processes (`flock` on `path`)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._open()
+        # A forked worker must not share the parent's open file: flock would not exclude them
+        os.register_at_fork(after_in_child=self._open)
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+
+class SharedHashTable:
+    """Byte keys to byte values (plus a version each) in a file mapped by every process.
+
+    Reads are lock-free; mutations must hold `lock` (a `ProcessLock`), which
+    is also taken to create the file so workers starting together agree on it.
+    """
+
+    def __init__(self, path, lock, slots=1 << 17, heap_size=64 << 20):
+        self.path = path
+        self.lock = lock
+        with lock:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                header = os.pread(fd, HEADER.size, 0)
+                if len(header) == HEADER.size:
+                    magic, _, _, slots, heap_size, _, _, _ = HEADER.unpack(header)
+                    if magic != MAGIC:
+                        raise ValueError(f"{path} is not a shared table")
+                elif slots & (slots - 1):
+                    raise ValueError("slots must be a power of two")
+                size = HEADER.size + slots * SLOT.size + heap_size
+                if len(header) != HEADER.size:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, 0, 0, slots, heap_size, 0, 0, HEADER.size + slots * SLOT.size), 0)
+                self._mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        self.slots = slots
+        self.heap_size = heap_size
+        self._mask = slots - 1
+        self._heap_start = HEADER.size + slots * SLOT.size
+        self._heap_limit = self._heap_start + heap_size
+
+    def _u64(self, offset):
+        return U64.unpack_from(self._mm, offset)[0]
+
+    @property
+    def generation(self):
+        return self._u64(GENERATION)
+
+    def __len__(self):
+        return self._u64(COUNT)
+
+    # Reads
+    def _read(self, fn, *args):
+        """Return `fn(*args)` computed on a state no write overlapped (seqlock), else under the lock."""
+        mm = self._mm
+        for attempt in range(READ_ATTEMPTS):
+            seq = U64.unpack_from(mm, SEQ)[0]
+            if not seq & 1:
+                try:
+                    result = fn(*args)
+                except (_TornRead, struct.error, IndexError, ValueError):
+                    result = _TornRead
+                if result is not _TornRead and U64.unpack_from(mm, SEQ)[0] == seq:
+                    return result
+            if attempt > 3:
+                time.sleep(0)
+        with self.lock:
+            seq = self._u64(SEQ)
+            if seq & 1:  # a writer died mid-write
+                U64.pack_into(mm, SEQ, seq + 1)
+            return fn(*args)
+
+    def _find(self, key):
+        """`(slot holding key or None, first reusable slot)` for `key`."""
+        mm = self._mm
+        h = zlib.crc32(key)
+        i = h & self._mask
+        free = None
+        for _ in range(self.slots):
+            slot_hash, _, offset, _ = SLOT.unpack_from(mm, HEADER.size + i * SLOT.size)
+            if offset == EMPTY:
+                return None, (i if free is None else free)
+            if offset == TOMBSTONE:
+                if free is None:
+                    free = i
+            elif slot_hash == h:
+                if not self._heap_start <= offset < self._heap_limit:
+                    raise _TornRead
+                length = U32.unpack_from(mm, offset)[0]
+                if length == len(key) and mm[offset + 4:offset + 4 + length] == key:
+                    return i, free
+            i = (i + 1) & self._mask
+        return None, free
+
+    def _get(self, key):
+        i, _ = self._find(key)
+        if i is None:
+            return None, None
+        _, length, offset, version = SLOT.unpack_from(self._mm, HEADER.size + i * SLOT.size)
+        key_length = U32.unpack_from(self._mm, offset)[0]
+        return self._mm[offset + 4 + key_length:offset + length], version
+
+    def get(self, key):
+        """`(value, version)` for `key`, or `(None, None)`."""
+        return self._read(self._get, key)
+
+    def _items(self):
+        mm = self._mm
+        items = []
+        for i in range(self.slots):
+            _, length, offset, version = SLOT.unpack_from(mm, HEADER.size + i * SLOT.size)
+            if offset > TOMBSTONE:
+                entry = mm[offset:offset + length]
+                key_length = U32.unpack_from(entry)[0]
+                items.append((entry[4:4 + key_length], entry[4 + key_length:], version))
+        return self.generation, items
+
+    def items(self):
+        """`(generation, [(key, value, version)])`: one consistent snapshot of the table."""
+        return self._read(self._items)
+
+    def _keys(self):
+        mm = self._mm
+        keys = []
+        for i in range(self.slots):
+            _, _, offset, _ = SLOT.unpack_from(mm, HEADER.size + i * SLOT.size)
+            if offset > TOMBSTONE:
+                key_length = U32.unpack_from(mm, offset)[0]
+                keys.append(mm[offset + 4:offset + 4 + key_length])
+        return self.generation, keys
+
+    def keys(self):
+        """`(generation, [key])`, like `items` without copying the values."""
+        return self._read(self._keys)
+
+    # Writes (the caller holds `lock`)
+    def _begin(self):
+        seq = self._u64(SEQ)
+        U64.pack_into(self._mm, SEQ, seq | 1)
+        return (seq | 1) + 1
+
+    def _end(self, seq):
+        U64.pack_into(self._mm, SEQ, seq)
+
+    def bump(self):
+        """Increment and return the generation."""
+        generation = self.generation + 1
+        U64.pack_into(self._mm, GENERATION, generation)
+        return generation
+
+    def reserve(self, key, size):
+        """Make room for a `put` of `key` with a `size`-byte value, or raise StoreFull.
+
+        Nothing is written (compaction aside), and the room stays there for
+        as long as the caller holds `lock`: writes to several tables check
+        each of them first, so they either all happen or none does.
+        """
+        length = 4 + len(key) + size
+        if self._u64(HEAP_END) + length > self._heap_limit:
+            self._rewrite(compact=True)
+            if self._u64(HEAP_END) + length > self._heap_limit:
+                raise StoreFull(f"{self.path}: heap full ({self.heap_size} bytes)")
+        i, _ = self._find(key)
+        if i is None and self._u64(USED) + 1 > self.slots * MAX_LOAD:
+            if len(self) + 1 > self.slots * MAX_LOAD:
+                raise StoreFull(f"{self.path}: all {self.slots} slots used")
+            self._rewrite(compact=False)  # drop the tombstones
+
+    def put(self, key, value, version=0):
+        self.reserve(key, len(value))
+        length = 4 + len(key) + len(value)
+        i, free = self._find(key)
+        mm = self._mm
+        seq = self._begin()
+        try:
+            offset = self._u64(HEAP_END)
+            mm[offset:offset + length] = U32.pack(len(key)) + key + value
+            U64.pack_into(mm, HEAP_END, offset + length)
+            if i is None:
+                i = free
+                if SLOT.unpack_from(mm, HEADER.size + i * SLOT.size)[2] == EMPTY:
+                    U64.pack_into(mm, USED, self._u64(USED) + 1)
+                U64.pack_into(mm, COUNT, self._u64(COUNT) + 1)
+            SLOT.pack_into(mm, HEADER.size + i * SLOT.size, zlib.crc32(key), length, offset, version)
+        finally:
+            self._end(seq)
+
+    def delete(self, key):
+        """Remove `key`; return False if it was missing."""
+        i, _ = self._find(key)
+        if i is None:
+            return False
+        seq = self._begin()
+        try:
+            slot_hash, _, _, _ = SLOT.unpack_from(self._mm, HEADER.size + i * SLOT.size)
+            SLOT.pack_into(self._mm, HEADER.size + i * SLOT.size, slot_hash, 0, TOMBSTONE, 0)
+            U64.pack_into(self._mm, COUNT, self._u64(COUNT) - 1)
+        finally:
+            self._end(seq)
+        return True
+
+    def clear(self):
+        seq = self._begin()
+        try:
+            self._mm[HEADER.size:self._heap_start] = bytes(self._heap_start - HEADER.size)
+            for field, value in ((COUNT, 0), (USED, 0), (HEAP_END, self._heap_start)):
+                U64.pack_into(self._mm, field, value)
+        finally:
+            self._end(seq)
+
+    def _rewrite(self, compact):
+        """Re-insert every live entry: drops tombstones, and with `compact` the heap's garbage."""
+        mm = self._mm
+        live = []
+        for i in range(self.slots):
+            slot = SLOT.unpack_from(mm, HEADER.size + i * SLOT.size)
+            if slot[2] > TOMBSTONE:
+                live.append(slot)
+        if compact:
+            live.sort(key=lambda slot: slot[2])  # heap order: each entry moves down, never up
+        seq = self._begin()
+        try:
+            mm[HEADER.size:self._heap_start] = bytes(self._heap_start - HEADER.size)
+            end = self._heap_start
+            for slot_hash, length, offset, version in live:
+                if compact:
+                    mm.move(end, offset, length)
+                    offset, end = end, end + length
+                i = slot_hash & self._mask
+                while SLOT.unpack_from(mm, HEADER.size + i * SLOT.size)[2] != EMPTY:
+                    i = (i + 1) & self._mask
+                SLOT.pack_into(mm, HEADER.size + i * SLOT.size, slot_hash, length, offset, version)
+            U64.pack_into(mm, USED, len(live))
+            if compact:
+                U64.pack_into(mm, HEAP_END, end)
+        finally:
+            self._end(seq)
+
+    def close(self):
+        self._mm.close()
+
+
+class SharedMemoryRepository(Repository):
+    """Repository over `SharedHashTable`s: the records, plus one table per unique field.
+
+    Keys are stored as text (`key_type` converts them back) and records as
+    JSON. Listeners only hear about writes made by this process; put a TTL
+    on response caches when several workers write.
+    """
+
+    def __init__(self, path, key_type=str, search_fields=(), unique_fields=(), sorted_fields=(),
+                 slots=1 << 17, heap_size=64 << 20):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.key_type = key_type
+        self.search_fields = tuple(search_fields)
+        self.sorted_fields = tuple(sorted_fields)
+        self.lock = ProcessLock(path + ".lock")
+        self.table = SharedHashTable(path + ".shm", self.lock, slots, heap_size)
+        # unique value -> key; their entries are small, hence the smaller heap
+        self._unique = {field: SharedHashTable(f"{path}.{field}.shm", self.lock, slots, max(heap_size // 8, 1 << 20))
+                        for field in unique_fields}
+        self._listeners = []
+        self._view = None  # (generation, DictRepository) for filtered/sorted listings
+        self._key_list = None  # (generation, sorted keys) for plain listings
+        self._view_lock = threading.Lock()
+
+    @staticmethod
+    def _encode_key(key):
+        return str(key).encode()
+
+    def _notify(self, event, *args):
+        for listener in self._listeners:
+            getattr(listener, event)(*args)
+
+    def get(self, key):
+        return self.get_versioned(key)[0]
+
+    def get_versioned(self, key):
+        value, version = self.table.get(self._encode_key(key))
+        return (None, None) if value is None else (loads(value), version)
+
+    def generation(self):
+        return self.table.generation
+
+    def _unique_changes(self, key, old, record):
+        """`(table, old value, new value)` for each unique value that changes; UniqueViolation if taken."""
+        encoded = self._encode_key(key)
+        changes = []
+        for field, table in self._unique.items():
+            before = normalize(old.get(field)) if old is not None else None
+            value = normalize(record.get(field))
+            if value == before:
+                continue
+            if value is not None:
+                owner, _ = table.get(value.encode())
+                if owner is not None and owner != encoded:
+                    raise UniqueViolation(field, record.get(field))
+            changes.append((table, before, value))
+        return changes
+
+    def _put(self, key, old, record):
+        changes = self._unique_changes(key, old, record) if self._unique else ()
+        encoded = self._encode_key(key)
+        payload = dumps(record)
+        # Room first, in every table: a StoreFull must not leave the record without its unique claims
+        self.table.reserve(encoded, len(payload))
+        for table, _, value in changes:
+            if value is not None:
+                table.reserve(value.encode(), len(encoded))
+        version = self.table.generation + 1
+        self.table.put(encoded, payload, version)
+        for table, before, value in changes:
+            if before is not None:
+                table.delete(before.encode())
+            if value is not None:
+                table.put(value.encode(), encoded)
+        self.table.bump()
+        self._notify("on_set", key, old, record)
+        return version
+
+    def insert(self, key, record):
+        with self.lock:
+            if self.table.get(self._encode_key(key))[0] is not None:
+                return False
+            self._put(key, None, dict(record))
+            return True
+
+    def update(self, key, changes, upsert=False, precondition=None):
+        with self.lock:
+            old, version = self.get_versioned(key)
+            if precondition is not None and not precondition(version):
+                raise VersionConflict(key)
+            if old is None:
+                if not upsert:
+                    return None, False
+                record, created = dict(changes), True
+            else:
+                record, created = {**old, **changes}, False
+            self._put(key, old, record)
+            return record, created
+
+    def patch(self, key, patch, precondition=None):
+        with self.lock:
+            old, version = self.get_versioned(key)
+            if precondition is not None and not precondition(version):
+                raise VersionConflict(key)
+            if old is None:
+                return None, None
+            record, changed = patch_record(old, patch)
+            if not changed:
+                return changed, version
+            return changed, self._put(key, old, record)
+
+    def delete(self, key):
+        with self.lock:
+            old = self.get(key)
+            if old is None:
+                return False
+            for field, table in self._unique.items():
+                value = normalize(old.get(field))
+                if value is not None:
+                    table.delete(value.encode())
+            self.table.delete(self._encode_key(key))
+            self.table.bump()
+            self._notify("on_delete", key, old)
+            return True
+
+    def lookup(self, field, value):
+        table = self._unique.get(field)
+        if table is None:
+            raise ValueError(f"{field} is not a unique field")
+        normalized = normalize(value)
+        if normalized is None:
+            return None
+        owner, _ = table.get(normalized.encode())
+        if owner is None:
+            return None
+        key = self.key_type(owner.decode())
+        # The unique table and the records are read separately: confirm against the record
+        record = self.get(key)
+        if record is None or normalize(record.get(field)) != normalized:
+            return None
+        return key
+
+    def _snapshot(self):
+        """A local `DictRepository` of the current records, rebuilt only after a write."""
+        generation = self.table.generation
+        view = self._view
+        if view is not None and view[0] == generation:
+            return view[1]
+        with self._view_lock:
+            if self._view is not None and self._view[0] == generation:
+                return self._view[1]
+            generation, items = self.table.items()
+            store = IndexedStore({self.key_type(key.decode()): loads(value) for key, value, _ in items})
+            repo = DictRepository(store, search_fields=self.search_fields, sorted_fields=self.sorted_fields)
+            self._view = (generation, repo)
+            return repo
+
+    def _sorted_keys(self):
+        """All keys in order, read from the slot array (no values), re-read only after a write."""
+        key_list = self._key_list
+        if key_list is not None and key_list[0] == self.table.generation:
+            return key_list[1]
+        generation, keys = self.table.keys()
+        keys = sorted(self.key_type(key.decode()) for key in keys)
+        self._key_list = (generation, keys)
+        return keys
+
+    def keys(self, limit=None, cursor=None, contains=None, filters=(), sort=None):
+        if contains is None and not filters and sort is None:
+            return paginate(self._sorted_keys(), limit, cursor)
+        return self._snapshot().keys(limit, cursor, contains=contains, filters=filters, sort=sort)
+
+    def iter_many(self, keys, chunk_size=100):
+        for key in keys:
+            record = self.get(key)
+            if record is not None:
+                yield key, record
+
+    def apply_batch(self, ops, upsert=False):
+        check_batch(ops)
+        with self.lock:
+            return [apply_op(self, op, key, record, upsert) for op, key, record in ops]
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def __len__(self):
+        return len(self.table)
+
+    def clear(self):
+        with self.lock:
+            self.table.clear()
+            for table in self._unique.values():
+                table.clear()
+            self.table.bump()
+            self._notify("clear")
+
+    def close(self):
+        self.table.close()
+        for table in self._unique.values():
+            table.close()
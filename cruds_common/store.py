@@ -0,0 +1,98 @@
+class IndexedStore(dict):
+    """A plain dict that keeps its attached indexes in sync on every write.
+
+    Reads go straight to the dict, so `get`, `in` and iteration cost the same
+    as before. Writes (including `update`, `pop` and `clear`) notify each index
+    with the old and new record for the key.
+
+    With a `record_type` (see `cruds_common.records`), records are stored in
+    its compact form; dicts with other keys are kept as they are.
+    """
+
+    def __init__(self, *args, record_type=None, **kwargs):
+        super().__init__()
+        self._indexes = []
+        self._compact = record_type.from_dict if record_type is not None else None
+        self.update(*args, **kwargs)
+
+    def add_index(self, index, replay=True):
+        """Attach `index`; with `replay`, first feed it every record already stored.
+
+        Indexes with a `load(items)` method receive the records in one call.
+        """
+        self._indexes.append(index)
+        if replay and self:
+            if hasattr(index, "load"):
+                index.load(list(self.items()))
+            else:
+                for key, record in self.items():
+                    index.on_set(key, None, record)
+        return index
+
+    def __setitem__(self, key, record):
+        if self._compact is not None:
+            record = self._compact(record)
+        old = self.get(key)
+        super().__setitem__(key, record)
+        for index in self._indexes:
+            index.on_set(key, old, record)
+
+    def set(self, key, record, fields):
+        """`self[key] = record`, for a record that differs from the stored one only in `fields`.
+
+        Indexes on a single other field (those with a `field` attribute) are
+        not notified: their entry for `key` cannot have changed.
+        """
+        if self._compact is not None:
+            record = self._compact(record)
+        old = self.get(key)
+        super().__setitem__(key, record)
+        for index in self._indexes:
+            field = getattr(index, "field", None)
+            if field is None or field in fields:
+                index.on_set(key, old, record)
+
+    def __delitem__(self, key):
+        old = self[key]
+        super().__delitem__(key)
+        for index in self._indexes:
+            index.on_delete(key, old)
+
+    def pop(self, key, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        record = self[key]
+        del self[key]
+        return record
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        if not self._indexes:
+            records = dict(*args, **kwargs)
+            if self._compact is not None:
+                records = {key: self._compact(record) for key, record in records.items()}
+            super().update(records)
+            return
+        for key, record in dict(*args, **kwargs).items():
+            self[key] = record
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        for index in self._indexes:
+            index.clear()
@@ -0,0 +1,360 @@
+"""Durable in-memory storage: a write-ahead log plus periodic snapshots.
+
+`WALRepository` keeps records in the same `IndexedStore` as `DictRepository`.
+Every write is also appended to an NDJSON log in its directory:
+
+    wal-00000003.log   [generation, "s", key, record] / [generation, "d", key] / [generation, "c"]
+    snapshot.json      {"segment": 3, "generation": g}, then lines of [[key, record], ...] chunks
+
+Appends only buffer the write; a background thread writes each buffered
+group with one write() and, depending on `fsync`, one fsync() (group
+commit). After `snapshot_every` writes the log is rotated to a new segment,
+the store is copied and saved as a snapshot, and the older segments are
+deleted. On startup the snapshot is loaded and the newer segments replayed.
+
+Replaying a segment that overlaps the snapshot is harmless: every entry
+carries the full record (or a delete), so replaying it just converges on
+the latest state. The directory is locked, so only one process can use it;
+use the SQLite backend to share records across workers.
+"""
+import atexit
+import gc
+import os
+import threading
+import time
+
+from cruds_common.repository import DictRepository
+from cruds_common.serialization import dumps, loads
+from cruds_common.store import IndexedStore
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# always: a write returns once it is fsynced (writers waiting together share one fsync)
+# interval: fsync at most every `interval` seconds; a crash may lose that much
+# never: leave flushing to the OS
+FSYNC_POLICIES = ("always", "interval", "never")
+
+SNAPSHOT = "snapshot.json"
+SNAPSHOT_CHUNK = 1000
+
+
+def _segment_name(number):
+    return f"wal-{number:08d}.log"
+
+
+class WriteAheadLog:
+    """Append-only, segmented log of the writes to one store.
+
+    Attach it to the store as a listener (it implements `on_set`,
+    `on_delete` and `clear`); call `sync()` after a write to wait until it
+    is durable under the configured fsync policy.
+    """
+
+    def __init__(self, directory, fsync="always", interval=1.0, snapshot_every=100_000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.fsync = fsync
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+        self.store = None
+        self.generation = lambda: 0
+        self.segment = 0
+        self.snapshots = 0
+
+        self._lock = threading.Lock()
+        self._has_work = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._pending = []
+        self._appended = 0  # sequence number of the latest buffered entry
+        self._durable = 0  # ... and of the latest one written (and synced, per policy)
+        self._since_snapshot = 0
+        self._snapshotting = False
+        self._closing = False
+        self._error = None
+        self._local = threading.local()
+        self._io_lock = threading.Lock()  # guards the segment file against rotation
+        self._fd = None
+        self._thread = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(directory, "LOCK"), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(self._lock_fd)
+                raise RuntimeError(f"{directory} is already used by another process")
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segments(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith("wal-") and name.endswith(".log"):
+                numbers.append(int(name[4:-4]))
+        return sorted(numbers)
+
+    # Recovery
+    def recover(self, store):
+        """Load the snapshot and replay the log into `store`.
+
+        Returns the highest generation found (0 for an empty directory). The
+        store keeps its current contents when the directory is empty, so
+        seed data survives the first start. Call it before any index is
+        attached to `store`.
+        """
+        state = {}
+        generation = 0
+        first_segment = 0
+        found = False
+        path = self._path(SNAPSHOT)
+        if os.path.exists(path):
+            found = True
+            with open(path, "rb") as f:
+                header = loads(f.readline())
+                first_segment, generation = header["segment"], header["generation"]
+                for line in f:
+                    state.update(loads(line))
+
+        for number in self._segments():
+            self.segment = max(self.segment, number)
+            if number < first_segment:
+                continue  # already covered by the snapshot
+            found = True
+            generation = max(generation, self._replay(self._path(_segment_name(number)), state))
+
+        if found:
+            store.clear()
+            # Sorted keys: the key index then only ever appends while it is rebuilt
+            store.update({key: state[key] for key in sorted(state)})
+        return generation
+
+    def _replay(self, path, state):
+        generation = 0
+        with open(path, "rb") as f:
+            lines = f.read().split(b"\n")
+        for number, line in enumerate(lines):
+            if not line:
+                continue
+            try:
+                entry = loads(line)
+            except ValueError:
+                if number >= len(lines) - 2:
+                    break  # torn write at the end of the log: the write never completed
+                raise ValueError(f"Corrupt entry at {path}:{number + 1}")
+            generation = max(generation, entry[0])
+            op = entry[1]
+            if op == "s":
+                state[entry[2]] = entry[3]
+            elif op == "d":
+                state.pop(entry[2], None)
+            else:
+                state.clear()
+        return generation
+
+    def start(self, store, generation):
+        """Open a new segment and start the writer thread.
+
+        `generation()` returns the store's current generation, saved with each
+        entry so versions are not reused after a restart.
+        """
+        self.store = store
+        self.generation = generation
+        fresh = not self._segments() and not os.path.exists(self._path(SNAPSHOT))
+        # Always start a new segment, so nothing is appended after a torn entry
+        self.segment += 1
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="wal-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        if fresh:
+            self.snapshot()  # persist the records the store started with
+
+    def _open_segment(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self._path(_segment_name(self.segment)), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    # Store listener protocol
+    def _append(self, entry):
+        with self._lock:
+            self._pending.append(entry)
+            self._appended += 1
+            self._local.seq = self._appended
+            if len(self._pending) == 1:
+                self._has_work.notify()
+
+    def on_set(self, key, old, record):
+        self._append((self.generation(), "s", key, record))
+
+    def on_delete(self, key, old):
+        self._append((self.generation(), "d", key))
+
+    def clear(self):
+        self._append((self.generation(), "c"))
+
+    def sync(self):
+        """Wait until this thread's writes are durable (only waits with fsync="always")."""
+        if self.fsync != "always":
+            return
+        seq = getattr(self._local, "seq", 0)
+        with self._lock:
+            while self._durable < seq:
+                if self._error is not None:
+                    raise self._error
+                self._flushed.wait()
+
+    def _run(self):
+        last_fsync = time.monotonic()
+        while True:
+            with self._lock:
+                while not self._pending and not self._closing:
+                    self._has_work.wait(self.interval if self.fsync == "interval" else None)
+                    if self.fsync == "interval" and time.monotonic() - last_fsync >= self.interval:
+                        break
+                batch, self._pending = self._pending, []
+                seq = self._appended
+                closing = self._closing
+            try:
+                with self._io_lock:
+                    if batch:
+                        os.write(self._fd, b"".join(dumps(entry) + b"\n" for entry in batch))
+                    if self.fsync == "always" and batch or \
+                            self.fsync == "interval" and time.monotonic() - last_fsync >= self.interval:
+                        os.fsync(self._fd)
+                        last_fsync = time.monotonic()
+            except OSError as exc:
+                self._error = exc  # writers waiting in sync() raise it
+            with self._lock:
+                if self._error is None:
+                    self._durable = seq
+                self._flushed.notify_all()
+                self._since_snapshot += len(batch)
+                snapshot = self._since_snapshot >= self.snapshot_every and not self._snapshotting
+                if snapshot:
+                    self._snapshotting = True
+            if snapshot and not closing:
+                threading.Thread(target=self.snapshot, name="wal-snapshot", daemon=True).start()
+            if closing:
+                return
+
+    def snapshot(self):
+        """Save the whole store and delete the segments it makes redundant."""
+        with self._io_lock:
+            # Writes from here on go to the new segment, which is replayed on top of the snapshot
+            self.segment += 1
+            self._open_segment()
+            covered = self.segment
+        with self._lock:
+            self._since_snapshot = 0
+        records = dict.copy(self.store)
+        generation = self.generation()
+        items = list(records.items())
+        path = self._path(SNAPSHOT)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(dumps({"segment": covered, "generation": generation}) + b"\n")
+                for start in range(0, len(items), SNAPSHOT_CHUNK):
+                    f.write(dumps(items[start:start + SNAPSHOT_CHUNK]) + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            self._fsync_directory()
+            for number in self._segments():
+                if number < covered:
+                    os.remove(self._path(_segment_name(number)))
+            self.snapshots += 1
+        finally:
+            with self._lock:
+                self._snapshotting = False
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        """Write (and fsync) everything still buffered, then release the directory."""
+        if self._thread is not None:
+            with self._lock:
+                self._closing = True
+                self._has_work.notify()
+            self._thread.join()
+            self._thread = None
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # also releases the flock
+            self._lock_fd = None
+
+
+class WALRepository(DictRepository):
+    """DictRepository whose writes are logged to `directory` and recovered on startup.
+
+    Reads cost the same as with `DictRepository`. With fsync="always", a
+    write returns only once its log entry is on disk; concurrent writers
+    wait for the same fsync. Batches wait once, after all their writes.
+    """
+
+    def __init__(self, directory, store=None, search_fields=(), stripes=64, unique_fields=(), sorted_fields=(),
+                 fsync="always", interval=1.0, snapshot_every=100_000):
+        store = store if store is not None else IndexedStore()
+        self.wal = WriteAheadLog(directory, fsync=fsync, interval=interval, snapshot_every=snapshot_every)
+        # Recovery allocates millions of acyclic objects; the cyclic GC would
+        # rescan them over and over (more than half the time at 1M records)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            generation = self.wal.recover(store)
+            super().__init__(store, search_fields=search_fields, stripes=stripes, version_start=generation,
+                             unique_fields=unique_fields, sorted_fields=sorted_fields)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        # Added after the version index, so each entry is logged with its write's generation
+        self.store.add_index(self.wal, replay=False)
+        self.wal.start(self.store, lambda: self._versions.generation)
+        # Only fsync="always" makes writers wait on the disk
+        self.blocking = fsync == "always"
+        self._batch = threading.local()
+
+    def _sync(self, result):
+        # Wait outside the key locks, so other writers can join the same fsync
+        if not getattr(self._batch, "active", False):
+            self.wal.sync()
+        return result
+
+    def insert(self, key, record):
+        return self._sync(super().insert(key, record))
+
+    def update(self, key, changes, upsert=False, precondition=None):
+        return self._sync(super().update(key, changes, upsert=upsert, precondition=precondition))
+
+    def patch(self, key, patch, precondition=None):
+        return self._sync(super().patch(key, patch, precondition=precondition))
+
+    def delete(self, key):
+        return self._sync(super().delete(key))
+
+    def apply_batch(self, ops, upsert=False):
+        self._batch.active = True
+        try:
+            outcomes = super().apply_batch(ops, upsert=upsert)
+        finally:
+            self._batch.active = False
+        return self._sync(outcomes)
+
+    def clear(self):
+        super().clear()
+        self._sync(None)
+
+    def close(self):
+        self.wal.close()
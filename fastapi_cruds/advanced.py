@@ -1,93 +1,435 @@
+import fastapi.routing
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from fastapi import HTTPException, status, Response, Request
+from fastapi.responses import StreamingResponse
+from fastapi import HTTPException, status, Response, Request, Query, WebSocket
+from fastapi.exceptions import RequestValidationError
 
-from pydantic import BaseModel
-import uvicorn
+from pydantic import BaseModel, ConfigDict, ValidationError, model_validator
+from typing import Literal
+import asyncio
 import logging
 
-app = FastAPI()
+from cruds_common.async_repository import AsyncRepository
+from cruds_common.batch import BatchApplier, RecordParser, apply_stream_async, ndjson_results_async
+from cruds_common.cache import ResponseCache
+from cruds_common.changes import SSE_MEDIA_TYPE, ChangeLog, ResyncRequired, parse_since, sse_stream_async
+from cruds_common.compression import Compressor
+from cruds_common.config import AppConfig
+from cruds_common.etags import format_etag, if_match_precondition, none_match
+from cruds_common.idempotency import IdempotencyCache
+from cruds_common.limits import BodyLimits, BodyTooLarge
+from cruds_common.logs import setup_logging
+from cruds_common.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, register_cache
+from cruds_common.pagination import NDJSON_MEDIA_TYPE, ndjson_astream
+from cruds_common.patch import MERGE_PATCH_MEDIA_TYPE, is_patch_media_type, prefers_minimal
+from cruds_common.query import parse_fields, parse_sort, project
+from cruds_common.ratelimit import RateLimiter
+from cruds_common.records import record_type
+from cruds_common.repository import StoreFull, VersionConflict, open_repository
+from cruds_common.serialization import JSON_MEDIA_TYPE, dumps
+from cruds_common.store import IndexedStore
+from fastapi_cruds.compression import CompressionMiddleware
+from fastapi_cruds.idempotency import IdempotencyMiddleware
+from fastapi_cruds.limits import BodyLimitMiddleware, iter_body
+from fastapi_cruds.metrics import MetricsMiddleware
+from fastapi_cruds.ratelimit import RateLimitMiddleware
+from fastapi_cruds.responses import BodyStreamingResponse, FastJSONResponse
 
-# Logger
-logging.basicConfig(level=logging.INFO)
+# JSON lines written in batches by a background thread (started by `create_app`), so routes
+# never wait on log I/O
 logger = logging.getLogger("crud_advanced")
 
-fake_db = {}
+# Items are kept as slotted records with interned descriptions (~3x smaller than dicts)
+ItemRecord = record_type("ItemRecord", ("name", "description"), interned=("description",))
 
 class Item(BaseModel):
     name: str
     description: str = ""
 
+class ItemPatch(BaseModel):
+    """JSON merge patch (RFC 7396) of an Item: sent fields are set, null resets one to its default."""
+    model_config = ConfigDict(extra="forbid")
+    name: str | None = None
+    description: str | None = None
+
+class BatchOp(BaseModel):
+    op: Literal["create", "update", "delete"] = "create"
+    item_id: int
+    item: Item | None = None
+
+    @model_validator(mode="after")
+    def check_item(self):
+        if self.op != "delete" and self.item is None:
+            raise ValueError("item is required for create and update")
+        return self
+
 class StandardResponse(BaseModel):
     status: str
     message: str
     data: dict | None = None
 
-# CREATE
-@app.post("/items/{item_id}", response_model=StandardResponse)
-async def create_item(item_id: int, item: Item, response: Response):
-    if item_id in fake_db:
-        raise HTTPException(status_code=400, detail="Item already exists")
-    fake_db[item_id] = item.dict()
-    response.status_code = status.HTTP_201_CREATED
-    logger.info(f"Item {item_id} created")
-    return {"status": "success", "message": "Item created", "data": fake_db[item_id]}
-
-# READ (single item)
-@app.get("/items/{item_id}", response_model=StandardResponse)
-async def read_item(item_id: int):
-    item = fake_db.get(item_id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    return {"status": "success", "message": "Item retrieved", "data": item}
-
-# READ (list all items)
-@app.get("/items", response_model=StandardResponse)
-async def list_items(name: str | None = None):
-    items = fake_db
-    if name:
-        items = {k: v for k, v in fake_db.items() if name.lower() in v["name"].lower()}
-    return {"status": "success", "message": "Items listed", "data": items}
-
-# UPDATE (PUT)
-@app.put("/items/{item_id}", response_model=StandardResponse)
-async def update_item(item_id: int, item: Item, response: Response):
-    if item_id in fake_db:
-        fake_db[item_id].update(item.dict())
-        response.status_code = status.HTTP_200_OK
-        logger.info(f"Item {item_id} updated")
-        return {"status": "success", "message": "Item updated", "data": fake_db[item_id]}
-    else:
-        fake_db[item_id] = item.dict()
-        response.status_code = status.HTTP_201_CREATED
-        logger.info(f"Item {item_id} created via PUT")
-        return {"status": "success", "message": "Item created", "data": fake_db[item_id]}
-
-# DELETE
-@app.delete("/items/{item_id}", response_model=StandardResponse)
-async def delete_item(item_id: int):
-    if item_id not in fake_db:
-        raise HTTPException(status_code=404, detail="Item not found")
-    del fake_db[item_id]
-    logger.info(f"Item {item_id} deleted")
-    return {"status": "success", "message": f"Item {item_id} deleted", "data": None}
-
-# HANDLERS
-@app.exception_handler(HTTPException)
-async def http_exception_handler(request: Request, exc: HTTPException):
-    logger.error(f"HTTP error {exc.status_code}: {exc.detail}")
-    return JSONResponse(
-        status_code=exc.status_code,
-        content={"status": "error", "message": exc.detail, "data": None}
-    )
-
-@app.exception_handler(Exception)
-async def generic_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled error: {exc}")
-    return JSONResponse(
-        status_code=500,
-        content={"status": "error", "message": "Internal Server Error", "data": None}
-    )
+# One record of POST /items:batch: `(op, item_id, fields)`, or ValueError
+def validate_batch_op(record):
+    try:
+        op = BatchOp.model_validate(record)
+    except ValidationError as exc:
+        raise ValueError("; ".join(error["msg"] for error in exc.errors()))
+    return op.op, op.item_id, op.item.dict() if op.item else None
+
+def create_app(config=None):
+    """Build the app, its store and its middleware from `config` (default: `AppConfig.from_env()`)."""
+    config = config or AppConfig.from_env()
+    # Routes return FastJSONResponse themselves: the payloads are built from validated
+    # items, so FastAPI's response_model pass is skipped (the models still document the API).
+    # FastAPI builds the OpenAPI schema on the first GET /openapi.json (or at preload);
+    # with config.openapi off, neither it nor /docs are served
+    app = FastAPI(default_response_class=FastJSONResponse, openapi_url="/openapi.json" if config.openapi else None)
+
+    # Reads are high volume: only 1 in config.log_read_sample of them is logged
+    log_listener = setup_logging(logger, level=config.log_level,
+                                 sample={"item.read": config.log_read_sample, "items.list": config.log_read_sample})
+
+    # In-memory store; set CRUD_STORAGE_URL=sqlite:///path.db to share items across workers
+    fake_db = IndexedStore(record_type=ItemRecord)
+    # name: trigram index for ?name= substring search; name and description: sorted indexes for
+    # ?sort=, ?description= and ?description_prefix=
+    repo = open_repository("items", int, store=fake_db, search_fields=("name",), sorted_fields=("name", "description"),
+                           url=config.storage_url)
+    # Routes await `async_repo`: calls that may block (SQLite, WAL fsync) run in a bounded thread pool
+    async_repo = AsyncRepository.from_env(repo)
+    # (ETag, body) of GET /items/{item_id}; every write through `repo` invalidates its key
+    item_cache = repo.subscribe(ResponseCache.from_env())
+    # Every write, numbered, in a ring buffer of the last $CRUD_CHANGES_CAPACITY changes: tailed over
+    # GET /items:changes (SSE) or a WebSocket on the same path instead of polling GET /items
+    changes = repo.subscribe(ChangeLog.from_env())
+
+    # Per-route request counts, latency and sizes, served on GET /metrics
+    metrics = Metrics()
+    metrics.register("crud_store_records", "Items in the store.", lambda: len(repo))
+    register_cache(metrics, item_cache, "crud_item_cache")
+    metrics.register("crud_changes_last_seq", "Sequence number of the latest change.", lambda: changes.last_seq)
+
+    # gzip/brotli per Accept-Encoding; compressed list snapshots are reused while their ETag holds
+    compressor = Compressor.from_env()
+    register_cache(metrics, compressor.cache, "crud_compression_cache")
+
+    # Bodies are capped at $CRUD_MAX_BODY_SIZE (413 beyond); /items:batch streams and allows more
+    limits = BodyLimits.from_env()
+    app.add_middleware(BodyLimitMiddleware, max_size=limits.max_body_size,
+                       routes={"/items:batch": limits.max_batch_body_size})
+    # POST, PUT and PATCH /items/{item_id} with an Idempotency-Key header: retries get the first response
+    # back (bounded, TTL-evicted), and concurrent duplicates wait for it instead of running.
+    # Outside the body limit (it bounds its own buffering) and inside compression, so replays are
+    # encoded for the client asking
+    idempotency = IdempotencyCache.from_env()
+    register_cache(metrics, idempotency, "crud_idempotency_cache")
+    app.add_middleware(IdempotencyMiddleware, cache=idempotency, routes=("/items/{item_id}",),
+                       methods=("POST", "PUT", "PATCH"), max_size=limits.max_body_size)
+    app.add_middleware(CompressionMiddleware, compressor=compressor)
+    # Reads and writes have separate budgets: per-client/per-route token buckets (429) and a
+    # bounded number of requests in flight, plus a bounded queue (503); see cruds_common/ratelimit.py
+    limiter = RateLimiter.from_env()
+    # (the change feed is exempt: its streams stay open for as long as their subscribers)
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, exempt=("/metrics", "/items:changes"))
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+    # CREATE
+    @app.post("/items/{item_id}", response_model=StandardResponse)
+    async def create_item(item_id: int, item: Item):
+        data = item.dict()
+        if not await async_repo.insert(item_id, data):
+            raise HTTPException(status_code=400, detail="Item already exists")
+        logger.info("Item %s created", item_id, extra={"event": "item.created", "item_id": item_id})
+        return FastJSONResponse({"status": "success", "message": "Item created", "data": data},
+                                status_code=status.HTTP_201_CREATED)
+
+
+    # BATCH (create/update/delete many items; JSON array or NDJSON body, parsed and applied as it arrives)
+    @app.post("/items:batch", response_model=StandardResponse)
+    async def batch_items(request: Request):
+        parser = RecordParser(request.headers.get("content-type"), max_record_size=limits.max_record_size)
+        applier = BatchApplier(validate_batch_op, "item_id", "Item", chunk_size=limits.batch_chunk_size)
+        # PUT semantics: an update of a missing item creates it
+        results = apply_stream_async(async_repo, iter_body(request), parser, applier, upsert=True)
+        if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+            # One result line per record, sent as its chunk is applied: memory stays flat.
+            # The first chunk is applied here, so an oversized or malformed body still gets a 413/400
+            try:
+                first = [await anext(results)]
+            except StopAsyncIteration:
+                first = []
+            except BodyTooLarge as exc:
+                raise HTTPException(status_code=413, detail=str(exc))
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+
+            async def all_results():
+                for result in first:
+                    yield result
+                async for result in results:
+                    yield result
+            return BodyStreamingResponse(ndjson_results_async(all_results()), media_type=NDJSON_MEDIA_TYPE)
+
+        done = []
+        try:
+            async for result in results:
+                done.append(result)
+        except BodyTooLarge as exc:
+            return FastJSONResponse(status_code=413,
+                                    content={"status": "error", "message": str(exc), "data": {"results": done}})
+        except ValueError as exc:
+            # Chunks completed before the error were applied; `results` lists them
+            return FastJSONResponse(status_code=400,
+                                    content={"status": "error", "message": str(exc), "data": {"results": done}})
+        logger.info("Batch of %d items applied", len(done), extra={"event": "items.batch", "count": len(done)})
+        return FastJSONResponse({"status": "success", "message": "Batch applied", "data": {"results": done}})
+
+    # READ (single item)
+    @app.get("/items/{item_id}", response_model=StandardResponse)
+    async def read_item(item_id: int, request: Request):
+        cached = item_cache.get(item_id)
+        if cached is not None:
+            etag, body = cached
+        else:
+            generation = item_cache.generation
+            item, version = await async_repo.get_versioned(item_id)
+            if not item:
+                raise HTTPException(status_code=404, detail="Item not found")
+            etag, body = format_etag(version), None
+        if none_match(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        if body is None:
+            body = dumps({"status": "success", "message": "Item retrieved", "data": item})
+            item_cache.set(item_id, (etag, body), generation)
+        logger.info("Item %s read", item_id, extra={"event": "item.read", "item_id": item_id})
+        return Response(content=body, media_type=JSON_MEDIA_TYPE, headers={"ETag": etag})
+
+    # READ (list all items, filter by name/description, sort, pick fields, paginate with limit/cursor, stream as NDJSON)
+    @app.get("/items", response_model=StandardResponse)
+    async def list_items(request: Request, name: str | None = None,
+                         description: str | None = None, description_prefix: str | None = None,
+                         sort: str | None = None, fields: str | None = None,
+                         limit: int | None = Query(None, ge=1), cursor: int | None = None,
+                         stream: bool = False):
+        # Read the generation first: a concurrent write can only make the ETag stale, never too new
+        etag = format_etag(await async_repo.generation(), prefix="g")
+        if none_match(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        filters = []
+        if description is not None:
+            filters.append(("description", "eq", description))
+        if description_prefix is not None:
+            filters.append(("description", "prefix", description_prefix))
+        try:
+            order = parse_sort(sort, Item.model_fields)
+            selected = parse_fields(fields, Item.model_fields)
+            keys, next_cursor = await async_repo.keys(limit, cursor, contains=("name", name) if name else None,
+                                          filters=filters, sort=order)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        logger.info("Listed %d items", len(keys), extra={"event": "items.list", "count": len(keys)})
+        headers = {"ETag": etag}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = str(next_cursor)
+        if stream:
+            lines = ndjson_astream({"item_id": k, "item": project(v, selected)} async for k, v in async_repo.iter_many(keys))
+            return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+        data = {k: project(v, selected) for k, v in await async_repo.get_many(keys)}
+        return FastJSONResponse({"status": "success", "message": "Items listed", "data": data}, headers=headers)
+
+    # UPDATE (PUT)
+    @app.put("/items/{item_id}", response_model=StandardResponse)
+    async def update_item(item_id: int, item: Item, request: Request):
+        precondition = if_match_precondition(request.headers.get("if-match"))
+        try:
+            data, created = await async_repo.update(item_id, item.dict(), upsert=True, precondition=precondition)
+        except VersionConflict:
+            raise HTTPException(status_code=412, detail="Item has changed (If-Match failed)")
+        if not created:
+            logger.info("Item %s updated", item_id, extra={"event": "item.updated", "item_id": item_id})
+            return FastJSONResponse({"status": "success", "message": "Item updated", "data": data},
+                                    status_code=status.HTTP_200_OK)
+        else:
+            logger.info("Item %s created via PUT", item_id, extra={"event": "item.created", "item_id": item_id})
+            return FastJSONResponse({"status": "success", "message": "Item created", "data": data},
+                                    status_code=status.HTTP_201_CREATED)
+
+    # PATCH (JSON merge patch): only the changed fields are written, indexed and sent back
+    # (the body is read here, after the media type check; the schema is declared for OpenAPI)
+    @app.patch("/items/{item_id}", response_model=StandardResponse,
+               openapi_extra={"requestBody": {"required": True, "content": {
+                   MERGE_PATCH_MEDIA_TYPE: {"schema": ItemPatch.model_json_schema()}}}})
+    async def patch_item(item_id: int, request: Request):
+        if not is_patch_media_type(request.headers.get("content-type")):
+            raise HTTPException(status_code=415, detail=f"Send a JSON merge patch ({MERGE_PATCH_MEDIA_TYPE})",
+                                headers={"Accept-Patch": MERGE_PATCH_MEDIA_TYPE})
+        try:
+            patch = ItemPatch.model_validate_json(await request.body())
+        except ValidationError as exc:
+            raise RequestValidationError([{**error, "loc": ("body", *error["loc"])}
+                                          for error in exc.errors(include_url=False)])
+        fields = patch.model_dump(exclude_unset=True)
+        for name, value in fields.items():
+            if value is None:
+                if Item.model_fields[name].is_required():
+                    raise HTTPException(status_code=400, detail=f"{name} cannot be removed")
+                fields[name] = Item.model_fields[name].default
+        precondition = if_match_precondition(request.headers.get("if-match"))
+        try:
+            changed, version = await async_repo.patch(item_id, fields, precondition=precondition)
+        except VersionConflict:
+            raise HTTPException(status_code=412, detail="Item has changed (If-Match failed)")
+        if changed is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        logger.info("Item %s patched", item_id, extra={"event": "item.patched", "item_id": item_id})
+        headers = {"ETag": format_etag(version)}
+        if prefers_minimal(request.headers.get("prefer")):
+            return Response(status_code=status.HTTP_204_NO_CONTENT,
+                            headers={**headers, "Preference-Applied": "return=minimal"})
+        return FastJSONResponse({"status": "success", "message": "Item updated", "data": changed}, headers=headers)
+
+    # DELETE
+    @app.delete("/items/{item_id}", response_model=StandardResponse)
+    async def delete_item(item_id: int):
+        if not await async_repo.delete(item_id):
+            raise HTTPException(status_code=404, detail="Item not found")
+        logger.info("Item %s deleted", item_id, extra={"event": "item.deleted", "item_id": item_id})
+        return FastJSONResponse({"status": "success", "message": f"Item {item_id} deleted", "data": None})
+
+    # CHANGE FEED (Server-Sent Events; resume with ?since=<seq> or Last-Event-ID)
+    @app.get("/items:changes")
+    async def item_changes(request: Request, since: str | None = None, follow: bool = True):
+        try:
+            since = parse_since(since, request.headers.get("last-event-id"))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        # Each subscriber reads the ring at its own pace; one that falls behind gets a `resync` event
+        batches = changes.follow_async(changes.last_seq if since is None else since, follow=follow)
+        return StreamingResponse(sse_stream_async(batches), media_type=SSE_MEDIA_TYPE,
+                                 headers={"Cache-Control": "no-cache"})
+
+    # CHANGE FEED (WebSocket): one JSON text message per change
+    @app.websocket("/items:changes")
+    async def item_changes_ws(websocket: WebSocket, since: int | None = Query(None, ge=0)):
+        await websocket.accept()
+        batches = changes.follow_async(changes.last_seq if since is None else since)
+        # Messages from the client are ignored: receiving only tells us when it goes away
+        received = asyncio.ensure_future(websocket.receive())
+        batch = None
+        try:
+            while True:
+                batch = asyncio.ensure_future(anext(batches))
+                while not batch.done():
+                    await asyncio.wait((batch, received), return_when=asyncio.FIRST_COMPLETED)
+                    if received.done():
+                        if received.result()["type"] == "websocket.disconnect":
+                            return
+                        received = asyncio.ensure_future(websocket.receive())
+                try:
+                    for change in batch.result():
+                        await websocket.send_text(change.json().decode())
+                except ResyncRequired as exc:
+                    await websocket.send_json({"op": "resync", "since": exc.since, "seq": exc.seq})
+                    await websocket.close()
+                    return
+        finally:
+            received.cancel()
+            if batch is not None and not batch.done():
+                batch.cancel()
+                await asyncio.wait((batch,))
+            await batches.aclose()
+
+    # CACHE STATS
+    @app.get("/cache/stats", response_model=StandardResponse)
+    async def cache_stats():
+        return FastJSONResponse({"status": "success", "message": "Cache stats", "data": item_cache.stats()})
+
+    # METRICS (Prometheus text format)
+    @app.get("/metrics", include_in_schema=False)
+    async def read_metrics():
+        # The store gauge may query the backend
+        return Response(content=await async_repo.run(metrics.render), media_type=METRICS_CONTENT_TYPE)
+
+    # HANDLERS
+    @app.exception_handler(HTTPException)
+    async def http_exception_handler(request: Request, exc: HTTPException):
+        logger.error("HTTP error %s: %s", exc.status_code, exc.detail,
+                     extra={"event": "http.error", "status": exc.status_code, "path": request.url.path})
+        return FastJSONResponse(
+            status_code=exc.status_code,
+            content={"status": "error", "message": exc.detail, "data": None},
+            headers=exc.headers
+        )
+
+    @app.exception_handler(StoreFull)
+    async def store_full_handler(request: Request, exc: StoreFull):
+        logger.error("Storage full: %s", exc, extra={"event": "store.full", "path": request.url.path})
+        return FastJSONResponse(
+            status_code=507,
+            content={"status": "error", "message": "Storage is full", "data": None}
+        )
+
+    @app.exception_handler(Exception)
+    async def generic_exception_handler(request: Request, exc: Exception):
+        logger.error("Unhandled error: %s", exc, exc_info=exc, extra={"event": "unhandled", "path": request.url.path})
+        return FastJSONResponse(
+            status_code=500,
+            content={"status": "error", "message": "Internal Server Error", "data": None}
+        )
+
+    # What tests, benchmarks and `preload` reach into
+    app.state.limits = limits
+    app.state.fake_db = fake_db
+    app.state.repo = repo
+    app.state.async_repo = async_repo
+    app.state.item_cache = item_cache
+    app.state.changes = changes
+    app.state.metrics = metrics
+    app.state.compressor = compressor
+    app.state.limiter = limiter
+    app.state.idempotency = idempotency
+    app.state.log_listener = log_listener
+    if config.preload:
+        preload(app)
+    return app
+
+def preload(app):
+    """Do before the first request what it would otherwise pay for: build the middleware stack
+    and the OpenAPI schema, and read items (as many as the cache holds) into the
+    GET /items/{item_id} cache."""
+    repo, item_cache = app.state.repo, app.state.item_cache
+    app.middleware_stack = app.build_middleware_stack()
+    if app.openapi_url:
+        app.openapi()
+    # FastAPI reads the source of each endpoint (for error reports) on its first call: ~1 ms
+    # each, plus compiling the tokenizer once. Private, hence looked up defensively
+    extract_context = getattr(fastapi.routing, "_extract_endpoint_context", None)
+    if extract_context is not None:
+        for route in app.routes:
+            if isinstance(route, fastapi.routing.APIRoute):
+                extract_context(route.endpoint)
+    keys, _ = repo.keys(item_cache.maxsize)
+    for item_id in keys:
+        generation = item_cache.generation
+        item, version = repo.get_versioned(item_id)
+        if item:
+            body = dumps({"status": "success", "message": "Item retrieved", "data": item})
+            item_cache.set(item_id, (format_etag(version), body), generation)
+
+# The app built from the environment, created on first access (`uvicorn fastapi_cruds.advanced:app`),
+# and its parts as module attributes (`repo`, `async_repo`, `fake_db`...)
+APP_PARTS = ("limits", "fake_db", "repo", "async_repo", "item_cache", "changes", "metrics", "compressor",
+             "limiter", "idempotency", "log_listener")
+_app = None
+
+def __getattr__(name):
+    global _app
+    if name != "app" and name not in APP_PARTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        _app = create_app()
+    return _app if name == "app" else getattr(_app.state, name)
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    import uvicorn  # only needed to run the app from here
+    uvicorn.run("fastapi_cruds.advanced:create_app", factory=True, host="0.0.0.0", port=8000, reload=True)
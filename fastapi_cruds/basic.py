@@ -1,6 +1,5 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
-import uvicorn
 
 app = FastAPI()
 fake_db = {}
@@ -42,4 +41,5 @@ async def delete_item(item_id: int):
     return {"message": f"Item {item_id} does not exist"}
 
 if __name__ == "__main__":
+    import uvicorn  # only needed to run the app from here
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
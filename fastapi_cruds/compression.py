@@ -0,0 +1,70 @@
+from starlette.datastructures import Headers, MutableHeaders
+
+from cruds_common.compression import weak_etag
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing responses per Accept-Encoding (see `cruds_common.compression`).
+
+    Whole bodies below `min_size` are sent as is; streamed bodies are
+    compressed chunk by chunk. Add it before `MetricsMiddleware`, so the
+    metrics (outermost) see the compressed size.
+    """
+
+    def __init__(self, app, compressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        compressor = self.compressor
+        encoding = compressor.negotiate(Headers(scope=scope).get("accept-encoding"))
+        url = scope["path"] + ("?" + scope["query_string"].decode("latin-1") if scope["query_string"] else "")
+        start = None
+        stream = None
+
+        async def send_wrapper(message):
+            nonlocal start, stream
+            if message["type"] == "http.response.start":
+                start = message  # held back until the first body chunk decides the headers
+                return
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+
+            if stream is not None:
+                body = stream.compress(message.get("body", b""))
+                more_body = message.get("more_body", False)
+                if not more_body:
+                    body += stream.finish()
+                return await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+            headers = MutableHeaders(raw=start["headers"])
+            status = start["status"]
+            pending_start, start = start, None
+            if status < 200 or status in (204, 304) or "content-encoding" in headers \
+                    or not compressor.compressible(headers.get("content-type")):
+                await send(pending_start)
+                return await send(message)
+            headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoding is None or not more_body and len(body) < compressor.min_size:
+                await send(pending_start)
+                return await send(message)
+
+            if more_body:
+                stream = compressor.stream(encoding)
+                body = stream.compress(body)
+                del headers["content-length"]
+            else:
+                body = compressor.compress(body, encoding, url, headers.get("etag"))
+                headers["content-length"] = str(len(body))
+            headers["content-encoding"] = encoding
+            if "etag" in headers:
+                headers["etag"] = weak_etag(headers["etag"])
+            await send(pending_start)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
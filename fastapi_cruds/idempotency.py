@@ -0,0 +1,106 @@
+from cruds_common.idempotency import (BUSY, IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, MISMATCH, REPLAY, REPLAYED_HEADER,
+                                      StoredResponse, request_fingerprint)
+from fastapi_cruds.ratelimit import route_path
+from fastapi_cruds.responses import FastJSONResponse
+
+_HEADER = IDEMPOTENCY_HEADER.lower().encode()
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying the first response to requests repeating an Idempotency-Key header.
+
+    Applies to `methods` on the route templates in `routes` (e.g.
+    "/items/{item_id}"). The body is buffered to fingerprint the request, up
+    to `max_size` bytes: a larger one is passed on untouched, for the body
+    limit further in to reject. Responses below 500 are stored as sent, up
+    to `max_size` bytes too.
+    """
+
+    def __init__(self, app, cache, routes, methods=("POST", "PUT"), max_size=1 << 20):
+        self.app = app
+        self.cache = cache
+        self.routes = frozenset(routes)
+        self.methods = frozenset(methods)
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            return await self.app(scope, receive, send)
+        key = next((value for name, value in scope["headers"] if name == _HEADER), None)
+        if key is None or route_path(scope) not in self.routes:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await self.error(400, f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters",
+                                    scope, receive, send)
+
+        chunks, size, more = [], 0, True
+        while more and size <= self.max_size:
+            message = await receive()
+            if message["type"] != "http.request":
+                return  # client went away
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more = message.get("more_body", False)
+        receive = self._replay(chunks, more, receive)
+        if more or size > self.max_size:
+            return await self.app(scope, receive, send)
+
+        method, path = scope["method"], scope["path"]
+        query = scope.get("query_string", b"").decode("latin-1")
+        fingerprint = request_fingerprint(method, f"{path}?{query}", b"".join(chunks))
+        cache_key = (method, path, key.decode("latin-1"))
+        outcome, stored = await self.cache.begin_async(cache_key, fingerprint)
+        if outcome == REPLAY:
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers]
+            headers.append((REPLAYED_HEADER.lower().encode(), b"true"))
+            await send({"type": "http.response.start", "status": stored.status, "headers": headers})
+            return await send({"type": "http.response.body", "body": stored.body})
+        if outcome == MISMATCH:
+            return await self.error(422, f"{IDEMPOTENCY_HEADER} was already used for a different request",
+                                    scope, receive, send)
+        if outcome == BUSY:
+            return await self.error(409, f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+                                    scope, receive, send)
+
+        start, body, size, complete = None, [], 0, False
+
+        async def send_recorded(message):
+            nonlocal start, body, size, complete
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and body is not None:
+                body.append(message.get("body", b""))
+                size += len(body[-1])
+                complete = not message.get("more_body", False)
+                if size > self.max_size:
+                    body = None  # too large to keep: sent, not stored
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_recorded)
+        except BaseException:
+            self.cache.abandon(cache_key)
+            raise
+        if start is None or start["status"] >= 500 or body is None or not complete:
+            self.cache.abandon(cache_key)
+        else:
+            headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in start["headers"]]
+            self.cache.finish(cache_key, StoredResponse(start["status"], headers, b"".join(body)))
+
+    @staticmethod
+    def _replay(chunks, more, receive):
+        """A `receive` returning the buffered body first, then what is left of it."""
+        messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+        messages[-1]["more_body"] = more
+
+        async def replay():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+        return replay
+
+    @staticmethod
+    async def error(status_code, message, scope, receive, send):
+        response = FastJSONResponse(status_code=status_code, content={"status": "error", "message": message,
+                                                                      "data": None})
+        await response(scope, receive, send)
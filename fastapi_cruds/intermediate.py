@@ -1,11 +1,16 @@
 from fastapi import FastAPI
-from fastapi import HTTPException, status, Response
+from fastapi import HTTPException, status, Response, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import uvicorn
+
+from cruds_common.indexes import SortedKeys
+from cruds_common.pagination import NDJSON_MEDIA_TYPE, ndjson_stream, paginate
+from cruds_common.store import IndexedStore
 
 app = FastAPI()
 
-fake_db = {}
+fake_db = IndexedStore()
+item_keys = fake_db.add_index(SortedKeys())
 
 class Item(BaseModel):
     name: str
@@ -28,16 +33,23 @@ async def read_item(item_id: int):
         raise HTTPException(status_code=404, detail="Item not found")
     return {"item_id": item_id, "item": item}
 
-# READ (list all items)
+# READ (list all items, optionally paginated with limit/cursor or streamed as NDJSON)
 @app.get("/items")
-async def list_items():
-    return fake_db
+async def list_items(response: Response, limit: int | None = Query(None, ge=1),
+                     cursor: int | None = None, stream: bool = False):
+    keys, next_cursor = paginate(item_keys.keys, limit, cursor)
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else {}
+    if stream:
+        lines = ndjson_stream({"item_id": k, "item": fake_db[k]} for k in keys if k in fake_db)
+        return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    response.headers.update(headers)
+    return {k: fake_db[k] for k in keys if k in fake_db}
 
 # UPDATE (PUT)
 @app.put("/items/{item_id}")
 async def update_item(item_id: int, item: Item, response: Response):
     if item_id in fake_db:
-        fake_db[item_id].update(item.dict())
+        fake_db[item_id] = {**fake_db[item_id], **item.dict()}
         response.status_code = status.HTTP_200_OK
         return {"message": "Item updated", "item": fake_db[item_id]}
     else:
@@ -54,4 +66,5 @@ async def delete_item(item_id: int):
     return {"message": f"Item {item_id} deleted"}
 
 if __name__ == "__main__":
+    import uvicorn  # only needed to run the app from here
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
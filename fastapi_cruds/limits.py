@@ -0,0 +1,53 @@
+from fastapi import HTTPException
+
+from cruds_common.limits import BodyTooLarge
+
+
+class BodyLimitMiddleware:
+    """ASGI middleware capping request bodies at `max_size` bytes, or `routes[path]` for some paths.
+
+    A body announced (Content-Length) or received beyond the limit makes the
+    route's next read raise a 413 HTTPException, handled like any other.
+    Nothing is buffered here, so streamed bodies stay streamed.
+    """
+
+    def __init__(self, app, max_size, routes=None):
+        self.app = app
+        self.max_size = max_size
+        self.routes = dict(routes or {})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit = self.routes.get(scope["path"], self.max_size)
+        declared = 0
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                declared = int(value) if value.isdigit() else 0
+                break
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            if declared > limit:
+                raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {limit} bytes")
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+
+async def iter_body(request):
+    """Iterate over `request`'s body as it is received; going over the limit raises BodyTooLarge."""
+    try:
+        async for chunk in request.stream():
+            yield chunk
+    except HTTPException as exc:
+        if exc.status_code != 413:
+            raise
+        raise BodyTooLarge(exc.detail) from None
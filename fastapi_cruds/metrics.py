@@ -0,0 +1,44 @@
+import time
+
+from cruds_common.metrics import UNMATCHED
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request in a `Metrics`, labelled by route path.
+
+    Latency runs until the last body chunk is sent, so streamed responses
+    are timed (and sized) in full.
+    """
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        bytes_in = 0
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                bytes_in = int(value) if value.isdigit() else 0
+                break
+        status = 500
+        bytes_out = 0
+
+        async def send_wrapper(message):
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router sets scope["route"] on the (shared) scope once it matches
+            route = scope.get("route")
+            self.metrics.observe(scope["method"], route.path if route is not None else UNMATCHED,
+                                 status, time.perf_counter() - start, bytes_in, bytes_out)
@@ -0,0 +1,57 @@
+from starlette.routing import Match
+
+from cruds_common.ratelimit import AsyncAdmissionGate, admission_gates, request_kind, retry_after
+from fastapi_cruds.responses import FastJSONResponse
+
+
+def route_path(scope):
+    """Path template of the route matching `scope` (resolved here: routing has not run yet)."""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return None
+
+
+class RateLimitMiddleware:
+    """ASGI middleware checking every HTTP request against a `RateLimiter`.
+
+    Over a rate: 429; no slot in the admission gate in time: 503; both with
+    Retry-After. A slot is held until the last body chunk is sent. Paths in
+    `exempt` are never limited.
+    """
+
+    def __init__(self, app, limiter, exempt=("/metrics",)):
+        self.app = app
+        self.limiter = limiter
+        self.exempt = frozenset(exempt)
+        self.gates = admission_gates(limiter, AsyncAdmissionGate)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        kind = request_kind(method)
+        route = None
+        if self.limiter.checks_routes:
+            path = route_path(scope)
+            route = f"{method} {path}" if path is not None else None
+        client = scope.get("client")
+        wait = self.limiter.check(kind, client[0] if client else None, route)
+        if wait:
+            return await self.reject(429, f"Rate limit exceeded for {kind} requests", wait, scope, receive, send)
+        gate = self.gates[kind]
+        if not await gate.acquire():
+            return await self.reject(503, "Server is busy, retry later", gate.timeout, scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    @staticmethod
+    async def reject(status_code, message, wait, scope, receive, send):
+        response = FastJSONResponse(status_code=status_code, headers={"Retry-After": retry_after(wait)},
+                                    content={"status": "error", "message": message, "data": None})
+        await response(scope, receive, send)
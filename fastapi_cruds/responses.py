@@ -0,0 +1,27 @@
+import anyio
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from cruds_common import serialization
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by `cruds_common.serialization` (orjson when installed).
+
+    Returning one from a route also skips FastAPI's `response_model`
+    validation, so use it for payloads built from already validated data.
+    """
+
+    def render(self, content):
+        return serialization.dumps(content)
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """StreamingResponse for a route that is still reading the request body while it responds.
+
+    StreamingResponse watches for a disconnect by calling `receive()`, which
+    would take body chunks away from the route. Here the route's own reads
+    notice the disconnect instead (ClientDisconnect).
+    """
+
+    async def listen_for_disconnect(self, receive):
+        await anyio.sleep_forever()
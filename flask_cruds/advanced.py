@@ -1,118 +1,419 @@
-from flask import Flask, jsonify, request, abort
+from flask import Flask, Response, jsonify, request, abort, stream_with_context
 
-app = Flask(__name__)
+from cruds_common.batch import BatchApplier, RecordParser, apply_stream, ndjson_results
+from cruds_common.cache import ResponseCache
+from cruds_common.changes import SSE_MEDIA_TYPE, ChangeLog, parse_since, sse_stream
+from cruds_common.compression import Compressor
+from cruds_common.config import AppConfig
+from cruds_common.etags import format_etag, if_match_precondition, none_match
+from cruds_common.idempotency import IdempotencyCache
+from cruds_common.limits import BodyLimits, BodyTooLarge
+from cruds_common.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, register_cache
+from cruds_common.pagination import NDJSON_MEDIA_TYPE, ndjson_stream
+from cruds_common.patch import MERGE_PATCH_MEDIA_TYPE, is_patch_media_type, prefers_minimal
+from cruds_common.ratelimit import RateLimiter
+from cruds_common.query import parse_fields, parse_filters, parse_sort, project
+from cruds_common.records import record_type
+from cruds_common.repository import StoreFull, UniqueViolation, VersionConflict, open_repository
+from cruds_common.schema import Field, Schema, SchemaError
+from cruds_common.store import IndexedStore
+from flask_cruds.compression import init_compression
+from flask_cruds.idempotency import idempotent
+from flask_cruds.json_provider import FastJSONProvider
+from flask_cruds.limits import body_limit, iter_body
+from flask_cruds.metrics import init_metrics
+from flask_cruds.ratelimit import init_rate_limits
 
 # ---------- TESTS ----------
 # GET ----> curl -X GET http://localhost:5000/users
+# GET ----> curl -X GET "http://localhost:5000/users?limit=100&cursor=2&stream=1"
 # GET ----> curl -X GET http://localhost:5000/users/1
+# GET ----> curl -N http://localhost:5000/users:changes?since=0
+# GET ----> curl -X GET "http://localhost:5000/users?email=J@J.com"
+# GET ----> curl -X GET "http://localhost:5000/users?email_prefix=j&sort=-name&fields=user_id,email"
 # POST ----> curl -X POST -H "Content-Type: application/json" -d '{"user_id": "3", "name": "John Doe", "email": "j@j.com"}' http://localhost:5000/users
+# RETRY ----> curl -X POST -H "Idempotency-Key: 3f2b9a6e" -H "Content-Type: application/json" -d '{"user_id": "3", "name": "John Doe", "email": "j3@j.com"}' http://localhost:5000/users
 # PUT ----> curl -X PUT -H "Content-Type: application/json" -d '{"name": "John Doe", "email": "j@j.com"}' http://localhost:5000/users/1
+# PATCH ----> curl -X PATCH -H "Content-Type: application/merge-patch+json" -d '{"name": "Johnny"}' http://localhost:5000/users/1
 # DELETE ----> curl -X DELETE http://localhost:5000/users/1
+# BATCH ----> curl -X POST -H "Content-Type: application/x-ndjson" --data-binary $'{"user_id": "4", "name": "A", "email": "a@a.com"}\n{"op": "delete", "user_id": "1"}' http://localhost:5000/users:batch
 
-fake_db = {
+# Users with exactly these fields are kept as slotted records (~3x smaller than dicts)
+UserRecord = record_type("UserRecord", ("user_id", "name", "email"))
+SEED_USERS = {
     "1": {"user_id": "1", "name": "John Doe", "email": "j@j.com"},
     "2": {"user_id": "2", "name": "Jane Smith", "email": "jane@x.com"}
 }
 
+# User payloads: compiled once into validators that type-check, strip and bound every
+# field and reject unknown ones, so only these fields ever reach the store
+USER_SCHEMA = Schema({
+    "user_id": Field(str, coerce=True, strip=True, min_length=1, max_length=64),
+    "name": Field(str, strip=True, min_length=1, max_length=200),
+    "email": Field(str, strip=True, min_length=1, max_length=254),
+})
+USER_FIELDS = tuple(USER_SCHEMA.fields)
+validate_create = USER_SCHEMA.compile()
+# PUT may repeat the user_id of the URL
+validate_update = USER_SCHEMA.extend(user_id=Field(str, required=False, coerce=True, strip=True)).compile()
+# PATCH: a JSON merge patch (RFC 7396) of any of the fields
+validate_patch = USER_SCHEMA.partial().compile()
+validate_batch_write = USER_SCHEMA.extend(op=Field(str, required=False)).compile()
+BATCH_VALIDATORS = {
+    "create": validate_batch_write,
+    "update": validate_batch_write,
+    "delete": Schema({"op": Field(str, required=False), "user_id": USER_SCHEMA.fields["user_id"]}).compile(),
+}
+
 # HELPER FUNCTIONS 
 def validate_user_data(data, require_id=True):
-    """Validate JSON data for create/update users."""
+    """Validate JSON data for create/update users; return the cleaned fields."""
     if not data:
         abort(400, description="Missing JSON data")
+    try:
+        return validate_create(data) if require_id else validate_update(data)
+    except SchemaError as exc:
+        abort(400, description=str(exc))
 
-    required_fields = ["name", "email"]
-    if require_id:
-        required_fields.insert(0, "user_id")
-
-    for field in required_fields:
-        if field not in data:
-            abort(400, description=f"Missing field: {field}")
-
-# Routes
-@app.route("/")
-def index():
-    return jsonify({
-        "message": "Flask Advanced CRUD API",
-        "routes": {
-            "GET /users": "Get all users",
-            "GET /users/<user_id>": "Get a specific user",
-            "POST /users": "Create a new user",
-            "PUT /users/<user_id>": "Update a user",
-            "DELETE /users/<user_id>": "Delete a user"
-        }
-    })
-
-# GET all users
-@app.route("/users", methods=["GET"])
-def get_users():
-    return jsonify(list(fake_db.values())), 200
-
-# GET single user
-@app.route("/users/<user_id>", methods=["GET"])
-def get_user(user_id):
-    user = fake_db.get(user_id)
-    if not user:
-        abort(404, description="User not found")
-    return jsonify(user), 200
-
-# CREATE user
-@app.route("/users", methods=["POST"])
-def create_user():
-    data = request.get_json(silent=True)
-    if not data:
+def validate_user_patch(data, user_id):
+    """Validate a merge patch of user `user_id`; return the cleaned fields."""
+    if data is None:
         abort(400, description="Missing JSON data")
+    try:
+        # null removes a field in a merge patch, and every user field is required
+        patch = validate_patch({name: value for name, value in data.items() if value is not None}
+                               if type(data) is dict else data)
+    except SchemaError as exc:
+        abort(400, description=str(exc))
+    removed = next((name for name, value in data.items() if value is None), None)
+    if removed is not None:
+        abort(400, description=f"{removed} cannot be removed")
+    if patch.get("user_id", user_id) != user_id:
+        abort(400, description="user_id does not match the URL")
+    return patch
 
-    required_fields = ["user_id", "name", "email"]
-    for field in required_fields:
-        if field not in data:
-            abort(400, description=f"Missing field: {field}")
+def parse_limit(value):
+    """Parse the `limit` query parameter (None means no limit)."""
+    if value is None:
+        return None
+    if not value.isdigit() or int(value) < 1:
+        abort(400, description="limit must be a positive integer")
+    return int(value)
 
-    user_id = data["user_id"]
-    if user_id in fake_db:
-        abort(400, description="User already exists")
+def validate_batch_record(record):
+    """Return `(op, user_id, cleaned fields)` for a batch record, or raise SchemaError."""
+    op = record.get("op", "create")
+    # (any JSON value may arrive here, and lists or objects cannot be looked up)
+    validate = BATCH_VALIDATORS.get(op) if isinstance(op, str) else None
+    if validate is None:
+        raise SchemaError(f"Unknown op: {op}")
+    data = validate(record)
+    data.pop("op", None)
+    return op, data["user_id"], data
 
-    fake_db[user_id] = data
-    return jsonify({"message": "User created", "user": data}), 201
 
-# UPDATE user
-@app.route("/users/<user_id>", methods=["PUT"])
-def update_user(user_id):
-    data = request.get_json(silent=True)
-    if not data:
-        abort(400, description="Missing JSON data")
+def create_app(config=None):
+    """Build the app, its store and its middleware from `config` (default: `AppConfig.from_env()`)."""
+    config = config or AppConfig.from_env()
+
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    # Bodies are capped at $CRUD_MAX_BODY_SIZE (413 beyond); /users:batch streams and allows more
+    limits = BodyLimits.from_env()
+    app.config["MAX_CONTENT_LENGTH"] = limits.max_body_size
+
+    # In-memory store; set CRUD_STORAGE_URL=sqlite:///path.db to share users across workers
+    fake_db = IndexedStore(SEED_USERS, record_type=UserRecord)
+    # Emails are unique (compared trimmed and case-insensitively); name and email have sorted
+    # indexes for GET /users?sort=, ?email= and ?email_prefix=
+    repo = open_repository("users", str, store=fake_db, unique_fields=("email",), sorted_fields=("name", "email"),
+                           url=config.storage_url)
+    # (ETag, body) of GET /users/<user_id>; every write through `repo` invalidates its key
+    user_cache = repo.subscribe(ResponseCache.from_env())
+    # Every write, numbered, in a ring buffer of the last $CRUD_CHANGES_CAPACITY changes: tailed by
+    # GET /users:changes (SSE) instead of polling GET /users
+    changes = repo.subscribe(ChangeLog.from_env())
+
+    # Per-route request counts, latency and sizes, served on GET /metrics
+    metrics = init_metrics(app, Metrics())
+    metrics.register("crud_store_records", "Users in the store.", lambda: len(repo))
+    register_cache(metrics, user_cache, "crud_user_cache")
+    metrics.register("crud_changes_last_seq", "Sequence number of the latest change.", lambda: changes.last_seq)
+
+    # gzip/brotli per Accept-Encoding; compressed list snapshots are reused while their ETag holds
+    compressor = init_compression(app, Compressor.from_env())
+    register_cache(metrics, compressor.cache, "crud_compression_cache")
+
+    # Reads and writes have separate budgets: per-client/per-route token buckets (429) and a
+    # bounded number of requests in flight, plus a bounded queue (503); see cruds_common/ratelimit.py
+    limiter = RateLimiter.from_env()
+    # (the change feed is exempt: its streams stay open for as long as their subscribers)
+    admission = init_rate_limits(app, limiter, exempt=("/metrics", "/users:changes"))
+
+    # POST /users, PUT and PATCH /users/<user_id> with an Idempotency-Key header: retries get the first
+    # response back (bounded, TTL-evicted), and concurrent duplicates wait for it instead of running
+    idempotency = IdempotencyCache.from_env()
+    register_cache(metrics, idempotency, "crud_idempotency_cache")
+
+    # Routes
+    @app.route("/")
+    def index():
+        return jsonify({
+            "message": "Flask Advanced CRUD API",
+            "routes": {
+                "GET /users": "Get all users (?limit=&cursor= to paginate, ?stream=1 for NDJSON, "
+                              "?email=/?email_prefix= to filter, ?sort=[-]name|email, ?fields=name,email)",
+                "GET /users/<user_id>": "Get a specific user",
+                "POST /users": "Create a new user",
+                "PUT /users/<user_id>": "Update a user",
+                "PATCH /users/<user_id>": "Change some fields of a user (JSON merge patch); returns the changed "
+                                          "fields, or 204 with Prefer: return=minimal",
+                "DELETE /users/<user_id>": "Delete a user",
+                "POST /users:batch": "Create, update or delete many users (JSON array or NDJSON)",
+                "GET /users:changes": "Tail user changes as Server-Sent Events (?since=<seq> or Last-Event-ID "
+                                      "to resume, ?follow=0 to stop once caught up)",
+                "GET /cache/stats": "Hit/miss counters of the GET /users/<user_id> cache",
+                "GET /metrics": "Per-route request metrics (Prometheus text format)"
+            }
+        })
+
+    # GET all users
+    @app.route("/users", methods=["GET"])
+    def get_users():
+        # Read the generation first: a concurrent write can only make the ETag stale, never too new
+        etag = format_etag(repo.generation(), prefix="g")
+        if none_match(request.headers.get("If-None-Match"), etag):
+            return "", 304, {"ETag": etag}
+        try:
+            limit = parse_limit(request.args.get("limit"))
+            sort = parse_sort(request.args.get("sort"), ("name", "email"))
+            fields = parse_fields(request.args.get("fields"), USER_FIELDS)
+            filters = parse_filters(request.args, ("email",))
+            if len(filters) == 1 and filters[0][1] == "eq" and request.args.get("cursor") is None:
+                # Exact email: one lookup in the unique index, at most one match
+                key = repo.lookup("email", filters[0][2])
+                keys, next_cursor = ([key] if key is not None else []), None
+            else:
+                keys, next_cursor = repo.keys(limit, request.args.get("cursor"), filters=filters, sort=sort)
+        except ValueError as exc:
+            abort(400, description=str(exc))
+        headers = {"ETag": etag}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        users = (project(user, fields) for _, user in repo.iter_many(keys))
+        if request.args.get("stream") in ("1", "true"):
+            return Response(ndjson_stream(users), mimetype=NDJSON_MEDIA_TYPE, headers=headers)
+        return jsonify(list(users)), 200, headers
+
+    # GET single user
+    @app.route("/users/<user_id>", methods=["GET"])
+    def get_user(user_id):
+        cached = user_cache.get(user_id)
+        if cached is not None:
+            etag, body = cached
+        else:
+            generation = user_cache.generation
+            user, version = repo.get_versioned(user_id)
+            if not user:
+                abort(404, description="User not found")
+            etag, body = format_etag(version), None
+        if none_match(request.headers.get("If-None-Match"), etag):
+            return "", 304, {"ETag": etag}
+        if body is None:
+            body = jsonify(user).get_data()
+            user_cache.set(user_id, (etag, body), generation)
+        return app.response_class(body, mimetype="application/json"), 200, {"ETag": etag}
+
+    # CREATE user
+    @app.route("/users", methods=["POST"])
+    @idempotent(idempotency)
+    def create_user():
+        data = validate_user_data(request.get_json(silent=True))
+        user_id = data["user_id"]
+        try:
+            created = repo.insert(user_id, data)
+        except UniqueViolation:
+            abort(409, description="Email already in use")
+        if not created:
+            abort(400, description="User already exists")
+
+        return jsonify({"message": "User created", "user": data}), 201
+
+    # UPDATE user
+    @app.route("/users/<user_id>", methods=["PUT"])
+    @idempotent(idempotency)
+    def update_user(user_id):
+        data = validate_user_data(request.get_json(silent=True), require_id=False)
+        if data.setdefault("user_id", user_id) != user_id:
+            abort(400, description="user_id does not match the URL")
+
+        precondition = if_match_precondition(request.headers.get("If-Match"))
+        try:
+            user, _ = repo.update(user_id, data, precondition=precondition)
+        except VersionConflict:
+            abort(412, description="User has changed (If-Match failed)")
+        except UniqueViolation:
+            abort(409, description="Email already in use")
+        if user is None:
+            abort(404, description="User not found")
+        return jsonify({"message": "User updated", "user": user}), 200
+
+    # PATCH user (JSON merge patch): only the changed fields are written, indexed and sent back
+    @app.route("/users/<user_id>", methods=["PATCH"])
+    @idempotent(idempotency)
+    def patch_user(user_id):
+        if not is_patch_media_type(request.content_type):
+            abort(415, description=f"Send a JSON merge patch ({MERGE_PATCH_MEDIA_TYPE})")
+        patch = validate_user_patch(request.get_json(silent=True), user_id)
+        precondition = if_match_precondition(request.headers.get("If-Match"))
+        try:
+            changed, version = repo.patch(user_id, patch, precondition=precondition)
+        except VersionConflict:
+            abort(412, description="User has changed (If-Match failed)")
+        except UniqueViolation:
+            abort(409, description="Email already in use")
+        if changed is None:
+            abort(404, description="User not found")
+        headers = {"ETag": format_etag(version)}
+        if prefers_minimal(request.headers.get("Prefer")):
+            return "", 204, {**headers, "Preference-Applied": "return=minimal"}
+        return jsonify({"message": "User updated", "changed": changed}), 200, headers
+
+    # DELETE user
+    @app.route("/users/<user_id>", methods=["DELETE"])
+    def delete_user(user_id):
+        if not repo.delete(user_id):
+            abort(404, description="User not found")
+
+        return jsonify({"message": f"User {user_id} deleted"}), 204
+
+    # BATCH create/update/delete users (parsed and applied as the body arrives)
+    @app.route("/users:batch", methods=["POST"])
+    @body_limit(limits.max_batch_body_size)
+    def batch_users():
+        parser = RecordParser(request.content_type, max_record_size=limits.max_record_size)
+        applier = BatchApplier(validate_batch_record, "user_id", "User", chunk_size=limits.batch_chunk_size)
+        results = apply_stream(repo, iter_body(), parser, applier)
+        if request.accept_mimetypes.best_match(["application/json", NDJSON_MEDIA_TYPE]) == NDJSON_MEDIA_TYPE:
+            # One result line per record, sent as its chunk is applied: memory stays flat
+            return Response(stream_with_context(ndjson_results(results)), mimetype=NDJSON_MEDIA_TYPE)
+        done = []
+        try:
+            done.extend(results)
+        except BodyTooLarge as exc:
+            return jsonify({"error": "Payload Too Large", "message": str(exc), "results": done}), 413
+        except ValueError as exc:
+            # Chunks completed before the error were applied; `results` lists them
+            return jsonify({"error": "Bad Request", "message": str(exc), "results": done}), 400
+        return jsonify({"message": "Batch applied", "results": done}), 200
+
+    # CHANGE FEED (Server-Sent Events)
+    @app.route("/users:changes", methods=["GET"])
+    def user_changes():
+        try:
+            since = parse_since(request.args.get("since"), request.headers.get("Last-Event-ID"))
+        except ValueError as exc:
+            abort(400, description=str(exc))
+        follow = request.args.get("follow") not in ("0", "false")
+        # Each subscriber reads the ring at its own pace; one that falls behind gets a `resync` event
+        batches = changes.follow(changes.last_seq if since is None else since, follow=follow)
+        return Response(stream_with_context(sse_stream(batches)), mimetype=SSE_MEDIA_TYPE,
+                        headers={"Cache-Control": "no-cache"})
+
+    # CACHE STATS
+    @app.route("/cache/stats", methods=["GET"])
+    def cache_stats():
+        return jsonify(user_cache.stats()), 200
+
+    # METRICS (Prometheus text format)
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
+
+    # CUSTOM ERROR HANDLERS
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({"error": "Bad Request", "message": error.description}), 400
+
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({"error": "Not Found", "message": error.description}), 404
+
+    @app.errorhandler(409)
+    def conflict(error):
+        return jsonify({"error": "Conflict", "message": error.description}), 409
+
+    @app.errorhandler(413)
+    def payload_too_large(error):
+        return jsonify({"error": "Payload Too Large", "message": error.description}), 413
+
+    @app.errorhandler(412)
+    def precondition_failed(error):
+        return jsonify({"error": "Precondition Failed", "message": error.description}), 412
+
+    @app.errorhandler(415)
+    def unsupported_media_type(error):
+        return jsonify({"error": "Unsupported Media Type", "message": error.description}), 415, \
+            {"Accept-Patch": MERGE_PATCH_MEDIA_TYPE}
+
+    @app.errorhandler(422)
+    def unprocessable_entity(error):
+        return jsonify({"error": "Unprocessable Entity", "message": error.description}), 422
 
-    if user_id not in fake_db:
-        abort(404, description="User not found")
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        return jsonify({"error": "Too Many Requests", "message": error.description}), 429, \
+            {"Retry-After": error.retry_after}
 
-    required_fields = ["name", "email"]
-    for field in required_fields:
-        if field not in data:
-            abort(400, description=f"Missing field: {field}")
+    @app.errorhandler(503)
+    def service_unavailable(error):
+        return jsonify({"error": "Service Unavailable", "message": error.description}), 503, \
+            {"Retry-After": error.retry_after}
 
-    fake_db[user_id].update(data)
-    return jsonify({"message": "User updated", "user": fake_db[user_id]}), 200
+    @app.errorhandler(StoreFull)
+    def insufficient_storage(error):
+        return jsonify({"error": "Insufficient Storage", "message": "Storage is full"}), 507
 
-# DELETE user
-@app.route("/users/<user_id>", methods=["DELETE"])
-def delete_user(user_id):
-    if user_id not in fake_db:
-        abort(404, description="User not found")
+    @app.errorhandler(500)
+    def internal_error(error):
+        return jsonify({"error": "Internal Server Error"}), 500
 
-    del fake_db[user_id]
-    return jsonify({"message": f"User {user_id} deleted"}), 204
+    # What tests, benchmarks and `preload` reach into
+    app.extensions["cruds"] = {
+        "limits": limits, "fake_db": fake_db, "repo": repo, "user_cache": user_cache, "changes": changes,
+        "metrics": metrics, "compressor": compressor, "limiter": limiter, "admission": admission,
+        "idempotency": idempotency,
+    }
+    if config.preload:
+        preload(app)
+    return app
 
-# CUSTOM ERROR HANDLERS
-@app.errorhandler(400)
-def bad_request(error):
-    return jsonify({"error": "Bad Request", "message": error.description}), 400
+def preload(app):
+    """Do before the first request what it would otherwise pay for: compile the URL matcher
+    and read users (as many as the cache holds) into the GET /users/<user_id> cache."""
+    state = app.extensions["cruds"]
+    repo, user_cache = state["repo"], state["user_cache"]
+    app.url_map.update()
+    keys, _ = repo.keys(user_cache.maxsize)
+    for user_id in keys:
+        generation = user_cache.generation
+        user, version = repo.get_versioned(user_id)
+        if user:
+            user_cache.set(user_id, (format_etag(version), app.json.response(user).get_data()), generation)
 
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({"error": "Not Found", "message": error.description}), 404
+# The app built from the environment, created on first access (`gunicorn flask_cruds.advanced:app`,
+# `flask --app flask_cruds.advanced run`), and its parts as module attributes (`repo`, `fake_db`...)
+APP_PARTS = ("limits", "fake_db", "repo", "user_cache", "changes", "metrics", "compressor", "limiter",
+             "admission", "idempotency")
+_app = None
 
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({"error": "Internal Server Error"}), 500
+def __getattr__(name):
+    global _app
+    if name != "app" and name not in APP_PARTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        _app = create_app()
+    return _app if name == "app" else _app.extensions["cruds"][name]
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,35 @@
+from flask import request
+
+from cruds_common.compression import weak_etag
+
+
+def init_compression(app, compressor):
+    """Compress the responses of `app` per Accept-Encoding (see `cruds_common.compression`).
+
+    Register it after `init_metrics`: after_request hooks run in reverse
+    order, so the metrics then see the compressed size.
+    """
+
+    @app.after_request
+    def compress(response):
+        if response.status_code < 200 or response.status_code in (204, 304) \
+                or "Content-Encoding" in response.headers or not compressor.compressible(response.mimetype):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = compressor.negotiate(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = compressor.stream(encoding).iter(response.iter_encoded())
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < compressor.min_size:
+                return response
+            response.set_data(compressor.compress(body, encoding, request.full_path, response.headers.get("ETag")))
+        response.headers["Content-Encoding"] = encoding
+        if "ETag" in response.headers:
+            response.headers["ETag"] = weak_etag(response.headers["ETag"])
+        return response
+
+    return compressor
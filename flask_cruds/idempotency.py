@@ -0,0 +1,54 @@
+from functools import wraps
+
+from flask import Response, abort, current_app, request
+from werkzeug.exceptions import HTTPException
+
+from cruds_common.idempotency import (BUSY, IDEMPOTENCY_HEADER, MAX_KEY_LENGTH, MISMATCH, REPLAY, REPLAYED_HEADER,
+                                      StoredResponse, request_fingerprint)
+
+
+def idempotent(cache):
+    """Make a view replay its first response to requests repeating an Idempotency-Key header.
+
+    Requests without the header run as usual. Errors the view raises (e.g.
+    `abort(400)`) are rendered by the app's error handlers and stored like
+    any response below 500. The 409 (first request still running) and 422
+    (key reused for another request) raised here are rendered the same way.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if key is None:
+                return view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                abort(400, description=f"{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+            scope = (request.method, request.path, key)
+            fingerprint = request_fingerprint(request.method, request.full_path, request.get_data())
+            outcome, stored = cache.begin(scope, fingerprint)
+            if outcome == REPLAY:
+                response = Response(stored.body, stored.status, stored.headers)
+                response.headers[REPLAYED_HEADER] = "true"
+                return response
+            if outcome == MISMATCH:
+                abort(422, description=f"{IDEMPOTENCY_HEADER} was already used for a different request")
+            if outcome == BUSY:
+                abort(409, description=f"A request with this {IDEMPOTENCY_HEADER} is still in progress")
+
+            try:
+                try:
+                    rv = view(*args, **kwargs)
+                except HTTPException as exc:
+                    rv = current_app.handle_user_exception(exc)
+                response = current_app.make_response(rv)
+            except BaseException:
+                cache.abandon(scope)
+                raise
+            if response.status_code >= 500 or response.is_streamed:
+                cache.abandon(scope)
+            else:
+                cache.finish(scope, StoredResponse(response.status_code, list(response.headers.items()),
+                                                   response.get_data()))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,17 @@
+from flask.json.provider import DefaultJSONProvider
+
+from cruds_common import serialization
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by `cruds_common.serialization` (orjson when installed)."""
+
+    def dumps(self, obj, **kwargs):
+        return serialization.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return serialization.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serialization.dumps(obj) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,40 @@
+from functools import wraps
+
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from cruds_common.limits import BodyTooLarge
+
+
+def body_limit(max_bytes):
+    """Let a view read up to `max_bytes` of request body instead of MAX_CONTENT_LENGTH (413 beyond)."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            request.max_content_length = max_bytes
+            return view(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def iter_body(chunk_size=64 * 1024):
+    """Return an iterator over the request body in chunks, read as it is received.
+
+    A Content-Length over the limit raises 413 here, before any response is started;
+    a body that goes over it while streaming raises BodyTooLarge from the iterator.
+    """
+    stream, limit = request.stream, request.max_content_length
+
+    def chunks():
+        while True:
+            try:
+                chunk = stream.read(chunk_size)
+            except RequestEntityTooLarge:
+                raise BodyTooLarge(f"Request body exceeds {limit} bytes") from None
+            if not chunk:
+                return
+            yield chunk
+
+    return chunks()
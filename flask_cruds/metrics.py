@@ -0,0 +1,26 @@
+import time
+
+from flask import g, request
+
+from cruds_common.metrics import UNMATCHED
+
+
+def init_metrics(app, metrics):
+    """Record every request of `app` in `metrics`, labelled by its URL rule."""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record(response):
+        start = g.get("metrics_start")
+        if start is not None:
+            rule = request.url_rule
+            # Streamed bodies have no length; they count as 0 bytes
+            metrics.observe(request.method, rule.rule if rule is not None else UNMATCHED,
+                            response.status_code, time.perf_counter() - start,
+                            request.content_length or 0, response.content_length or 0)
+        return response
+
+    return metrics
@@ -0,0 +1,40 @@
+from flask import g, request
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from cruds_common.ratelimit import AdmissionGate, admission_gates, request_kind, retry_after
+
+
+def init_rate_limits(app, limiter, exempt=("/metrics",)):
+    """Check every request of `app` against `limiter`: 429 over a rate, 503 when the gate is full.
+
+    The error handlers of `app` render the errors; `error.retry_after` holds
+    the Retry-After value. Paths in `exempt` are never limited.
+    """
+    gates = admission_gates(limiter, AdmissionGate)
+
+    @app.before_request
+    def admit():
+        environ = request.environ  # plain dict: cheaper than several request attributes
+        if environ["PATH_INFO"] in exempt:
+            return
+        method = environ["REQUEST_METHOD"]
+        kind = request_kind(method)
+        route = None
+        if limiter.checks_routes and request.url_rule is not None:
+            route = f"{method} {request.url_rule.rule}"
+        wait = limiter.check(kind, environ.get("REMOTE_ADDR"), route)
+        if wait:
+            raise TooManyRequests(f"Rate limit exceeded for {kind} requests", retry_after=retry_after(wait))
+        gate = gates[kind]
+        if not gate.acquire():
+            raise ServiceUnavailable("Server is busy, retry later", retry_after=retry_after(gate.timeout))
+        g.admission_gate = gate
+
+    @app.teardown_request
+    def leave(exc):
+        # Runs once the response is sent, streamed bodies included
+        gate = g.pop("admission_gate", None)
+        if gate is not None:
+            gate.release()
+
+    return gates
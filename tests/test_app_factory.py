@@ -0,0 +1,71 @@
+import json
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+import fastapi_cruds.advanced as fastapi_advanced
+import flask_cruds.advanced as flask_advanced
+from cruds_common.config import AppConfig
+
+def test_config_from_env(monkeypatch):
+    monkeypatch.setenv("CRUD_PRELOAD", "yes")
+    monkeypatch.setenv("CRUD_OPENAPI", "0")
+    monkeypatch.setenv("CRUD_LOG_READ_SAMPLE", "10")
+    config = AppConfig.from_env()
+    assert config.preload is True and config.openapi is False
+    assert config.log_read_sample == 10 and config.storage_url == "memory://"
+
+def test_flask_apps_are_independent():
+    first, second = flask_advanced.create_app(), flask_advanced.create_app()
+    first.test_client().delete("/users/1")
+    assert first.test_client().get("/users/1").status_code == 404
+    assert second.test_client().get("/users/1").status_code == 200
+
+def test_flask_preload_fills_the_cache():
+    app = flask_advanced.create_app(AppConfig(preload=True))
+    user_cache = app.extensions["cruds"]["user_cache"]
+    assert user_cache.stats()["size"] == 2
+    resp = app.test_client().get("/users/1")
+    assert resp.status_code == 200 and resp.get_json()["email"] == "j@j.com"
+    assert user_cache.hits == 1 and user_cache.misses == 0
+
+def test_fastapi_apps_are_independent():
+    first, second = fastapi_advanced.create_app(), fastapi_advanced.create_app()
+    with TestClient(first) as client:
+        assert client.post("/items/1", json={"name": "Item1"}).status_code == 201
+    with TestClient(second) as client:
+        assert client.get("/items/1").status_code == 404
+
+def test_fastapi_preload_fills_the_cache():
+    app = fastapi_advanced.create_app()
+    app.state.repo.insert(1, {"name": "Item1", "description": None})
+    fastapi_advanced.preload(app)
+    assert app.state.item_cache.stats()["size"] == 1
+    with TestClient(app) as client:
+        assert client.get("/items/1").json()["data"]["name"] == "Item1"
+    assert app.state.item_cache.hits == 1
+
+def test_fastapi_apps_share_one_log_pipeline():
+    first = fastapi_advanced.create_app()
+    second = fastapi_advanced.create_app()
+    assert first.state.log_listener._thread is None
+    assert fastapi_advanced.logger.handlers[0].listener is second.state.log_listener
+
+def test_fastapi_openapi_can_be_disabled():
+    with TestClient(fastapi_advanced.create_app(AppConfig(openapi=False))) as client:
+        assert client.get("/openapi.json").status_code == 404
+        assert client.get("/docs").status_code == 404
+    with TestClient(fastapi_advanced.create_app()) as client:
+        assert "/items/{item_id}" in client.get("/openapi.json").json()["paths"]
+
+def test_import_defers_what_the_app_does_not_need():
+    # A fresh interpreter: this one has already imported everything
+    code = ("import sys, json, {module}; "
+            "print(json.dumps([name for name in {names} if name in sys.modules]))")
+    def loaded(module, names):
+        out = subprocess.run([sys.executable, "-c", code.format(module=module, names=names)],
+                             capture_output=True, text=True, check=True).stdout
+        return json.loads(out)
+    assert loaded("flask_cruds.advanced", ["asyncio", "sqlite3"]) == []
+    assert loaded("fastapi_cruds.advanced", ["uvicorn", "sqlite3"]) == []
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+import pytest
+from cruds_common.async_repository import AsyncRepository
+from cruds_common.repository import DictRepository, SQLiteRepository, VersionConflict
+
+class SlowRepository(DictRepository):
+    """DictRepository whose calls block like I/O, tracking how many run at once."""
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.running = 0
+        self.peak = 0
+        self._counter = threading.Lock()
+
+    def get(self, key):
+        with self._counter:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.02)
+        with self._counter:
+            self.running -= 1
+        return super().get(key)
+
+@pytest.fixture
+def sqlite_repo(tmp_path):
+    repo = AsyncRepository(SQLiteRepository(str(tmp_path / "crud.db"), "items", key_type=int))
+    yield repo
+    repo.repo.pool.close()
+    repo.close()
+
+async def test_same_interface_as_repository(sqlite_repo):
+    assert await sqlite_repo.insert(1, {"name": "One"}) is True
+    assert await sqlite_repo.update(2, {"name": "Two"}, upsert=True) == ({"name": "Two"}, True)
+    record, version = await sqlite_repo.get_versioned(1)
+    with pytest.raises(VersionConflict):
+        await sqlite_repo.update(1, {"name": "X"}, precondition=lambda v: v == version + 100)
+    assert await sqlite_repo.keys(limit=1) == ([1], 1)
+    assert [pair async for pair in sqlite_repo.iter_many([2, 1, 3], chunk_size=1)] == \
+        [(2, {"name": "Two"}), (1, {"name": "One"})]
+    assert await sqlite_repo.apply_batch([("delete", 1, None)]) == ["deleted"]
+    assert await sqlite_repo.count() == 1
+
+async def test_blocking_calls_leave_the_loop_free_and_are_bounded():
+    slow = SlowRepository()
+    slow.insert(1, {"name": "One"})
+    repo = AsyncRepository(slow, concurrency=3)
+    start = time.perf_counter()
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while time.perf_counter() - start < 0.1:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    results = await asyncio.gather(*(repo.get(1) for _ in range(12)), ticker())
+    assert results[:12] == [{"name": "One"}] * 12
+    assert slow.peak == 3
+    assert ticks > 5  # the loop kept running while the calls blocked
+    repo.close()
+
+async def test_non_blocking_backend_is_called_inline():
+    repo = AsyncRepository(DictRepository())
+    thread = await repo.run(threading.current_thread)
+    assert thread is threading.current_thread()
+    repo.close()
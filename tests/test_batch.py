@@ -0,0 +1,86 @@
+import json
+import pytest
+from cruds_common.batch import BatchApplier, RecordParser, apply_stream, ndjson_results, parse_records
+from cruds_common.repository import DictRepository
+
+RECORDS = [{"id": i, "name": f"Café {i}", "tags": ["a", {"b": "]}"}]} for i in range(5)]
+
+def feed_in_pieces(parser, body, size):
+    records = []
+    for start in range(0, len(body), size):
+        records += parser.feed(body[start:start + size])
+    return records + parser.close()
+
+# PARSING
+@pytest.mark.parametrize("size", [1, 7, 10_000])
+def test_json_array_parsed_incrementally(size):
+    body = json.dumps(RECORDS, ensure_ascii=False).encode()
+    assert feed_in_pieces(RecordParser("application/json"), body, size) == RECORDS
+
+@pytest.mark.parametrize("size", [1, 7, 10_000])
+def test_ndjson_parsed_incrementally(size):
+    body = "\n".join(json.dumps(r, ensure_ascii=False) for r in RECORDS).encode()
+    assert feed_in_pieces(RecordParser("application/x-ndjson; charset=utf-8"), body, size) == RECORDS
+
+def test_records_returned_as_soon_as_complete():
+    parser = RecordParser("application/json")
+    assert parser.feed(b'[{"a": 1}, {"a"') == [{"a": 1}]
+    assert parser.feed(b': 2}') == [{"a": 2}]
+    assert parser.feed(b"]") == []
+    assert parser.close() == []
+
+@pytest.mark.parametrize("body, message", [
+    (b'{"a": 1}', "must be a list"),
+    (b'[1, 2]', "must be a list"),
+    (b'[{"a": 1} {"a": 2}]', "Invalid JSON"),
+    (b'[{"a": 1},', "middle of the array"),
+    (b'[{"a": 1]', "Invalid JSON"),
+    (b'[{"a": 1}] []', "after the batch array"),
+    (b'', "must be a list"),
+])
+def test_invalid_json_bodies(body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_records(body, "application/json")
+
+def test_record_size_is_capped():
+    parser = RecordParser("application/json", max_record_size=100)
+    parser.feed(b'[{"a": "')
+    with pytest.raises(ValueError, match="exceeds 100 bytes"):
+        parser.feed(b"x" * 200)
+    with pytest.raises(ValueError, match="exceeds 100 bytes"):
+        RecordParser("application/x-ndjson", max_record_size=100).feed(b'{"a": "' + b"x" * 200)
+
+# APPLYING
+def validate(record):
+    if "name" not in record:
+        raise ValueError("Missing field: name")
+    return record.get("op", "create"), record["id"], {"name": record["name"]}
+
+class CountingRepository(DictRepository):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def apply_batch(self, ops, upsert=False):
+        self.batches.append(len(ops))
+        return super().apply_batch(ops, upsert=upsert)
+
+def test_apply_stream_applies_in_chunks_and_keeps_order():
+    repo = CountingRepository()
+    records = [{"id": i, "name": str(i)} for i in range(5)] + [{"id": 99}] + [{"id": 1, "name": "dup"}]
+    body = "\n".join(json.dumps(r) for r in records).encode()
+    applier = BatchApplier(validate, "id", "Thing", chunk_size=2)
+    results = list(apply_stream(repo, [body[:20], body[20:]], RecordParser("application/x-ndjson"), applier))
+    assert [(r["index"], r["id"], r["status"]) for r in results] == \
+        [(0, 0, 201), (1, 1, 201), (2, 2, 201), (3, 3, 201), (4, 4, 201), (5, 99, 400), (6, 1, 400)]
+    assert results[5]["message"] == "Missing field: name"
+    assert results[6]["message"] == "Thing already exists"
+    assert repo.batches == [2, 2, 2]
+
+def test_ndjson_results_end_with_the_body_error():
+    repo = DictRepository()
+    applier = BatchApplier(validate, "id", "Thing", chunk_size=1)
+    results = apply_stream(repo, [b'[{"id": 1, "name": "a"},', b' {"id": 2, oops}]'], RecordParser("application/json"), applier)
+    lines = [json.loads(line) for line in b"".join(ndjson_results(results)).splitlines()]
+    assert lines == [{"index": 0, "id": 1, "status": 201, "message": "Thing created"},
+                     {"status": 400, "message": "Invalid JSON in batch body"}]
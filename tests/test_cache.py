@@ -0,0 +1,35 @@
+from cruds_common.cache import ResponseCache
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2)
+    cache.set(1, b"one")
+    cache.set(2, b"two")
+    cache.get(1)
+    cache.set(3, b"three")
+    assert cache.get(2) is None
+    assert cache.get(1) == b"one"
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("cruds_common.cache.time.monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=5)
+    cache.set(1, b"one")
+    assert cache.get(1) == b"one"
+    now[0] += 6
+    assert cache.get(1) is None
+
+def test_hit_miss_counters():
+    cache = ResponseCache()
+    cache.get(1)
+    cache.set(1, b"one")
+    cache.get(1)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+def test_set_skipped_after_concurrent_invalidation():
+    cache = ResponseCache()
+    generation = cache.generation
+    cache.on_set(1, None, {"name": "new"})
+    cache.set(1, b"stale", generation)
+    assert cache.get(1) is None
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import pytest
+from cruds_common.changes import ChangeLog, ResyncRequired, parse_since, sse_stream
+from cruds_common.repository import DictRepository
+from cruds_common.serialization import loads
+
+def test_writes_are_numbered_in_order():
+    repo = DictRepository()
+    changes = repo.subscribe(ChangeLog(capacity=10))
+    repo.insert("1", {"name": "a"})
+    repo.update("1", {"name": "b"})
+    repo.delete("1")
+    repo.clear()
+    assert [(c.seq, c.op, c.key) for c in changes.read(0)] == \
+        [(1, "create", "1"), (2, "update", "1"), (3, "delete", "1"), (4, "clear", None)]
+    assert changes.read(0)[1].record == {"name": "b"}
+    assert loads(changes.read(0)[0].json()) == {"seq": 1, "op": "create", "key": "1", "record": {"name": "a"}}
+    assert [c.seq for c in changes.read(2)] == [3, 4]
+    assert [c.seq for c in changes.read(0, limit=2)] == [1, 2]
+    assert changes.read(4) == [] and changes.read(None) == []
+
+def test_overwritten_changes_require_resync():
+    changes = ChangeLog(capacity=3)
+    for i in range(5):
+        changes.publish("create", i, {})
+    assert changes.first_seq == 3
+    assert [c.seq for c in changes.read(2)] == [3, 4, 5]
+    with pytest.raises(ResyncRequired) as exc:
+        changes.read(1)
+    assert (exc.value.since, exc.value.seq) == (1, 5)
+    with pytest.raises(ResyncRequired):
+        changes.read(9)  # from before a restart
+
+def test_wait_wakes_threads():
+    changes = ChangeLog()
+    assert not changes.wait(0, timeout=0.01)
+    threading.Timer(0.01, changes.publish, ("create", "1", {})).start()
+    assert changes.wait(0, timeout=5)
+
+async def test_wait_async_wakes_from_another_thread():
+    changes = ChangeLog()
+    assert not await changes.wait_async(0, timeout=0.01)
+    threading.Timer(0.01, changes.publish, ("create", "1", {})).start()
+    assert await changes.wait_async(0, timeout=5)
+    assert changes._async_waiters == []
+
+async def test_follow_async_yields_batches():
+    changes = ChangeLog()
+    changes.publish("create", "1", {})
+    follower = changes.follow_async(0)
+    assert [c.seq for c in await anext(follower)] == [1]
+    asyncio.get_running_loop().call_later(0.01, changes.publish, "delete", "1")
+    assert [c.op for c in await anext(follower)] == ["delete"]
+    await follower.aclose()
+
+def test_sse_stream():
+    changes = ChangeLog(capacity=2)
+    changes.publish("create", "1", {"name": "a"})
+    body = b"".join(sse_stream(changes.follow(0, follow=False)))
+    assert body == b'id: 1\nevent: change\ndata: {"seq":1,"op":"create","key":"1","record":{"name":"a"}}\n\n'
+    assert b"".join(sse_stream(iter([[]]))) == b": keep-alive\n\n"
+    for i in range(3):
+        changes.publish("delete", str(i))
+    assert b"".join(sse_stream(changes.follow(0, follow=False))) == \
+        b'event: resync\ndata: {"since":0,"seq":4}\n\n'
+
+def test_parse_since():
+    assert parse_since(None) is None
+    assert parse_since("5", "9") == 5
+    assert parse_since(None, "9") == 9
+    with pytest.raises(ValueError):
+        parse_since("-1")
@@ -0,0 +1,42 @@
+import gzip
+import pytest
+from cruds_common import compression
+from cruds_common.compression import Compressor, choose_encoding, parse_accept_encoding
+
+@pytest.fixture(params=["gzip", "br"])
+def encoding(request):
+    if request.param == "br" and compression.brotli is None:
+        pytest.skip("brotli not installed")
+    return request.param
+
+def decompress(data, encoding):
+    return compression.brotli.decompress(data) if encoding == "br" else gzip.decompress(data)
+
+# NEGOTIATION
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.5, *;q=0") == {"gzip": 1.0, "br": 0.5, "*": 0.0}
+    assert parse_accept_encoding(None) == {}
+
+def test_choose_encoding_by_q_then_server_preference():
+    assert choose_encoding("gzip, br", ("br", "gzip")) == "br"
+    assert choose_encoding("gzip, br;q=0.5", ("br", "gzip")) == "gzip"
+    assert choose_encoding("*", ("br", "gzip")) == "br"
+    assert choose_encoding("identity", ("br", "gzip")) is None
+    assert choose_encoding("gzip;q=0", ("gzip",)) is None
+
+# COMPRESSION
+def test_compress_round_trip_and_cache(encoding):
+    compressor = Compressor()
+    body = b'{"name":"Item"}' * 200
+    first = compressor.compress(body, encoding, "/items", '"g1"')
+    assert decompress(first, encoding) == body
+    assert compressor.compress(body, encoding, "/items", '"g1"') is first
+    assert compressor.cache.hits == 1
+    # A new ETag (the list changed) is compressed again
+    compressor.compress(body, encoding, "/items", '"g2"')
+    assert compressor.cache.misses == 2
+
+def test_stream_round_trip(encoding):
+    chunks = [b'{"n":%d}\n' % i for i in range(100)]
+    data = b"".join(Compressor().stream(encoding).iter(chunks))
+    assert decompress(data, encoding) == b"".join(chunks)
@@ -0,0 +1,86 @@
+import sys
+import threading
+import pytest
+from cruds_common.repository import DictRepository, SQLiteRepository, UniqueViolation
+
+WRITERS = 8
+ROUNDS = 200
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    # Switch threads far more often than usual to surface check-then-act races
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+@pytest.fixture(params=["dict", "sqlite"])
+def repo(request, tmp_path):
+    if request.param == "dict":
+        yield DictRepository(search_fields=("name",))
+    else:
+        repo = SQLiteRepository(str(tmp_path / "stress.db"), "items", key_type=int)
+        yield repo
+        repo.pool.close()
+
+def run_writers(target):
+    errors = []
+    def wrapped(writer):
+        try:
+            target(writer)
+        except Exception as exc:  # surfaced in the main thread
+            errors.append(exc)
+    threads = [threading.Thread(target=wrapped, args=(w,)) for w in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+def test_concurrent_inserts_create_each_key_once(repo):
+    created = []
+    def writer(w):
+        for key in range(ROUNDS // 4):
+            if repo.insert(key, {"name": f"W{w}", "description": ""}):
+                created.append(key)
+    run_writers(writer)
+    assert sorted(created) == list(range(ROUNDS // 4))
+
+def test_concurrent_updates_lose_no_fields(repo):
+    repo.insert(1, {"name": "shared"})
+    def writer(w):
+        for i in range(ROUNDS // 4):
+            repo.update(1, {f"w{w}": i})
+    run_writers(writer)
+    record = repo.get(1)
+    assert all(record[f"w{w}"] == ROUNDS // 4 - 1 for w in range(WRITERS))
+
+def test_concurrent_mixed_writes_keep_indexes_consistent(repo):
+    def writer(w):
+        for i in range(ROUNDS):
+            key = (w * ROUNDS + i) % 97
+            if i % 3 == 2:
+                repo.delete(key)
+            else:
+                repo.update(key, {"name": f"Name{key}x", "description": ""}, upsert=True)
+    run_writers(writer)
+    keys, _ = repo.keys()
+    assert keys == sorted(keys)
+    assert keys == [k for k in range(97) if repo.get(k) is not None]
+    assert repo.keys(contains=("name", "x"))[0] == keys
+
+def test_concurrent_writers_cannot_share_a_unique_value():
+    repo = DictRepository(unique_fields=("email",))
+    winners = []
+
+    def writer(w):
+        for n in range(ROUNDS):
+            try:
+                repo.insert(f"{w}-{n}", {"email": f"user{n}@x.com"})
+                winners.append(n)
+            except UniqueViolation:
+                pass
+
+    run_writers(writer)
+    assert sorted(winners) == list(range(ROUNDS))
+    assert len({record["email"] for record in repo.store.values()}) == len(repo) == ROUNDS
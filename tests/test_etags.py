@@ -0,0 +1,17 @@
+from cruds_common.etags import format_etag, if_match_precondition, none_match
+
+def test_none_match_uses_weak_comparison():
+    etag = format_etag(3)
+    assert none_match('"v3"', etag)
+    assert none_match('W/"v3", "v4"', etag)
+    assert none_match("*", etag)
+    assert not none_match('"v4"', etag)
+    assert not none_match(None, etag)
+
+def test_if_match_precondition():
+    assert if_match_precondition(None) is None
+    assert if_match_precondition('"v3"')(3)
+    assert not if_match_precondition('"v3"')(4)
+    assert not if_match_precondition('W/"v3"')(3)
+    assert if_match_precondition("*")(1)
+    assert not if_match_precondition("*")(None)
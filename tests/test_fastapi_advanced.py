@@ -1,3 +1,4 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from fastapi_cruds.advanced import app
@@ -96,3 +97,262 @@ def test_http_exception_handler(client, item_id):
     data = resp.json()
     assert data["status"] == "error"
     assert "not found" in data["message"]
+
+def test_list_items_filter_follows_update_and_delete(client):
+    client.post("/items/11", json={"name": "Searchable"})
+    client.put("/items/11", json={"name": "Renamed"})
+    assert "11" not in client.get("/items", params={"name": "search"}).json()["data"]
+    assert "11" in client.get("/items", params={"name": "renamed"}).json()["data"]
+    client.delete("/items/11")
+    assert "11" not in client.get("/items", params={"name": "renamed"}).json()["data"]
+
+def test_list_items_paginated_with_filter(client):
+    for item_id in (12, 13, 14):
+        client.post(f"/items/{item_id}", json={"name": f"Paged{item_id}"})
+    resp = client.get("/items", params={"name": "paged", "limit": 2})
+    assert list(resp.json()["data"]) == ["12", "13"]
+    resp2 = client.get("/items", params={"name": "paged", "limit": 2, "cursor": resp.headers["X-Next-Cursor"]})
+    assert list(resp2.json()["data"]) == ["14"]
+
+def test_list_items_stream_ndjson(client):
+    client.post("/items/15", json={"name": "Streamed"})
+    resp = client.get("/items", params={"name": "streamed", "stream": True})
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in resp.text.splitlines()] == [
+        {"item_id": 15, "item": {"name": "Streamed", "description": ""}}
+    ]
+
+def test_batch_items(client):
+    client.post("/items/20", json={"name": "Existing"})
+    resp = client.post("/items:batch", json=[
+        {"item_id": 21, "item": {"name": "Batch21"}},
+        {"op": "update", "item_id": 20, "item": {"name": "Updated20"}},
+        {"item_id": 20, "item": {"name": "Dup"}},
+        {"op": "delete", "item_id": 9998},
+        {"item_id": 22},
+    ])
+    assert resp.status_code == 200
+    results = resp.json()["data"]["results"]
+    assert [r["status"] for r in results] == [201, 200, 400, 404, 400]
+    assert client.get("/items/21").json()["data"]["name"] == "Batch21"
+    assert client.get("/items/20").json()["data"]["name"] == "Updated20"
+
+def test_batch_items_ndjson(client):
+    body = "\n".join(json.dumps({"item_id": i, "item": {"name": f"Nd{i}"}}) for i in (23, 24))
+    resp = client.post("/items:batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert [r["status"] for r in resp.json()["data"]["results"]] == [201, 201]
+
+def test_batch_items_invalid_body(client):
+    resp = client.post("/items:batch", content=b"not json")
+    assert resp.status_code == 400
+    assert resp.json()["status"] == "error"
+
+def test_read_item_cached_and_invalidated(client):
+    client.post("/items/25", json={"name": "Cached"})
+    assert client.get("/items/25").json()["data"]["name"] == "Cached"
+    hits = client.get("/cache/stats").json()["data"]["hits"]
+    resp = client.get("/items/25")
+    assert resp.json() == {"status": "success", "message": "Item retrieved",
+                           "data": {"name": "Cached", "description": ""}}
+    assert client.get("/cache/stats").json()["data"]["hits"] == hits + 1
+
+    client.put("/items/25", json={"name": "Fresh"})
+    assert client.get("/items/25").json()["data"]["name"] == "Fresh"
+    client.post("/items:batch", json=[{"op": "delete", "item_id": 25}])
+    assert client.get("/items/25").status_code == 404
+
+def test_read_item_etag_and_not_modified(client):
+    client.post("/items/26", json={"name": "Tagged"})
+    etag = client.get("/items/26").headers["etag"]
+    resp = client.get("/items/26", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    client.put("/items/26", json={"name": "Retagged"})
+    assert client.get("/items/26", headers={"If-None-Match": etag}).status_code == 200
+
+def test_list_items_etag(client):
+    etag = client.get("/items").headers["etag"]
+    assert client.get("/items", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/items/27", json={"name": "Changes list"})
+    assert client.get("/items", headers={"If-None-Match": etag}).status_code == 200
+
+def test_update_item_if_match(client):
+    client.post("/items/28", json={"name": "V1"})
+    etag = client.get("/items/28").headers["etag"]
+    assert client.put("/items/28", json={"name": "V2"}, headers={"If-Match": etag}).status_code == 200
+    resp = client.put("/items/28", json={"name": "V3"}, headers={"If-Match": etag})
+    assert resp.status_code == 412
+    assert resp.json()["status"] == "error"
+    assert client.put("/items/9997", json={"name": "New"}, headers={"If-Match": "*"}).status_code == 412
+
+def test_metrics_endpoint(client):
+    client.get("/items/9997")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="404"}' in resp.text
+    assert "crud_store_records" in resp.text
+
+def test_list_items_description_filters_sort_and_fields(client):
+    client.post("/items/30", json={"name": "Beta", "description": "Sortable zq one"})
+    client.post("/items/31", json={"name": "alpha", "description": "sortable zq two"})
+    client.post("/items/32", json={"name": "Gamma", "description": "sortable zq"})
+    resp = client.get("/items", params={"description_prefix": "SORTABLE ZQ", "sort": "name", "fields": "name"})
+    assert resp.status_code == 200
+    assert list(resp.json()["data"].items()) == [("31", {"name": "alpha"}), ("30", {"name": "Beta"}),
+                                                 ("32", {"name": "Gamma"})]
+    resp = client.get("/items", params={"description": "sortable zq", "fields": "description"})
+    assert resp.json()["data"] == {"32": {"description": "sortable zq"}}
+    resp = client.get("/items", params={"description_prefix": "sortable zq", "sort": "-name", "limit": 2})
+    assert list(resp.json()["data"]) == ["32", "30"]
+    resp = client.get("/items", params={"description_prefix": "sortable zq", "sort": "-name", "limit": 2,
+                                        "cursor": resp.headers["X-Next-Cursor"]})
+    assert list(resp.json()["data"]) == ["31"]
+
+def test_list_items_invalid_sort_or_fields(client):
+    assert client.get("/items", params={"sort": "price"}).status_code == 400
+    assert client.get("/items", params={"fields": "name,price"}).status_code == 400
+
+def test_list_items_compressed(client):
+    client.post("/items:batch", json=[{"item_id": i, "item": {"name": f"Packed {i}", "description": "compress me"}}
+                                      for i in range(40, 90)])
+    resp = client.get("/items", params={"name": "packed"}, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["etag"].startswith('W/"g')
+    assert "accept-encoding" in resp.headers["vary"].lower()
+    assert len(resp.json()["data"]) == 50  # httpx decompresses
+    stream = client.get("/items", params={"name": "packed", "stream": "true"}, headers={"Accept-Encoding": "gzip"})
+    assert stream.headers["content-encoding"] == "gzip"
+    assert len(stream.text.splitlines()) == 50
+    small = client.get("/items/40", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+def test_oversized_body_rejected(client):
+    from fastapi_cruds.advanced import limits
+    resp = client.post("/items/100", content=b"x" * (limits.max_body_size + 1),
+                       headers={"content-type": "application/json"})
+    assert resp.status_code == 413
+
+def test_batch_items_streams_ndjson_results(client):
+    body = "\n".join(json.dumps({"item_id": i, "item": {"name": f"Nd{i}"}}) for i in (100, 101, 100))
+    resp = client.post("/items:batch", content=body,
+                       headers={"content-type": "application/x-ndjson", "accept": "application/x-ndjson"})
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [(r["index"], r["item_id"], r["status"]) for r in lines] == [(0, 100, 201), (1, 101, 201), (2, 100, 400)]
+
+async def test_batch_items_over_the_limit_reports_what_was_applied(monkeypatch):
+    import httpx
+    from fastapi_cruds.advanced import create_app
+    monkeypatch.setenv("CRUD_MAX_BATCH_BODY_SIZE", "3000")
+    monkeypatch.setenv("CRUD_BATCH_CHUNK_SIZE", "5")
+    async def body(count=200):  # streamed in chunks, without a Content-Length to reject it up front
+        for i in range(count):
+            yield json.dumps({"item_id": i, "item": {"name": f"Big{i}"}}).encode() + b"\n"
+    async def post(app, accept, count=200):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+            return await client.post("/items:batch", content=body(count),
+                                     headers={"content-type": "application/x-ndjson", "accept": accept})
+    app = create_app()
+    resp = await post(app, "application/json")
+    assert resp.status_code == 413
+    results = resp.json()["data"]["results"]
+    assert results and all(r["status"] == 201 for r in results)
+    assert len(app.state.repo) == len(results)
+    app = create_app()
+    resp = await post(app, "application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert lines[-1] == {"status": 413, "message": "Request body exceeds 3000 bytes"}
+    assert len(lines) > 1 and len(app.state.repo) == len(lines) - 1
+    app = create_app()
+    resp = await post(app, "application/x-ndjson", count=40)  # under the limit: every chunk reaches the route
+    assert [json.loads(line)["status"] for line in resp.text.splitlines()] == [201] * 40
+
+def test_rate_limited_request(client, monkeypatch):
+    from fastapi_cruds.advanced import limiter
+    monkeypatch.setattr(limiter, "check", lambda kind, client, route=None: 2.5 if kind == "write" else 0.0)
+    resp = client.put("/items/102", json={"name": "Limited"})
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "3"
+    assert resp.json()["status"] == "error"
+    assert client.get("/items/102").status_code == 404
+
+def test_item_changes_sse(client):
+    from fastapi_cruds.advanced import changes
+    since = changes.last_seq
+    client.post("/items/103", json={"name": "Feed"})
+    client.delete("/items/103")
+    resp = client.get("/items:changes", params={"since": since, "follow": "false"})
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in resp.text.split("\n\n") if block]
+    assert [json.loads(e.split("data: ", 1)[1])["op"] for e in events] == ["create", "delete"]
+    assert events[0].startswith(f"id: {since + 1}\n")
+
+def test_item_changes_websocket(client):
+    from fastapi_cruds.advanced import changes
+    since = changes.last_seq
+    client.post("/items/104", json={"name": "Socket"})
+    with client.websocket_connect(f"/items:changes?since={since}") as ws:
+        assert ws.receive_json() == {"seq": since + 1, "op": "create", "key": 104,
+                                     "record": {"name": "Socket", "description": ""}}
+        client.delete("/items/104")
+        assert ws.receive_json()["op"] == "delete"
+
+def test_retry_with_idempotency_key_replays_response(client, monkeypatch):
+    from fastapi_cruds.advanced import async_repo
+    headers = {"idempotency-key": "fastapi-create-105"}
+    first = client.post("/items/105", json={"name": "Retry"}, headers=headers)
+    assert first.status_code == 201
+
+    async def fail(*args, **kwargs):
+        pytest.fail("store accessed on replay")
+    monkeypatch.setattr(async_repo, "insert", fail)
+    retry = client.post("/items/105", json={"name": "Retry"}, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+
+def test_idempotency_key_reused_for_another_request(client):
+    headers = {"idempotency-key": "fastapi-put-106"}
+    assert client.put("/items/106", json={"name": "A"}, headers=headers).status_code == 201
+    resp = client.put("/items/106", json={"name": "B"}, headers=headers)
+    assert resp.status_code == 422
+    assert resp.json()["status"] == "error"
+    assert client.get("/items/106").json()["data"]["name"] == "A"
+    # Routes other than /items/{item_id} ignore the header
+    resp = client.post("/items:batch", json=[{"item_id": 106, "op": "delete"}], headers=headers)
+    assert resp.status_code == 200
+
+def test_patch_item_returns_changed_fields(client):
+    client.post("/items/107", json={"name": "Patch", "description": "Long description"})
+    etag = client.get("/items/107").headers["etag"]
+    resp = client.patch("/items/107", content=json.dumps({"name": "Patched", "description": "Long description"}),
+                        headers={"content-type": "application/merge-patch+json"})
+    assert resp.status_code == 200
+    assert resp.json()["data"] == {"name": "Patched"}
+    assert resp.headers["etag"] != etag
+    # null resets a field to its default
+    assert client.patch("/items/107", json={"description": None}).json()["data"] == {"description": ""}
+    assert client.get("/items/107").json()["data"] == {"name": "Patched", "description": ""}
+    assert client.patch("/items/107", json={"name": "Late"}, headers={"if-match": etag}).status_code == 412
+
+def test_patch_item_minimal_and_errors(client):
+    client.post("/items/108", json={"name": "Quiet"})
+    resp = client.patch("/items/108", json={"description": "Set"}, headers={"prefer": "return=minimal"})
+    assert resp.status_code == 204 and resp.content == b""
+    assert resp.headers["etag"] == client.get("/items/108").headers["etag"]
+    assert client.get("/items?description=set").json()["data"] == {"108": {"name": "Quiet", "description": "Set"}}
+    resp = client.patch("/items/108", json={"name": None})
+    assert resp.status_code == 400 and resp.json()["message"] == "name cannot be removed"
+    assert client.patch("/items/108", json={"size": 1}).status_code == 422
+    assert client.patch("/items/9996", json={"name": "Ghost"}).status_code == 404
+
+def test_patch_item_requires_a_merge_patch_media_type(client):
+    client.post("/items/109", json={"name": "Typed"})
+    resp = client.patch("/items/109", content=b'{"name": "X"}', headers={"content-type": "text/plain"})
+    assert resp.status_code == 415
+    assert resp.headers["accept-patch"] == "application/merge-patch+json"
+    resp = client.patch("/items/109", content=b'{"name": "X"', headers={"content-type": "application/merge-patch+json"})
+    assert resp.status_code == 422
+    assert client.get("/items/109").json()["data"]["name"] == "Typed"
+    body = client.get("/openapi.json").json()["paths"]["/items/{item_id}"]["patch"]["requestBody"]
+    assert "application/merge-patch+json" in body["content"]
@@ -1,3 +1,4 @@
+import json
 import pytest
 from fastapi.testclient import TestClient
 from fastapi_cruds.intermediate import app, fake_db
@@ -74,3 +75,20 @@ def test_list_items(client):
     data = resp.json()
     assert isinstance(data, dict)
     assert "1" in data and "2" in data
+
+# PAGINATION / STREAMING
+def test_list_items_paginated(client):
+    client.post("/items/3", json={"name": "Item3"})
+    resp = client.get("/items", params={"limit": 2})
+    assert list(resp.json()) == ["1", "2"]
+    assert resp.headers["X-Next-Cursor"] == "2"
+    resp2 = client.get("/items", params={"limit": 2, "cursor": 2})
+    assert list(resp2.json()) == ["3"]
+    assert "X-Next-Cursor" not in resp2.headers
+
+def test_list_items_stream_ndjson(client):
+    resp = client.get("/items", params={"stream": True})
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [line["item_id"] for line in lines] == [1, 2]
+    assert lines[0]["item"]["name"] == "Item1"
@@ -1,6 +1,9 @@
+import gzip
+import io
+import json
 import pytest
 from flask.testing import FlaskClient
-from flask_cruds.advanced import app, fake_db
+from flask_cruds.advanced import app, compressor, fake_db
 
 @pytest.fixture()
 def client() -> FlaskClient:
@@ -140,4 +143,374 @@ def test_full_crud_flow(client):
 
     # CONFIRM DELETED
     resp_get2 = client.get("/users/10")
-    assert resp_get2.status_code == 404
\ No newline at end of file
+    assert resp_get2.status_code == 404
+# PAGINATION / STREAMING
+def test_get_users_paginated(client):
+    client.post("/users", json={"user_id": "3", "name": "Alice", "email": "alice@example.com"})
+    resp = client.get("/users?limit=2")
+    assert resp.status_code == 200
+    assert [u["user_id"] for u in resp.get_json()] == ["1", "2"]
+    cursor = resp.headers["X-Next-Cursor"]
+    resp2 = client.get(f"/users?limit=2&cursor={cursor}")
+    assert [u["user_id"] for u in resp2.get_json()] == ["3"]
+    assert "X-Next-Cursor" not in resp2.headers
+
+def test_get_users_invalid_limit(client):
+    resp = client.get("/users?limit=0")
+    assert resp.status_code == 400
+
+def test_get_users_stream_ndjson(client):
+    resp = client.get("/users?stream=1")
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [u["user_id"] for u in lines] == ["1", "2"]
+
+# BATCH
+def test_batch_users_json_array(client):
+    resp = client.post("/users:batch", json=[
+        {"user_id": "3", "name": "Alice", "email": "alice@example.com"},
+        {"op": "update", "user_id": "1", "name": "Johnny", "email": "johnny@x.com"},
+        {"op": "delete", "user_id": "2"},
+        {"user_id": "1", "name": "Dup", "email": "dup@x.com"},
+        {"op": "delete", "user_id": "999"},
+        {"user_id": "4", "name": "No email"},
+    ])
+    assert resp.status_code == 200
+    results = resp.get_json()["results"]
+    assert [r["status"] for r in results] == [201, 200, 200, 400, 404, 400]
+    assert results[5]["message"] == "Missing field: email"
+    assert fake_db["3"]["name"] == "Alice"
+    assert fake_db["1"]["name"] == "Johnny"
+    assert "2" not in fake_db and "4" not in fake_db
+
+def test_batch_users_ndjson(client):
+    body = "\n".join(json.dumps({"user_id": str(i), "name": f"U{i}", "email": f"u{i}@x.com"}) for i in range(10, 13))
+    resp = client.post("/users:batch", data=body, content_type="application/x-ndjson")
+    assert resp.status_code == 200
+    assert [r["status"] for r in resp.get_json()["results"]] == [201, 201, 201]
+    assert {"10", "11", "12"} <= set(fake_db)
+
+def test_batch_users_rejects_non_list(client):
+    resp = client.post("/users:batch", json={"user_id": "3"})
+    assert resp.status_code == 400
+
+# RESPONSE CACHE
+def test_get_user_cached_and_invalidated(client):
+    assert client.get("/users/1").get_json()["name"] == "John Doe"
+    hits = client.get("/cache/stats").get_json()["hits"]
+    assert client.get("/users/1").get_json()["name"] == "John Doe"
+    assert client.get("/cache/stats").get_json()["hits"] == hits + 1
+
+    client.put("/users/1", json={"name": "Changed", "email": "c@c.com"})
+    assert client.get("/users/1").get_json()["name"] == "Changed"
+    client.delete("/users/1")
+    assert client.get("/users/1").status_code == 404
+
+# ETAGS
+def test_get_user_etag_and_not_modified(client):
+    resp = client.get("/users/1")
+    etag = resp.headers["ETag"]
+    resp2 = client.get("/users/1", headers={"If-None-Match": etag})
+    assert resp2.status_code == 304
+    assert resp2.get_data() == b""
+
+    client.put("/users/1", json={"name": "Changed", "email": "c@c.com"})
+    resp3 = client.get("/users/1", headers={"If-None-Match": etag})
+    assert resp3.status_code == 200
+    assert resp3.headers["ETag"] != etag
+
+def test_get_users_etag_changes_on_write(client):
+    etag = client.get("/users").headers["ETag"]
+    assert client.get("/users", headers={"If-None-Match": etag}).status_code == 304
+    client.delete("/users/2")
+    assert client.get("/users", headers={"If-None-Match": etag}).status_code == 200
+
+def test_update_user_if_match(client):
+    etag = client.get("/users/1").headers["ETag"]
+    resp = client.put("/users/1", json={"name": "First", "email": "f@f.com"}, headers={"If-Match": etag})
+    assert resp.status_code == 200
+    resp2 = client.put("/users/1", json={"name": "Second", "email": "s@s.com"}, headers={"If-Match": etag})
+    assert resp2.status_code == 412
+    assert resp2.get_json()["error"] == "Precondition Failed"
+    assert fake_db["1"]["name"] == "First"
+
+# METRICS
+def test_metrics_endpoint(client):
+    client.get("/users/1")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/users/<user_id>",status="200"}' in text
+    assert "crud_store_records 2" in text
+    assert "crud_user_cache_misses_total" in text
+
+# EMAIL INDEX
+def test_get_user_by_email(client):
+    resp = client.get("/users?email=%20JANE@x.com")
+    assert resp.status_code == 200
+    assert [u["user_id"] for u in resp.get_json()] == ["2"]
+    assert client.get("/users?email=nobody@x.com").get_json() == []
+
+def test_get_user_by_email_uses_the_unique_index(client, monkeypatch):
+    from flask_cruds.advanced import repo
+    monkeypatch.setattr(repo, "keys", lambda *args, **kwargs: pytest.fail("listing scanned for ?email="))
+    assert [u["user_id"] for u in client.get("/users?email=j@J.com&fields=user_id").get_json()] == ["1"]
+
+def test_email_must_be_unique(client):
+    resp = client.post("/users", json={"user_id": "3", "name": "Copy", "email": "J@J.COM"})
+    assert resp.status_code == 409
+    assert resp.get_json()["error"] == "Conflict"
+    assert "3" not in fake_db
+    assert client.put("/users/2", json={"name": "Jane", "email": "j@j.com"}).status_code == 409
+    assert fake_db["2"]["email"] == "jane@x.com"
+
+def test_email_index_follows_updates_and_deletes(client):
+    client.put("/users/1", json={"name": "John", "email": "john@new.com"})
+    assert client.get("/users?email=j@j.com").get_json() == []
+    assert client.post("/users", json={"user_id": "3", "name": "New J", "email": "j@j.com"}).status_code == 201
+    client.delete("/users/3")
+    assert client.get("/users?email=j@j.com").get_json() == []
+
+def test_batch_reports_email_conflict(client):
+    resp = client.post("/users:batch", json=[{"user_id": "5", "name": "Dup", "email": "jane@x.com"}])
+    assert resp.get_json()["results"][0]["status"] == 409
+
+# SORT, FIELDS AND FILTERS
+def test_get_users_sorted_with_fields(client):
+    client.post("/users", json={"user_id": "3", "name": "alice", "email": "alice@example.com"})
+    resp = client.get("/users?sort=-name&fields=user_id,name")
+    assert resp.status_code == 200
+    assert resp.get_json() == [{"user_id": "1", "name": "John Doe"}, {"user_id": "2", "name": "Jane Smith"},
+                               {"user_id": "3", "name": "alice"}]
+    resp = client.get("/users?sort=name&limit=2")
+    assert [u["user_id"] for u in resp.get_json()] == ["3", "2"]
+    resp = client.get(f"/users?sort=name&limit=2&cursor={resp.headers['X-Next-Cursor']}")
+    assert [u["user_id"] for u in resp.get_json()] == ["1"]
+
+def test_get_users_email_prefix(client):
+    client.post("/users", json={"user_id": "3", "name": "Jo", "email": "jo@z.com"})
+    resp = client.get("/users?email_prefix=J&fields=email")
+    assert resp.get_json() == [{"email": "j@j.com"}, {"email": "jane@x.com"}, {"email": "jo@z.com"}]
+    client.put("/users/3", json={"name": "Jo", "email": "other@z.com"})
+    assert len(client.get("/users?email_prefix=jo").get_json()) == 0
+
+def test_get_users_invalid_sort_or_fields(client):
+    assert client.get("/users?sort=password").status_code == 400
+    resp = client.get("/users?fields=name,password")
+    assert resp.status_code == 400
+    assert "password" in resp.get_json()["message"]
+
+# COMPRESSION
+def test_get_users_gzip_above_threshold(client):
+    client.post("/users:batch", json=[{"user_id": str(i), "name": f"User {i}", "email": f"u{i}@x.com"}
+                                      for i in range(10, 60)])
+    resp = client.get("/users", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert resp.headers["ETag"].startswith('W/"g')
+    assert len(json.loads(gzip.decompress(resp.data))) == 52
+    # Same snapshot: served from the compressed cache, and still revalidates
+    hits = compressor.cache.hits
+    assert client.get("/users", headers={"Accept-Encoding": "gzip"}).data == resp.data
+    assert compressor.cache.hits == hits + 1
+    assert client.get("/users", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+def test_small_or_unaccepted_responses_not_compressed(client):
+    assert "Content-Encoding" not in client.get("/users/1", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/users").headers
+
+# VALIDATION
+def test_create_user_rejects_unknown_and_oversized_fields(client):
+    resp = client.post("/users", json={"user_id": "3", "name": "A", "email": "a@a.com", "is_admin": True})
+    assert resp.status_code == 400
+    assert resp.get_json()["message"] == "Unknown field: is_admin"
+    resp = client.post("/users", json={"user_id": "3", "name": "A" * 201, "email": "a@a.com"})
+    assert resp.get_json()["message"] == "name must be at most 200 characters"
+    resp = client.post("/users", json={"user_id": "3", "name": ["A"], "email": "a@a.com"})
+    assert resp.get_json()["message"] == "name must be a string"
+    assert "3" not in fake_db
+
+def test_create_user_strips_and_coerces(client):
+    resp = client.post("/users", json={"user_id": 3, "name": "  Ann  ", "email": " ann@x.com "})
+    assert resp.status_code == 201
+    assert fake_db["3"] == {"user_id": "3", "name": "Ann", "email": "ann@x.com"}
+
+def test_update_user_only_stores_schema_fields(client):
+    resp = client.put("/users/1", json={"name": "J", "email": "j@j.com", "role": "admin"})
+    assert resp.status_code == 400
+    resp = client.put("/users/1", json={"user_id": "2", "name": "J", "email": "j@j.com"})
+    assert resp.get_json()["message"] == "user_id does not match the URL"
+    resp = client.put("/users/1", json={"user_id": "1", "name": "J", "email": "j@j.com"})
+    assert resp.status_code == 200
+    assert set(fake_db["1"]) == {"user_id", "name", "email"}
+
+def test_batch_rejects_unknown_fields(client):
+    resp = client.post("/users:batch", json=[{"user_id": "7", "name": "A", "email": "a@x.com", "extra": 1},
+                                             {"op": "upsert", "user_id": "8"}])
+    assert [r["message"] for r in resp.get_json()["results"]] == ["Unknown field: extra", "Unknown op: upsert"]
+
+def test_batch_rejects_non_string_op(client):
+    resp = client.post("/users:batch", json=[{"op": {"a": 1}, "user_id": "9"}, {"op": [], "user_id": "9"},
+                                             {"op": 1, "user_id": "9"}])
+    assert resp.status_code == 200
+    assert [r["status"] for r in resp.get_json()["results"]] == [400, 400, 400]
+    assert resp.get_json()["results"][0]["message"] == "Unknown op: {'a': 1}"
+
+# BODY LIMITS
+def test_oversized_body_rejected(client):
+    resp = client.post("/users", data=b"x" * (app.config["MAX_CONTENT_LENGTH"] + 1), content_type="application/json")
+    assert resp.status_code == 413
+    assert resp.get_json()["error"] == "Payload Too Large"
+
+def test_batch_streams_ndjson_results(client):
+    body = "\n".join(json.dumps({"user_id": str(i), "name": f"U{i}", "email": f"s{i}@x.com"}) for i in range(20, 23))
+    resp = client.post("/users:batch", data=body + '\n{"user_id": "1", "name": "Dup", "email": "d@x.com"}',
+                       content_type="application/x-ndjson", headers={"Accept": "application/x-ndjson"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [(r["index"], r["status"]) for r in lines] == [(0, 201), (1, 201), (2, 201), (3, 400)]
+
+def test_batch_truncated_body_reports_error(client):
+    resp = client.post("/users:batch", data=b'[{"user_id": "9", "name": "A", "email": "a@x.com"}, {"user_id"',
+                       content_type="application/json")
+    assert resp.status_code == 400
+    assert resp.get_json()["message"] == "Invalid JSON in batch body"
+    assert "9" not in fake_db  # the unfinished chunk is not applied
+
+def test_batch_over_the_limit_reports_what_was_applied(monkeypatch):
+    from flask_cruds.advanced import create_app
+    monkeypatch.setenv("CRUD_MAX_BATCH_BODY_SIZE", "3000")
+    monkeypatch.setenv("CRUD_BATCH_CHUNK_SIZE", "5")
+
+    class Chunked(io.RawIOBase):  # a chunked body as a server hands it over: one line per read
+        def __init__(self):
+            self.lines = [json.dumps({"user_id": str(i), "name": f"U{i}", "email": f"big{i}@x.com"}).encode()
+                          + b"\n" for i in range(100, 200)]
+
+        def readable(self):
+            return True
+
+        def readinto(self, buffer):
+            line = self.lines.pop(0) if self.lines else b""
+            buffer[:len(line)] = line
+            return len(line)
+
+    def post(app, accept):
+        return app.test_client().post("/users:batch", content_type="application/x-ndjson",
+                                      headers={"Transfer-Encoding": "chunked", "Accept": accept},
+                                      environ_overrides={"wsgi.input": Chunked(), "wsgi.input_terminated": True})
+    big = create_app()
+    resp = post(big, "application/json")
+    assert resp.status_code == 413
+    results = resp.get_json()["results"]
+    assert results and all(r["status"] == 201 for r in results)
+    assert len(big.extensions["cruds"]["repo"]) == 2 + len(results)
+    big = create_app()
+    resp = post(big, "application/x-ndjson")
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert lines[-1] == {"status": 413, "message": "Request body exceeds 3000 bytes"}
+    assert len(lines) > 1 and len(big.extensions["cruds"]["repo"]) == 2 + len(lines) - 1
+
+# RATE LIMITS
+def test_rate_limited_request(client, monkeypatch):
+    from flask_cruds.advanced import limiter
+    monkeypatch.setattr(limiter, "check", lambda kind, client, route=None: 2.5 if kind == "write" else 0.0)
+    resp = client.put("/users/1", json={"name": "J", "email": "j@j.com"})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "3"
+    assert resp.get_json()["error"] == "Too Many Requests"
+    assert client.get("/users/1").status_code == 200
+
+def test_shed_when_no_slot_is_free(client, monkeypatch):
+    from flask_cruds.advanced import admission
+    monkeypatch.setattr(admission["read"], "acquire", lambda: False)
+    resp = client.get("/users")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert client.get("/metrics").status_code == 200  # never limited
+
+# CHANGE FEED
+def test_changes_stream_since_sequence(client):
+    from flask_cruds.advanced import changes
+    since = changes.last_seq
+    client.post("/users", json={"user_id": "30", "name": "Feed", "email": "feed@x.com"})
+    client.delete("/users/30")
+    resp = client.get(f"/users:changes?since={since}&follow=0")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/event-stream"
+    events = [block for block in resp.get_data(as_text=True).split("\n\n") if block]
+    assert len(events) == 2
+    assert events[0].startswith(f"id: {since + 1}\nevent: change\ndata: ")
+    created = json.loads(events[0].split("data: ", 1)[1])
+    assert (created["op"], created["key"], created["record"]["email"]) == ("create", "30", "feed@x.com")
+    assert '"op":"delete"' in events[1]
+
+def test_changes_resume_from_last_event_id(client):
+    from flask_cruds.advanced import changes
+    client.put("/users/1", json={"name": "Resumed", "email": "j@j.com"})
+    resp = client.get("/users:changes?follow=0", headers={"Last-Event-ID": str(changes.last_seq - 1)})
+    assert resp.get_data(as_text=True).startswith(f"id: {changes.last_seq}\n")
+    assert client.get("/users:changes?since=abc").status_code == 400
+
+# IDEMPOTENCY KEYS
+def test_retry_with_idempotency_key_replays_response(client, monkeypatch):
+    from flask_cruds.advanced import repo
+    headers = {"Idempotency-Key": "flask-create-31"}
+    user = {"user_id": "31", "name": "Retry", "email": "retry@x.com"}
+    first = client.post("/users", json=user, headers=headers)
+    assert first.status_code == 201
+    monkeypatch.setattr(repo, "insert", lambda *args, **kwargs: pytest.fail("store accessed on replay"))
+    retry = client.post("/users", json=user, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.get_json() == first.get_json()
+    # Without a key the duplicate runs, and fails as before
+    monkeypatch.undo()
+    assert client.post("/users", json=user).status_code == 400
+
+def test_idempotency_key_reused_for_another_request(client):
+    headers = {"Idempotency-Key": "flask-update-1"}
+    assert client.put("/users/1", json={"name": "A", "email": "j@j.com"}, headers=headers).status_code == 200
+    resp = client.put("/users/1", json={"name": "B", "email": "j@j.com"}, headers=headers)
+    assert resp.status_code == 422
+    assert resp.get_json()["error"] == "Unprocessable Entity"
+    assert fake_db["1"]["name"] == "A"
+    assert client.post("/users", json={"user_id": "1"}, headers={"Idempotency-Key": "x" * 256}).status_code == 400
+
+# MERGE PATCH
+def test_patch_user_returns_changed_fields(client):
+    etag = client.get("/users/1").headers["ETag"]
+    resp = client.patch("/users/1", data=json.dumps({"name": " Johnny ", "email": "j@j.com"}),
+                        content_type="application/merge-patch+json")
+    assert resp.status_code == 200
+    assert resp.get_json() == {"message": "User updated", "changed": {"name": "Johnny"}}
+    assert resp.headers["ETag"] != etag
+    assert client.get("/users/1").get_json() == {"user_id": "1", "name": "Johnny", "email": "j@j.com"}
+    # The old ETag no longer matches
+    resp = client.patch("/users/1", json={"name": "Late"}, headers={"If-Match": etag})
+    assert resp.status_code == 412
+
+def test_patch_user_minimal_and_index_updates(client):
+    resp = client.patch("/users/2", json={"email": "jane@new.com"}, headers={"Prefer": "return=minimal"})
+    assert resp.status_code == 204 and resp.data == b""
+    assert resp.headers["Preference-Applied"] == "return=minimal"
+    assert resp.headers["ETag"] == client.get("/users/2").headers["ETag"]
+    assert client.get("/users?email=jane@new.com").get_json()[0]["user_id"] == "2"
+    assert client.get("/users?email=jane@x.com").get_json() == []
+
+def test_patch_user_errors(client):
+    assert client.patch("/users/9", json={"name": "Ghost"}).status_code == 404
+    assert client.patch("/users/2", json={"email": "J@J.com"}).status_code == 409
+    for patch, message in [({"email": None}, "email cannot be removed"),
+                           ({"role": "admin"}, "Unknown field: role"),
+                           ({"user_id": "3"}, "user_id does not match the URL"),
+                           ([1], "Expected a JSON object")]:
+        resp = client.patch("/users/1", json=patch)
+        assert resp.status_code == 400 and resp.get_json()["message"] == message
+    assert fake_db["1"]["email"] == "j@j.com"
+
+def test_patch_user_requires_a_merge_patch_media_type(client):
+    resp = client.patch("/users/1", data='{"name": "X"}', content_type="text/plain")
+    assert resp.status_code == 415
+    assert resp.headers["Accept-Patch"] == "application/merge-patch+json"
+    assert fake_db["1"]["name"] == "John Doe"
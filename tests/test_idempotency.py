@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+
+from cruds_common.idempotency import (BUSY, MISMATCH, REPLAY, RUN, IdempotencyCache, StoredResponse,
+                                      request_fingerprint)
+
+FP = request_fingerprint("POST", "/users?", b'{"user_id": "1"}')
+OK = StoredResponse(201, [("Content-Type", "application/json")], b"{}")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def test_first_request_runs_then_retries_replay():
+    cache = IdempotencyCache()
+    assert cache.begin("k", FP) == (RUN, None)
+    cache.finish("k", OK)
+    assert cache.begin("k", FP) == (REPLAY, OK)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_key_reused_for_another_request():
+    cache = IdempotencyCache()
+    cache.begin("k", FP)
+    cache.finish("k", OK)
+    other = request_fingerprint("POST", "/users?", b'{"user_id": "2"}')
+    assert cache.begin("k", other) == (MISMATCH, None)
+    assert request_fingerprint("PUT", "/users?", b'{"user_id": "1"}') != FP
+
+def test_entries_expire_and_are_bounded():
+    clock = FakeClock()
+    cache = IdempotencyCache(maxsize=2, ttl=60, clock=clock)
+    cache.begin("running", FP)
+    for key in ("a", "b"):
+        cache.begin(key, FP)
+        cache.finish(key, OK)
+    # Over maxsize: the oldest stored response goes, the running request stays
+    assert len(cache) == 2 and cache.evictions == 1
+    assert cache.begin("a", FP) == (RUN, None)
+    clock.now += 61
+    assert cache.begin("b", FP) == (RUN, None)
+
+def test_abandoned_key_runs_again():
+    cache = IdempotencyCache()
+    cache.begin("k", FP)
+    cache.abandon("k")
+    assert cache.begin("k", FP) == (RUN, None)
+
+def test_concurrent_duplicates_wait_for_the_first():
+    cache = IdempotencyCache(wait_timeout=5)
+    assert cache.begin("k", FP) == (RUN, None)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.begin("k", FP))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    assert results == []  # all waiting, none running
+    cache.finish("k", OK)
+    for thread in threads:
+        thread.join()
+    assert results == [(REPLAY, OK)] * 4
+
+def test_duplicate_gives_up_after_wait_timeout():
+    cache = IdempotencyCache(wait_timeout=0.01)
+    cache.begin("k", FP)
+    assert cache.begin("k", FP) == (BUSY, None)
+
+async def test_async_duplicates_wait_for_the_first():
+    cache = IdempotencyCache(wait_timeout=5)
+    assert await cache.begin_async("k", FP) == (RUN, None)
+    waiters = [asyncio.ensure_future(cache.begin_async("k", FP)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert not any(w.done() for w in waiters)
+    # Released from another thread, as a sync route would: exactly one duplicate takes over
+    threading.Thread(target=cache.abandon, args=("k",)).start()
+    done, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    await asyncio.sleep(0.01)
+    assert [w.result() for w in done] == [(RUN, None)] and len(pending) == 2
+    cache.finish("k", OK)
+    assert await asyncio.gather(*pending) == [(REPLAY, OK)] * 2
@@ -0,0 +1,73 @@
+import pytest
+from cruds_common.indexes import SortedFieldIndex, TrigramIndex, prefix_end
+from cruds_common.store import IndexedStore
+
+@pytest.fixture
+def store():
+    db = IndexedStore({1: {"name": "SpecialItem"}, 2: {"name": "OtherItem"}})
+    return db, db.add_index(TrigramIndex("name"))
+
+# TRIGRAM SEARCH
+def test_search_is_case_insensitive_substring(store):
+    store, index = store
+    assert index.search("special") == {1}
+    assert index.search("ITEM") == {1, 2}
+    assert index.search("missing") == set()
+
+def test_search_short_query_falls_back_to_scan(store):
+    store, index = store
+    assert index.search("sp") == {1}
+    assert index.search("") == {1, 2}
+
+def test_search_rejects_out_of_order_trigrams():
+    db = IndexedStore()
+    index = db.add_index(TrigramIndex("name"))
+    db[1] = {"name": "abcxbcd"}
+    # "abcd" trigrams (abc, bcd) both exist but not as one substring
+    assert index.search("abcd") == set()
+
+# INDEX MAINTENANCE
+def test_index_follows_updates_and_deletes(store):
+    store, index = store
+    store[1] = {"name": "Renamed"}
+    assert index.search("special") == set()
+    assert index.search("renamed") == {1}
+    del store[2]
+    assert index.search("other") == set()
+    store.pop(1)
+    assert index.search("item") == set()
+
+def test_index_follows_bulk_writes(store):
+    store, index = store
+    store.update({3: {"name": "Third"}})
+    assert index.search("third") == {3}
+    store.clear()
+    assert index.search("item") == set()
+    assert index._postings == {}
+
+# SORTED FIELD INDEX
+def test_sorted_index_matches_exact_and_prefix():
+    db = IndexedStore({1: {"email": "Bob@x.com"}, 2: {"email": "alice@x.com"}, 3: {"email": "bob@y.com"}})
+    index = db.add_index(SortedFieldIndex("email"))
+    assert index.match("eq", " BOB@X.COM") == [1]
+    assert index.match("prefix", "bob@") == [1, 3]
+    assert index.match("prefix", "") == [2, 1, 3]
+    db[3] = {"email": "carol@y.com"}
+    del db[1]
+    assert index.match("prefix", "b") == []
+    assert index.entries == [("alice@x.com", 2), ("carol@y.com", 3)]
+
+def test_sorted_index_pages_in_both_directions():
+    db = IndexedStore()
+    index = db.add_index(SortedFieldIndex("name"))
+    db.update({k: {"name": name} for k, name in enumerate("dacb")})
+    assert index.page(limit=3) == ([1, 3, 2], 2)
+    assert index.page(limit=3, cursor=2) == ([0], None)
+    assert index.page(limit=2, descending=True) == ([0, 2], 2)
+    assert index.page(cursor=2, descending=True) == ([3, 1], None)
+    with pytest.raises(ValueError):
+        index.page(cursor=9)
+
+def test_prefix_end():
+    assert prefix_end("ab") == "ac"
+    assert prefix_end("") is None
@@ -0,0 +1,81 @@
+import io
+import json
+import logging
+import queue
+import threading
+import time
+
+from cruds_common.logs import (BatchingQueueListener, BatchStreamHandler, JSONFormatter,
+                               NonBlockingQueueHandler, SamplingFilter, setup_logging)
+
+def make_record(msg, *args, level=logging.INFO, **extra):
+    record = logging.LogRecord("test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_extra_fields():
+    line = JSONFormatter().format(make_record("Item %s created", 7, event="item.created", item_id=7))
+    entry = json.loads(line)
+    assert entry["message"] == "Item 7 created"
+    assert (entry["level"], entry["event"], entry["item_id"]) == ("INFO", "item.created", 7)
+
+def test_sampling_keeps_one_in_n_but_never_drops_warnings():
+    sampler = SamplingFilter({"item.read": 10})
+    kept = sum(sampler.filter(make_record("read", event="item.read")) for _ in range(100))
+    assert kept == 10
+    assert all(sampler.filter(make_record("bad", level=logging.ERROR, event="item.read")) for _ in range(5))
+    assert sampler.filter(make_record("other", event="item.created"))
+
+def test_queue_handler_drops_when_full_and_does_not_format():
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    records = [make_record("n=%d", i) for i in range(3)]
+    for record in records:
+        handler.handle(record)
+    assert handler.dropped == 1
+    assert handler.queue.get_nowait().msg == "n=%d"  # formatting is left to the listener
+
+def test_listener_writes_batches():
+    log_queue = queue.Queue()
+    stream = io.StringIO()
+    writes = []
+    stream.write = lambda s, write=stream.write: (writes.append(s), write(s))[1]
+    target = BatchStreamHandler(stream)
+    target.setFormatter(JSONFormatter())
+    listener = BatchingQueueListener(log_queue, target, batch_size=50)
+    for i in range(120):
+        log_queue.put(make_record("n=%d", i))
+    listener.start()
+    listener.stop()
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line)["message"] for line in lines] == [f"n={i}" for i in range(120)]
+    assert len(writes) == 3
+
+def test_slow_sink_does_not_block_logger():
+    class SlowStream(io.StringIO):
+        def write(self, s):
+            time.sleep(0.2)
+            return super().write(s)
+
+    stream = SlowStream()
+    logger = logging.getLogger("test_logs.slow")
+    listener = setup_logging(logger, stream=stream)
+    start = time.perf_counter()
+    for i in range(200):
+        logger.info("Item %s created", i)
+    assert time.perf_counter() - start < 0.2
+    listener.stop()
+    assert len(stream.getvalue().splitlines()) == 200
+
+def test_setup_again_replaces_the_pipeline():
+    first_stream, second_stream = io.StringIO(), io.StringIO()
+    logger = logging.getLogger("test_logs.again")
+    first = setup_logging(logger, stream=first_stream)
+    logger.info("one")
+    threads = threading.active_count()
+    second = setup_logging(logger, stream=second_stream)
+    logger.info("two")
+    second.stop()
+    assert first._thread is None and threading.active_count() <= threads
+    assert len(logger.handlers) == 1
+    assert [json.loads(line)["message"] for line in first_stream.getvalue().splitlines()] == ["one"]
+    assert [json.loads(line)["message"] for line in second_stream.getvalue().splitlines()] == ["two"]
@@ -0,0 +1,48 @@
+import threading
+
+from cruds_common.metrics import Metrics
+
+def test_observe_and_render():
+    metrics = Metrics(buckets=(0.01, 0.1))
+    metrics.observe("GET", "/items/{item_id}", 200, 0.005, 0, 120)
+    metrics.observe("GET", "/items/{item_id}", 404, 0.05, 0, 40)
+    metrics.observe("GET", "/items/{item_id}", 500, 1.0)
+    text = metrics.render()
+    labels = 'method="GET",route="/items/{item_id}"'
+    assert f'http_requests_total{{{labels},status="404"}} 1' in text
+    assert f"http_request_errors_total{{{labels}}} 1" in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.01"}} 1' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.1"}} 2' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f"http_response_size_bytes_sum{{{labels}}} 160" in text
+
+def test_shards_from_many_threads_are_summed():
+    metrics = Metrics()
+
+    def worker():
+        for _ in range(1000):
+            metrics.observe("POST", "/users", 201, 0.001, 50, 80)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    series = metrics.snapshot()[("POST", "/users")]
+    assert series.statuses == {201: 8000}
+    assert series.bytes_in == 8000 * 50
+
+def test_shards_of_ended_threads_are_retired():
+    metrics = Metrics()
+    threads = [threading.Thread(target=metrics.observe, args=("GET", "/users", 200, 0.001)) for _ in range(500)]
+    for t in threads:
+        t.start()
+        t.join()
+    assert metrics._shards == []
+    assert metrics.snapshot()[("GET", "/users")].statuses == {200: 500}
+
+def test_registered_collectors():
+    metrics = Metrics()
+    store = {1: "a", 2: "b"}
+    metrics.register("crud_store_records", "Records.", lambda: len(store))
+    assert "# TYPE crud_store_records gauge\ncrud_store_records 2\n" in metrics.render()
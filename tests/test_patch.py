@@ -0,0 +1,48 @@
+import pytest
+
+from cruds_common.indexes import SortedFieldIndex
+from cruds_common.patch import merge_patch, patch_record, prefers_minimal
+from cruds_common.repository import DictRepository
+from cruds_common.store import IndexedStore
+
+# Examples from RFC 7396, appendix A
+@pytest.mark.parametrize("target, patch, result", [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+    ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+    ([1, 2], {"a": "b", "c": None}, {"a": "b"}),
+    ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+])
+def test_merge_patch(target, patch, result):
+    assert merge_patch(target, patch) == result
+
+def test_patch_record_reports_changed_fields():
+    record = {"name": "A", "description": "d", "count": 1}
+    assert patch_record(record, {"name": "A", "count": True}) == (
+        {"name": "A", "description": "d", "count": True}, {"count": True})
+    assert patch_record(record, {"description": None, "other": None}) == ({"name": "A", "count": 1},
+                                                                           {"description": None})
+    unchanged, changed = patch_record(record, {"name": "A"})
+    assert unchanged is record and changed == {}
+
+def test_patch_notifies_only_indexes_of_changed_fields():
+    class Counting(SortedFieldIndex):
+        calls = 0
+        def on_set(self, key, old, record):
+            self.calls += 1
+            super().on_set(key, old, record)
+
+    store = IndexedStore({1: {"name": "A", "description": "d"}})
+    repo = DictRepository(store)
+    name, description = store.add_index(Counting("name")), store.add_index(Counting("description"))
+    repo.patch(1, {"description": "e"})
+    assert (name.calls, description.calls) == (0, 1)
+    assert description.match("eq", "e") == [1] and name.match("eq", "a") == [1]
+
+def test_prefers_minimal():
+    assert prefers_minimal("return=minimal")
+    assert prefers_minimal("respond-async, RETURN=minimal; wait=10")
+    assert not prefers_minimal("return=representation") and not prefers_minimal(None)
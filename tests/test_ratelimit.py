@@ -0,0 +1,150 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from flask import Flask
+
+from cruds_common.ratelimit import (AdmissionGate, AsyncAdmissionGate, Budget, RateLimiter, TokenBuckets,
+                                    request_kind, retry_after)
+from fastapi_cruds.ratelimit import RateLimitMiddleware
+from flask_cruds.ratelimit import init_rate_limits
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+# TOKEN BUCKETS
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    buckets = TokenBuckets(rate=2, burst=3, clock=clock)
+    assert [buckets.take("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("a") == pytest.approx(0.5)
+    assert buckets.take("b") == 0.0  # one bucket per key
+    clock.now += 0.5
+    assert buckets.take("a") == 0.0
+    assert buckets.take("a") > 0
+    clock.now += 60
+    assert [buckets.take("a") for _ in range(4)][-1] > 0  # refills up to the burst only
+
+def test_buckets_are_bounded():
+    clock = FakeClock()
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=3, clock=clock)
+    for key in "abc":
+        buckets.take(key)
+    buckets.take("d")
+    assert len(buckets) == 3
+    clock.now += 10  # all full again: dropped together
+    buckets.take("e")
+    assert len(buckets) == 1
+
+def test_reads_and_writes_have_separate_budgets():
+    clock = FakeClock()
+    limiter = RateLimiter(read=Budget(rate=100), write=Budget(rate=1, burst=2), clock=clock)
+    assert limiter.check("write", "c1") == 0.0
+    assert limiter.check("write", "c1") == 0.0
+    assert limiter.check("write", "c1") == pytest.approx(1.0)
+    assert limiter.check("write", "c2") == 0.0
+    assert all(limiter.check("read", "c1") == 0.0 for _ in range(100))
+    assert not limiter.checks_routes
+
+def test_route_budget_is_shared_by_clients():
+    limiter = RateLimiter(write=Budget(route_rate=1, route_burst=1), clock=FakeClock())
+    assert limiter.checks_routes
+    assert limiter.check("write", "c1", "PUT /items/{item_id}") == 0.0
+    assert limiter.check("write", "c2", "PUT /items/{item_id}") > 0
+    assert limiter.check("write", "c2", "POST /items/{item_id}") == 0.0
+
+def test_request_kind_and_retry_after():
+    assert [request_kind(m) for m in ("GET", "HEAD", "PUT", "POST", "DELETE")] == \
+        ["read", "read", "write", "write", "write"]
+    assert [retry_after(s) for s in (0.01, 1.0, 2.2)] == ["1", "1", "3"]
+
+def test_budget_from_env(monkeypatch):
+    monkeypatch.setenv("CRUD_WRITE_RATE", "5")
+    monkeypatch.setenv("CRUD_WRITE_MAX_QUEUE", "7")
+    budget = Budget.from_env("write", max_in_flight=16, max_queue=64)
+    assert (budget.rate, budget.max_in_flight, budget.max_queue) == (5.0, 16, 7)
+
+# ADMISSION GATES
+def test_gate_queues_then_sheds():
+    gate = AdmissionGate(limit=1, queue=1, timeout=5)
+    assert gate.acquire()
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(gate.acquire()))
+    waiter.start()
+    while gate.waiting == 0:
+        time.sleep(0.001)
+    assert not gate.acquire()  # queue full
+    gate.release()
+    waiter.join()
+    assert admitted == [True] and gate.in_flight == 1
+
+def test_gate_times_out():
+    gate = AdmissionGate(limit=1, queue=1, timeout=0.01)
+    gate.acquire()
+    assert not gate.acquire()
+    assert gate.in_flight == 1 and gate.waiting == 0
+
+async def test_async_gate_hands_over_slots():
+    gate = AsyncAdmissionGate(limit=1, queue=1, timeout=5)
+    assert await gate.acquire()
+    queued = asyncio.ensure_future(gate.acquire())
+    await asyncio.sleep(0)
+    assert gate.waiting == 1
+    assert not await gate.acquire()
+    gate.release()
+    assert await queued
+    assert gate.in_flight == 1 and gate.waiting == 0
+
+async def test_async_gate_times_out():
+    gate = AsyncAdmissionGate(limit=1, queue=1, timeout=0.01)
+    await gate.acquire()
+    assert not await gate.acquire()
+    assert gate.waiting == 0
+    gate.release()
+    assert gate.in_flight == 0
+
+# FRAMEWORK GLUE
+def test_flask_rate_limited():
+    app = Flask(__name__)
+    init_rate_limits(app, RateLimiter(write=Budget(rate=0.5, burst=1)))
+    app.add_url_rule("/things", "things", lambda: "ok", methods=["GET", "POST"])
+    client = app.test_client()
+    assert client.post("/things").status_code == 200
+    resp = client.post("/things")
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "2"
+    assert client.get("/things").status_code == 200
+
+def test_flask_gate_released_after_request():
+    app = Flask(__name__)
+    gates = init_rate_limits(app, RateLimiter(read=Budget(max_in_flight=1)))
+    seen = []
+    app.add_url_rule("/things", "things", lambda: seen.append(gates["read"].in_flight) or "ok")
+    client = app.test_client()
+    assert client.get("/things").status_code == 200
+    assert seen == [1] and gates["read"].in_flight == 0
+    gates["read"].in_flight = 1  # saturated, no queue
+    resp = client.get("/things")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+def test_fastapi_rate_limited():
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, limiter=RateLimiter(write=Budget(route_rate=1, route_burst=1)))
+
+    @app.put("/things/{thing_id}")
+    async def put_thing(thing_id: int):
+        return {"ok": True}
+
+    with TestClient(app) as client:
+        assert client.put("/things/1").status_code == 200
+        resp = client.put("/things/2")  # same route template
+        assert resp.status_code == 429
+        assert resp.headers["retry-after"] == "1"
+        assert resp.json() == {"status": "error", "message": "Rate limit exceeded for write requests", "data": None}
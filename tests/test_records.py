@@ -0,0 +1,45 @@
+import pytest
+from cruds_common import serialization
+from cruds_common.records import record_type
+from cruds_common.store import IndexedStore
+
+UserRecord = record_type("UserRecord", ("user_id", "name", "email"))
+ItemRecord = record_type("ItemRecord", ("name", "description"), interned=("description",))
+
+def test_record_reads_like_a_dict():
+    user = UserRecord.from_dict({"user_id": "1", "name": "Ann", "email": "a@x.com"})
+    assert isinstance(user, UserRecord)
+    assert user["name"] == "Ann" and user.get("email") == "a@x.com" and user.get("age") is None
+    assert {**user, "name": "Bob"} == {"user_id": "1", "name": "Bob", "email": "a@x.com"}
+    assert user == {"user_id": "1", "name": "Ann", "email": "a@x.com"}
+    assert "name" in user and "age" not in user
+    with pytest.raises(KeyError):
+        user["age"]
+
+def test_other_keys_stay_a_dict():
+    data = {"user_id": "1", "name": "Ann", "email": "a@x.com", "role": "admin"}
+    assert UserRecord.from_dict(data) is data
+    assert UserRecord.from_dict({"user_id": "1"}) == {"user_id": "1"}
+
+def test_interned_fields_share_strings():
+    a = ItemRecord.from_dict({"name": "A", "description": "".join(["shared ", "text"])})
+    b = ItemRecord.from_dict({"name": "B", "description": "".join(["shared ", "text"])})
+    assert a.description is b.description
+
+@pytest.mark.parametrize("backend", ["orjson", "stdlib"])
+def test_records_serialize_as_objects(backend):
+    if backend == "orjson" and serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    previous = serialization.backend()
+    serialization.use(backend)
+    try:
+        item = ItemRecord.from_dict({"name": "A", "description": ""})
+        assert serialization.loads(serialization.dumps({1: item})) == {"1": {"name": "A", "description": ""}}
+    finally:
+        serialization.use(previous)
+
+def test_store_keeps_compact_records():
+    store = IndexedStore({1: {"name": "A", "description": ""}}, record_type=ItemRecord)
+    store[2] = {"name": "B", "description": "x"}
+    store.update({3: {"name": "C", "description": "y"}})
+    assert all(isinstance(record, ItemRecord) for record in store.values())
@@ -0,0 +1,218 @@
+import pytest
+from cruds_common.repository import (DictRepository, SQLiteRepository, UniqueViolation, VersionConflict,
+                                     open_repository)
+from cruds_common.shm import SharedMemoryRepository
+from cruds_common.wal import WALRepository
+
+@pytest.fixture(params=["dict", "wal", "sqlite", "shm"])
+def repo(request, tmp_path):
+    if request.param == "dict":
+        repo = DictRepository(search_fields=("name",), sorted_fields=("name",))
+    elif request.param == "wal":
+        repo = WALRepository(str(tmp_path / "wal"), search_fields=("name",), sorted_fields=("name",))
+    elif request.param == "shm":
+        repo = SharedMemoryRepository(str(tmp_path / "items"), int, search_fields=("name",), sorted_fields=("name",),
+                                      slots=64, heap_size=1 << 16)
+    else:
+        repo = SQLiteRepository(str(tmp_path / "crud.db"), "items", key_type=int, sorted_fields=("name",))
+    for key in (3, 1, 2):
+        repo.insert(key, {"name": f"Item{key}", "description": ""})
+    yield repo
+    if isinstance(repo, SQLiteRepository):
+        repo.pool.close()
+    elif isinstance(repo, (WALRepository, SharedMemoryRepository)):
+        repo.close()
+
+# WRITES
+def test_insert_rejects_existing_key(repo):
+    assert repo.insert(4, {"name": "Item4"}) is True
+    assert repo.insert(4, {"name": "Other"}) is False
+    assert repo.get(4) == {"name": "Item4"}
+
+def test_update_merges_and_upserts(repo):
+    assert repo.update(1, {"name": "New"}) == ({"name": "New", "description": ""}, False)
+    assert repo.update(99, {"name": "Ghost"}) == (None, False)
+    assert repo.update(99, {"name": "Ghost"}, upsert=True) == ({"name": "Ghost"}, True)
+    assert repo.get(99) == {"name": "Ghost"}
+
+def test_delete(repo):
+    assert repo.delete(1) is True
+    assert repo.delete(1) is False
+    assert repo.get(1) is None
+    assert len(repo) == 2
+
+# LISTING
+def test_keys_are_sorted_and_paginated(repo):
+    assert repo.keys() == ([1, 2, 3], None)
+    assert repo.keys(limit=2) == ([1, 2], 2)
+    assert repo.keys(limit=2, cursor=2) == ([3], None)
+
+def test_keys_contains_filter(repo):
+    repo.insert(10, {"name": "SpecialItem"})
+    assert repo.keys(contains=("name", "special")) == ([10], None)
+    assert repo.keys(limit=1, contains=("name", "item")) == ([1], 1)
+
+def test_keys_filters_exact_and_prefix(repo):
+    repo.insert(10, {"name": "Widget", "description": "Blue Box"})
+    repo.insert(11, {"name": "widget", "description": "blue bag"})
+    # name is a sorted-index field, description is scanned
+    assert repo.keys(filters=[("name", "eq", " WIDGET ")]) == ([10, 11], None)
+    assert repo.keys(filters=[("name", "prefix", "it")]) == ([1, 2, 3], None)
+    assert repo.keys(filters=[("description", "prefix", "blue b")]) == ([10, 11], None)
+    assert repo.keys(filters=[("description", "eq", "blue bag")]) == ([11], None)
+    assert repo.keys(filters=[("name", "eq", "widget"), ("description", "prefix", "blue bo")]) == ([10], None)
+    assert repo.keys(filters=[("name", "prefix", "zz")]) == ([], None)
+    with pytest.raises(ValueError):
+        repo.keys(filters=[("name", "like", "w")])
+
+def test_keys_sorted_by_field(repo):
+    repo.update(1, {"name": "b"})
+    repo.update(2, {"name": "C"})
+    repo.update(3, {"name": "a"})
+    repo.insert(4, {"name": "b", "description": "z"})
+    assert repo.keys(sort=("name", False)) == ([3, 1, 4, 2], None)
+    assert repo.keys(sort=("name", True)) == ([2, 4, 1, 3], None)
+    assert repo.keys(limit=2, sort=("name", False)) == ([3, 1], 1)
+    assert repo.keys(limit=2, cursor=1, sort=("name", False)) == ([4, 2], None)
+    assert repo.keys(limit=3, cursor=4, sort=("name", True)) == ([1, 3], None)
+    assert repo.keys(sort=("description", True)) == ([4, 3, 2, 1], None)  # ties by key, descending too
+    assert repo.keys(filters=[("name", "eq", "b")], sort=("name", True)) == ([4, 1], None)
+    with pytest.raises(ValueError):
+        repo.keys(cursor=99, sort=("name", False))
+
+def test_iter_many_skips_missing_keys(repo):
+    assert list(repo.iter_many([2, 42, 1])) == [(2, {"name": "Item2", "description": ""}),
+                                                 (1, {"name": "Item1", "description": ""})]
+
+def test_sqlite_is_shared_between_repositories(tmp_path):
+    path = str(tmp_path / "shared.db")
+    writer = SQLiteRepository(path, "users")
+    reader = open_repository("users", str, url=f"sqlite:///{path}")
+    writer.insert("1", {"user_id": "1"})
+    assert reader.get("1") == {"user_id": "1"}
+
+def test_open_repository_rejects_unknown_url():
+    with pytest.raises(ValueError):
+        open_repository("items", int, url="redis://localhost")
+
+# BATCH
+def test_apply_batch_outcomes(repo):
+    outcomes = repo.apply_batch([
+        ("create", 5, {"name": "Item5"}),
+        ("create", 1, {"name": "Dup"}),
+        ("update", 2, {"name": "New2"}),
+        ("update", 50, {"name": "Missing"}),
+        ("delete", 3, None),
+        ("delete", 30, None),
+    ])
+    assert outcomes == ["created", "exists", "updated", "not_found", "deleted", "not_found"]
+    assert repo.get(5) == {"name": "Item5"}
+    assert repo.get(2)["name"] == "New2"
+    assert repo.get(3) is None
+
+def test_apply_batch_rejects_unknown_op_before_writing(repo):
+    with pytest.raises(ValueError):
+        repo.apply_batch([("create", 6, {"name": "Item6"}), ("upsert", 7, {})])
+    assert repo.get(6) is None
+
+# LISTENERS
+class Recorder:
+    def __init__(self):
+        self.events = []
+    def on_set(self, key, old, record):
+        self.events.append(("set", key, record))
+    def on_delete(self, key, old):
+        self.events.append(("delete", key))
+    def clear(self):
+        self.events.append(("clear",))
+
+def test_subscribe_sees_every_write(repo):
+    recorder = Recorder()
+    repo.subscribe(recorder)
+    recorder.events.clear()  # the dict backend replays existing records
+    repo.insert(7, {"name": "Item7"})
+    repo.update(7, {"name": "New7"})
+    repo.apply_batch([("delete", 7, None)])
+    repo.clear()
+    assert recorder.events == [
+        ("set", 7, {"name": "Item7"}),
+        ("set", 7, {"name": "New7"}),
+        ("delete", 7),
+        ("clear",),
+    ]
+
+# VERSIONS
+def test_versions_increase_on_every_write(repo):
+    record, version = repo.get_versioned(1)
+    generation = repo.generation()
+    repo.update(1, {"name": "New"})
+    new_record, new_version = repo.get_versioned(1)
+    assert new_version > version and new_record["name"] == "New"
+    assert repo.generation() > generation
+    assert repo.get_versioned(99) == (None, None)
+
+def test_update_precondition(repo):
+    _, version = repo.get_versioned(1)
+    with pytest.raises(VersionConflict):
+        repo.update(1, {"name": "Lost"}, precondition=lambda current: current == version + 1000)
+    assert repo.get(1)["name"] == "Item1"
+    repo.update(1, {"name": "Won"}, precondition=lambda current: current == version)
+    assert repo.get(1)["name"] == "Won"
+
+# PATCH
+def test_patch_writes_only_changes(repo):
+    _, version = repo.get_versioned(1)
+    assert repo.patch(1, {"name": "New", "description": None}) == ({"name": "New", "description": None},
+                                                                     repo.get_versioned(1)[1])
+    assert repo.get(1) == {"name": "New"}
+    assert repo.keys(filters=[("name", "eq", "new")]) == ([1], None)
+    # Nothing changes: nothing is written
+    generation = repo.generation()
+    changed, same = repo.patch(1, {"name": "New"})
+    assert changed == {} and same > version and repo.generation() == generation
+    assert repo.patch(99, {"name": "Ghost"}) == (None, None)
+    with pytest.raises(VersionConflict):
+        repo.patch(1, {"name": "Lost"}, precondition=lambda current: current == version)
+
+# UNIQUE FIELDS
+@pytest.fixture(params=["dict", "sqlite", "shm"])
+def users(request, tmp_path):
+    if request.param == "dict":
+        repo = DictRepository(unique_fields=("email",))
+    elif request.param == "shm":
+        repo = SharedMemoryRepository(str(tmp_path / "users"), unique_fields=("email",), slots=64, heap_size=1 << 16)
+    else:
+        repo = SQLiteRepository(str(tmp_path / "crud.db"), "users", unique_fields=("email",))
+    repo.insert("1", {"name": "Ann", "email": "Ann@x.com"})
+    yield repo
+    if isinstance(repo, SQLiteRepository):
+        repo.pool.close()
+
+def test_unique_field_lookup_is_normalized(users):
+    assert users.lookup("email", " ann@X.COM ") == "1"
+    assert users.lookup("email", "bob@x.com") is None
+
+def test_unique_field_rejects_duplicates(users):
+    with pytest.raises(UniqueViolation):
+        users.insert("2", {"name": "Other", "email": "ann@x.com"})
+    users.insert("2", {"name": "Bob", "email": "bob@x.com"})
+    with pytest.raises(UniqueViolation):
+        users.update("2", {"email": "ANN@x.com"})
+    assert users.get("2")["email"] == "bob@x.com"
+    assert users.lookup("email", "bob@x.com") == "2"
+
+def test_unique_value_freed_by_update_and_delete(users):
+    users.update("1", {"email": "ann@new.com"})
+    assert users.insert("2", {"name": "Ann 2", "email": "ann@x.com"}) is True
+    users.delete("2")
+    assert users.lookup("email", "ann@x.com") is None
+    assert users.apply_batch([("create", "3", {"email": "ann@new.com"}), ("create", "4", {"email": "c@x.com"})]) == \
+        ["conflict", "created"]
+
+def test_patch_claims_changed_unique_values(users):
+    users.insert("2", {"name": "Bob", "email": "bob@x.com"})
+    with pytest.raises(UniqueViolation):
+        users.patch("2", {"email": "ANN@x.com"})
+    assert users.patch("2", {"name": "Bobby"})[0] == {"name": "Bobby"}
+    assert users.patch("1", {"email": "ann@new.com"})[0] == {"email": "ann@new.com"}
+    assert users.lookup("email", "ann@new.com") == "1" and users.lookup("email", "ann@x.com") is None
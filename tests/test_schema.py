@@ -0,0 +1,42 @@
+import pytest
+from cruds_common.schema import Field, Schema, SchemaError
+
+@pytest.fixture
+def validate():
+    return Schema({
+        "id": Field(str, coerce=True, max_length=5),
+        "name": Field(str, strip=True, min_length=1, max_length=10),
+        "age": Field(int, required=False),
+        "score": Field(float, required=False),
+        "role": Field(str, required=False, choices=("admin", "user"), default="user"),
+    }).compile()
+
+def test_valid_payload_is_cleaned(validate):
+    assert validate({"id": 7, "name": "  Ann ", "score": 3}) == {"id": "7", "name": "Ann", "score": 3, "role": "user"}
+
+@pytest.mark.parametrize("payload, message", [
+    ([1, 2], "Expected a JSON object"),
+    ({"id": "1", "name": "A", "password": "x"}, "Unknown field: password"),
+    ({"name": "A"}, "Missing field: id"),
+    ({"id": 1.5, "name": "A"}, "id must be a string"),
+    ({"id": True, "name": "A"}, "id must be a string"),
+    ({"id": "123456", "name": "A"}, "id must be at most 5 characters"),
+    ({"id": "1", "name": "   "}, "name must not be empty"),
+    ({"id": "1", "name": "A", "age": "3"}, "age must be an integer"),
+    ({"id": "1", "name": "A", "age": False}, "age must be an integer"),
+    ({"id": "1", "name": "A", "role": "root"}, "Unknown role: root"),
+])
+def test_invalid_payloads(validate, payload, message):
+    with pytest.raises(SchemaError) as exc:
+        validate(payload)
+    assert str(exc.value) == message
+
+def test_extend_and_without():
+    schema = Schema({"a": Field(int)})
+    assert schema.extend(b=Field(str, required=False)).compile()({"a": 1, "b": "x"}) == {"a": 1, "b": "x"}
+    assert schema.without("a").compile()({}) == {}
+
+def test_partial():
+    validate = Schema({"a": Field(int), "b": Field(str, strip=True, default="")}).partial().compile()
+    assert validate({}) == {}
+    assert validate({"b": " x "}) == {"b": "x"}
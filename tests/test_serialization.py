@@ -0,0 +1,26 @@
+import json
+import pytest
+from cruds_common import serialization
+
+@pytest.fixture(params=["stdlib", "orjson"])
+def backend(request):
+    if request.param == "orjson" and serialization.orjson is None:
+        pytest.skip("orjson not installed")
+    previous = serialization.backend()
+    serialization.use(request.param)
+    yield request.param
+    serialization.use(previous)
+
+def test_dumps_is_compact_utf8(backend):
+    assert serialization.dumps({"name": "Café", "n": 1}) == '{"name":"Café","n":1}'.encode()
+
+def test_dumps_stringifies_int_keys(backend):
+    assert json.loads(serialization.dumps({1: {"name": "Item1"}})) == {"1": {"name": "Item1"}}
+
+def test_round_trip(backend):
+    data = {"items": [1, 2.5, None, True, "x"]}
+    assert serialization.loads(serialization.dumps(data)) == data
+
+def test_use_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        serialization.use("simplejson")
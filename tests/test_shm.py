@@ -0,0 +1,150 @@
+import multiprocessing
+import pytest
+from cruds_common.repository import open_repository
+from cruds_common.shm import ProcessLock, SharedHashTable, SharedMemoryRepository, StoreFull
+
+@pytest.fixture()
+def table(tmp_path):
+    table = SharedHashTable(str(tmp_path / "t.shm"), ProcessLock(str(tmp_path / "t.lock")), slots=8, heap_size=256)
+    yield table
+    table.close()
+
+# HASH TABLE
+def test_put_get_delete(table):
+    with table.lock:
+        table.put(b"a", b"1", 5)
+        table.put(b"b", b"2")
+        table.put(b"a", b"one", 6)
+    assert table.get(b"a") == (b"one", 6)
+    assert table.get(b"zz") == (None, None)
+    assert len(table) == 2
+    with table.lock:
+        assert table.delete(b"a") and not table.delete(b"a")
+    assert table.get(b"a") == (None, None)
+    assert sorted(key for key, _, _ in table.items()[1]) == [b"b"]
+
+def test_heap_is_compacted_when_full(table):
+    with table.lock:
+        for i in range(100):  # far more bytes than the heap holds
+            table.put(b"k", b"value %03d" % i)
+    assert table.get(b"k")[0] == b"value 099"
+
+def test_tombstones_are_reclaimed(table):
+    with table.lock:
+        for i in range(50):
+            table.put(b"key%d" % i, b"")
+            table.delete(b"key%d" % i)
+        table.put(b"last", b"x")
+    assert len(table) == 1 and table.get(b"last")[0] == b"x"
+
+def test_store_full(table):
+    with table.lock:
+        for i in range(6):
+            table.put(b"%d" % i, b"")
+        with pytest.raises(StoreFull):
+            table.put(b"one too many", b"")
+        with pytest.raises(StoreFull):
+            table.put(b"0", b"x" * 300)
+    assert len(table) == 6
+
+def test_existing_file_keeps_its_layout(tmp_path, table):
+    with table.lock:
+        table.put(b"a", b"1")
+    again = SharedHashTable(table.path, table.lock, slots=1024, heap_size=1 << 20)
+    assert (again.slots, again.heap_size) == (8, 256)
+    assert again.get(b"a") == (b"1", 0)
+    again.close()
+
+# REPOSITORY
+def test_open_repository_shm_url(tmp_path):
+    repo = open_repository("users", str, unique_fields=("email",), url=f"shm://{tmp_path}/crud")
+    assert isinstance(repo, SharedMemoryRepository)
+    assert (tmp_path / "crud" / "users.shm").exists()
+    repo.close()
+
+def test_listing_snapshot_follows_writes(tmp_path):
+    repo = SharedMemoryRepository(str(tmp_path / "items"), int, sorted_fields=("name",), slots=64, heap_size=4096)
+    repo.insert(2, {"name": "b"})
+    assert repo.keys(sort=("name", False)) == ([2], None)
+    other = SharedMemoryRepository(str(tmp_path / "items"), int, sorted_fields=("name",))
+    other.insert(1, {"name": "a"})  # another process's write, as far as `repo` knows
+    assert repo.keys(sort=("name", False)) == ([1, 2], None)
+    repo.close()
+    other.close()
+
+def test_plain_listing_reads_keys_only(tmp_path):
+    repo = SharedMemoryRepository(str(tmp_path / "items"), int, sorted_fields=("name",), slots=64, heap_size=4096)
+    for key in (3, 1, 2):
+        repo.insert(key, {"name": f"Item{key}"})
+    assert repo.keys(2) == ([1, 2], 2)
+    assert repo.keys(2, cursor=2) == ([3], None)
+    other = SharedMemoryRepository(str(tmp_path / "items"), int)
+    other.insert(0, {"name": "Item0"})
+    assert repo.keys() == ([0, 1, 2, 3], None)
+    assert repo._view is None  # no local copy of the records was made
+    repo.close()
+    other.close()
+
+def test_store_full_in_unique_table_writes_nothing(tmp_path):
+    # The email table's heap (1 MB) fills up long before the records' (8 MB)
+    repo = SharedMemoryRepository(str(tmp_path / "users"), unique_fields=("email",), slots=64, heap_size=8 << 20)
+    big = "x" * (200 << 10)
+    for i in range(5):
+        repo.insert(str(i), {"email": f"{i}{big}"})
+    generation = repo.generation()
+    with pytest.raises(StoreFull):
+        repo.insert("5", {"email": f"5{big}"})
+    assert repo.get("5") is None and len(repo) == 5
+    assert repo.generation() == generation
+    with pytest.raises(StoreFull):
+        repo.update("0", {"email": f"new{big}"})
+    assert repo.get("0")["email"] == f"0{big}" and repo.lookup("email", f"0{big}") == "0"
+    repo.close()
+
+def _write_in_child(path, count):
+    repo = SharedMemoryRepository(path, int, unique_fields=("email",))
+    for i in range(count):
+        repo.insert(i, {"email": f"u{i}@x.com"})
+    repo.close()
+
+def test_writes_are_shared_between_processes(tmp_path):
+    path = str(tmp_path / "users")
+    repo = SharedMemoryRepository(path, int, unique_fields=("email",), slots=256, heap_size=1 << 16)
+    context = multiprocessing.get_context("fork")
+    children = [context.Process(target=_write_in_child, args=(path, 50)) for _ in range(2)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join()
+    assert all(child.exitcode == 0 for child in children)
+    assert len(repo) == 50
+    assert repo.get(49) == {"email": "u49@x.com"}
+    assert repo.lookup("email", "U7@x.com") == 7
+    repo.close()
+
+# APPS
+def test_apps_answer_507_when_the_store_is_full(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import fastapi_cruds.advanced as fastapi_advanced
+    import flask_cruds.advanced as flask_advanced
+    from cruds_common.config import AppConfig
+    monkeypatch.setenv("CRUD_SHM_SLOTS", "8")  # 6 records at most
+    app = flask_advanced.create_app(AppConfig(storage_url=f"shm://{tmp_path}/flask"))
+    client = app.test_client()
+    resp = client.post("/users:batch", json=[{"user_id": str(i), "name": "U", "email": f"{i}@x.com"}
+                                             for i in range(8)])
+    assert [r["status"] for r in resp.get_json()["results"]] == [201] * 6 + [507] * 2
+    assert resp.get_json()["results"][-1]["message"] == "User not stored: storage is full"
+    resp = client.post("/users", json={"user_id": "8", "name": "U", "email": "8@x.com"})
+    assert resp.status_code == 507
+    assert resp.get_json() == {"error": "Insufficient Storage", "message": "Storage is full"}
+    app.extensions["cruds"]["repo"].close()
+
+    app = fastapi_advanced.create_app(AppConfig(storage_url=f"shm://{tmp_path}/fastapi"))
+    with TestClient(app) as client:
+        resp = client.post("/items:batch", json=[{"item_id": i, "item": {"name": f"I{i}"}} for i in range(8)])
+        assert [r["status"] for r in resp.json()["data"]["results"]] == [201] * 6 + [507] * 2
+        resp = client.post("/items/8", json={"name": "I8"})
+        assert resp.status_code == 507
+        assert resp.json() == {"status": "error", "message": "Storage is full", "data": None}
+    app.state.repo.close()
@@ -0,0 +1,93 @@
+import os
+import shutil
+
+import pytest
+from cruds_common.repository import open_repository
+from cruds_common.store import IndexedStore
+from cruds_common.wal import WALRepository
+
+@pytest.fixture
+def wal_dir(tmp_path):
+    return str(tmp_path / "wal")
+
+def test_recovers_writes_after_restart(wal_dir):
+    repo = WALRepository(wal_dir)
+    repo.insert(1, {"name": "One"})
+    repo.insert(2, {"name": "Two"})
+    repo.update(1, {"description": "first"})
+    repo.delete(2)
+    repo.apply_batch([("create", 3, {"name": "Three"}), ("create", 4, {"name": "Four"})])
+    repo.close()
+
+    recovered = WALRepository(wal_dir, search_fields=("name",))
+    assert dict(recovered.store) == {1: {"name": "One", "description": "first"},
+                                     3: {"name": "Three"}, 4: {"name": "Four"}}
+    assert recovered.keys() == ([1, 3, 4], None)
+    assert recovered.keys(contains=("name", "thr")) == ([3], None)
+    recovered.close()
+
+def test_seed_data_persisted_on_first_start_only(wal_dir):
+    repo = WALRepository(wal_dir, IndexedStore({"1": {"name": "Seed"}}))
+    repo.delete("1")
+    repo.close()
+    recovered = WALRepository(wal_dir, IndexedStore({"1": {"name": "Seed"}}))
+    assert len(recovered) == 0
+    recovered.close()
+
+def test_recovers_without_clean_shutdown_and_skips_torn_tail(wal_dir, tmp_path):
+    repo = WALRepository(wal_dir)
+    repo.insert(1, {"name": "One"})
+    repo.insert(2, {"name": "Two"})
+    # Copy the files as a crash would leave them, with a half-written last entry
+    crashed = str(tmp_path / "crashed")
+    shutil.copytree(wal_dir, crashed)
+    repo.close()
+    segment = max(name for name in os.listdir(crashed) if name.endswith(".log"))
+    with open(os.path.join(crashed, segment), "ab") as f:
+        f.write(b'[9,"s",3,{"na')
+
+    recovered = WALRepository(crashed)
+    assert dict(recovered.store) == {1: {"name": "One"}, 2: {"name": "Two"}}
+    recovered.close()
+
+def test_snapshot_compacts_log(wal_dir):
+    repo = WALRepository(wal_dir, snapshot_every=10)
+    for key in range(50):
+        repo.insert(key, {"name": f"Item{key}"})
+    repo.close()
+    assert repo.wal.snapshots >= 2
+    assert len([name for name in os.listdir(wal_dir) if name.endswith(".log")]) <= 3
+    recovered = WALRepository(wal_dir)
+    assert len(recovered) == 50
+    recovered.close()
+
+def test_versions_not_reused_after_restart(wal_dir):
+    repo = WALRepository(wal_dir)
+    repo.insert(1, {"name": "One"})
+    _, version = repo.get_versioned(1)
+    repo.close()
+    recovered = WALRepository(wal_dir)
+    recovered.update(1, {"name": "Again"})
+    assert recovered.get_versioned(1)[1] > version
+    recovered.close()
+
+@pytest.mark.parametrize("fsync", ["always", "interval", "never"])
+def test_fsync_policies(wal_dir, fsync):
+    repo = WALRepository(wal_dir, fsync=fsync, interval=0.01)
+    repo.insert(1, {"name": "One"})
+    repo.close()
+    recovered = WALRepository(wal_dir)
+    assert recovered.get(1) == {"name": "One"}
+    recovered.close()
+
+def test_directory_used_by_one_process_at_a_time(wal_dir):
+    repo = WALRepository(wal_dir)
+    with pytest.raises(RuntimeError):
+        WALRepository(wal_dir)
+    repo.close()
+
+def test_open_repository_wal_url(tmp_path):
+    repo = open_repository("items", int, url=f"wal:///{tmp_path}")
+    assert isinstance(repo, WALRepository)
+    assert repo.wal.directory == os.path.join(str(tmp_path), "items")
+    repo.close()